@@ -2,23 +2,38 @@
 import firebase_admin
 from firebase_admin import credentials
 from firebase_admin import db
+import codecs
+import contextlib
 import json
+import marshal
 import os
-
-json_data = None
+import threading
+import datetime as dt
+import hashlib
+from pathlib import Path
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 #----------------------------------------------------------------------------------------------------------------------
-#creds for initializing firebase admin
-try :
-    with open('phlask.json') as f:
-        json_data = json.load(f)
+#creds for initializing firebase admin, loaded on first use so importing this module stays cheap
+_cred = None
+
+def get_credentials():
+    global _cred
+    if _cred is None:
+        try :
+            with open('phlask.json') as f:
+                json_data = json.load(f)
 
-# if there is no json file, then this will use the environment variable
+        # if there is no json file, then this will use the environment variable
 
-except FileNotFoundError:
-    json_data = os.getenv('FIREBASE_CREDENTIALS')
+        except FileNotFoundError:
+            json_data = os.getenv('FIREBASE_CREDENTIALS')
 
-cred = credentials.Certificate(json_data)
+        _cred = credentials.Certificate(json_data)
+    return _cred
 
 def get_firebase_url(dev_type, data_type, live_type):
     return f'https://phlask-web-map-{dev_type}-{data_type}-{live_type}.firebaseio.com/'
@@ -30,116 +45,818 @@ def initialize_firebase_app(app_name, cred, database_url):
 
 
 #----------------------------------------------------------------------------------------------------------------------
-# initialize firebase admin Prod DB's
-prod_water_live = initialize_firebase_app("prod_water_live", cred, get_firebase_url("prod","water","live"))
-prod_water_verify = initialize_firebase_app("prod_water_verify", cred, get_firebase_url("prod", "water", "verify"))
-prod_food_live = initialize_firebase_app("prod_food_live", cred, get_firebase_url("prod", "food", "live"))
-prod_food_verify = initialize_firebase_app("prod_food_verify", cred, get_firebase_url("prod", "food", "verify"))
-prod_forage_live = initialize_firebase_app("prod_forage_live", cred, get_firebase_url("prod", "foraging", "live"))
-prod_forage_verify = initialize_firebase_app("prod_forage_verify", cred, get_firebase_url("prod", "foraging", "verify"))
-prod_bathroom_live = initialize_firebase_app("prod_bathroom_live", cred, get_firebase_url("prod", "bathroom", "live"))
-prod_bathroom_verify = initialize_firebase_app("prod_bathroom_verify", cred, get_firebase_url("prod", "bathroom", "verify"))
+# Lazy registry of the prod/beta/test x water/food/forage/bathroom x live/verify databases.
+# Apps and references are only created the first time a database is actually used.
+
+DEV_TYPES = ['prod', 'beta', 'test']
+LIVE_TYPES = ['live', 'verify']
+# Resource name used in attribute names -> resource name used in the firebase URL
+RESOURCE_URL_NAMES = {
+    'water': 'water',
+    'food': 'food',
+    'forage': 'foraging',
+    'bathroom': 'bathroom',
+}
+
+_references = {}
+_registry_lock = threading.Lock()
+
+def get_db_reference(dev_type, resource, live_type):
+    key = (dev_type, resource, live_type)
+    ref = _references.get(key)
+    if ref is None:
+        with _registry_lock:
+            ref = _references.get(key)
+            if ref is None:
+                app_name = f'{dev_type}_{resource}_{live_type}'
+                database_url = get_firebase_url(dev_type, RESOURCE_URL_NAMES[resource], live_type)
+                app = initialize_firebase_app(app_name, get_credentials(), database_url)
+                ref = db.reference('/', app= app)
+                _references[key] = ref
+    return ref
+
+# Eagerly create every app and reference (the old import time behaviour), e.g. to warm up a long running server
+def preload_references():
+    for dev_type in DEV_TYPES:
+        for resource in RESOURCE_URL_NAMES:
+            for live_type in LIVE_TYPES:
+                get_db_reference(dev_type, resource, live_type)
+
+# Keep the old module level names working, e.g. prod_water_db_live or prod_water_live
+def __getattr__(name):
+    parts = name.split('_')
+    if len(parts) in (3, 4) and parts[0] in DEV_TYPES and parts[1] in RESOURCE_URL_NAMES and parts[-1] in LIVE_TYPES:
+        if len(parts) == 4 and parts[2] == 'db':
+            return get_db_reference(parts[0], parts[1], parts[-1])
+        if len(parts) == 3:
+            get_db_reference(parts[0], parts[1], parts[-1])
+            return firebase_admin.get_app(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Descriptor for the Admin database attributes, resolves the reference on first access
+class _LazyReference:
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.resource, _, self.live_type = name.partition('_db_')
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        ref = get_db_reference(instance.dev_type, self.resource, self.live_type)
+        instance.__dict__[self.name] = ref
+        return ref
+
 #----------------------------------------------------------------------------------------------------------------------
-# initialize firebase admin Beta DB's
-beta_water_live = initialize_firebase_app("beta_water_live", cred, get_firebase_url("beta", "water", "live"))
-beta_water_verify = initialize_firebase_app("beta_water_verify", cred, get_firebase_url("beta", "water", "verify"))
-beta_food_live = initialize_firebase_app("beta_food_live", cred, get_firebase_url("beta", "food", "live"))
-beta_food_verify = initialize_firebase_app("beta_food_verify", cred, get_firebase_url("beta", "food", "verify"))
-beta_forage_live = initialize_firebase_app("beta_forage_live", cred, get_firebase_url("beta", "foraging", "live"))
-beta_forage_verify = initialize_firebase_app("beta_forage_verify", cred, get_firebase_url("beta", "foraging", "verify"))
-beta_bathroom_live = initialize_firebase_app("beta_bathroom_live", cred, get_firebase_url("beta", "bathroom", "live"))
-beta_bathroom_verify = initialize_firebase_app("beta_bathroom_verify", cred, get_firebase_url("beta", "bathroom", "verify"))
+# Id field of each resource (same as the "tapnum" entries of RESOURCE_DB_MAP in dashboard_st), bathrooms use tapnum
+RESOURCE_ID_FIELDS = {
+    'water': 'tapnum',
+    'food': 'foodnum',
+    'forage': 'foragenum',
+    'bathroom': 'tapnum',
+}
+ID_FIELDS = tuple(dict.fromkeys(RESOURCE_ID_FIELDS.values()))
+
+# Per reference (snapshot the index was built from, index of id -> (child key, record), time it was last checked),
+# trusted for TAP_INDEX_TTL seconds and dropped whenever Admin writes to the reference
+_tap_indexes = weakref.WeakKeyDictionary()
+# Seconds getTap serves lookups from an index without checking the database, TAP_INDEX_TTL=0 checks on every lookup
+TAP_INDEX_TTL = float(os.getenv('TAP_INDEX_TTL', '60'))
+
+# Firebase orders keys that look like integers numerically, ahead of every other key
+def key_order(key):
+    key = str(key)
+    return (0, int(key), '') if key.isdigit() else (1, 0, key)
+
+# Firebase orders child values null, false, true, numbers, strings, then objects (children with the same value by key)
+def value_order(value):
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    return (4, json.dumps(value, sort_keys=True))
+
+# Result of a query as the database sent it, keyed by child key (or by index when it came back as an array)
+# The SDK's Query.get() re-sorts it into a bare list for array shaped data and loses the keys, so the REST body is
+# read directly. Queries without a REST client (fakes) already keep their keys
+def query_result(query):
+    client = getattr(query, '_client', None)
+    if not hasattr(client, 'body'):
+        return query.get()
+    return client.body('get', query._pathurl, params=query._querystr)
+
+# Value at a child path (e.g. 'address/city') of a record, None when it isn't there
+def child_value(record, path):
+    for part in path.split('/'):
+        record = record.get(part) if isinstance(record, dict) else None
+    return record
+
+# Iterate over (key, child) pairs of a database snapshot, firebase returns either a list or a dict
+def iter_children(data):
+    if isinstance(data, list):
+        return enumerate(data)
+    if isinstance(data, dict):
+        return iter(data.items())
+    return iter(())
+
 #----------------------------------------------------------------------------------------------------------------------
-# initialize firebase admin Test DB's
-test_water_live = initialize_firebase_app("test_water_live", cred, get_firebase_url("test", "water", "live"))
-test_water_verify = initialize_firebase_app("test_water_verify", cred, get_firebase_url("test", "water", "verify"))
-test_food_live = initialize_firebase_app("test_food_live", cred, get_firebase_url("test", "food", "live"))
-test_food_verify = initialize_firebase_app("test_food_verify", cred, get_firebase_url("test", "food", "verify"))
-test_forage_live = initialize_firebase_app("test_forage_live", cred, get_firebase_url("test", "foraging", "live"))
-test_forage_verify = initialize_firebase_app("test_forage_verify", cred, get_firebase_url("test", "foraging", "verify"))
-test_bathroom_live = initialize_firebase_app("test_bathroom_live", cred, get_firebase_url("test", "bathroom", "live"))
-test_bathroom_verify = initialize_firebase_app("test_bathroom_verify", cred, get_firebase_url("test", "bathroom", "verify"))
+# Identify a reference by its database URL and path, so every reference to the same node shares cache entries
+# A mirror gets its own key, its data and version are not those of the reference it wraps
+def reference_key(ref):
+    if isinstance(ref, _MirrorView):
+        return (('mirror', id(ref._mirror)), ref.path)
+    client = getattr(ref, '_client', None)
+    base_url = getattr(client, 'base_url', None)
+    return (base_url or id(client if client is not None else ref), ref.path)
+
+def _paths_overlap(path, other):
+    path = path.rstrip('/') + '/'
+    other = other.rstrip('/') + '/'
+    return path.startswith(other) or other.startswith(path)
+
+# LRU cache of database snapshots and their ETags, used by Admin.getDb once a long running app opts in with
+# snapshot_cache.configure() (or SNAPSHOT_CACHE_SIZE), scripts read straight from firebase. Within ttl seconds of the last check a cached snapshot is returned as is, after that it is revalidated with
+# get_if_changed so an unchanged database costs a conditional request instead of a full download.
+# Snapshots are shared between callers and must be treated as read only.
+class SnapshotCache:
+    def __init__(self, ttl=0.0, max_entries=0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {'hits': 0, 'not_modified': 0, 'downloads': 0, 'evictions': 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Change the ttl and/or size of the cache, max_entries=0 turns it off again
+    def configure(self, ttl=None, max_entries=None):
+        with self._lock:
+            if ttl is not None:
+                self.ttl = ttl
+            if max_entries is not None:
+                self.max_entries = max_entries
+                self._evict()
+        return self
+
+    def get(self, ref):
+        key = reference_key(ref)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if now - entry['checked'] < self.ttl:
+                    self.stats['hits'] += 1
+                    return entry['data']
+        if entry is not None:
+            changed, data, etag = ref.get_if_changed(entry['etag'])
+            if not changed:
+                with self._lock:
+                    self.stats['not_modified'] += 1
+                    entry['checked'] = now
+                return entry['data']
+        else:
+            data, etag = ref.get(etag=True)
+        with self._lock:
+            self.stats['downloads'] += 1
+        self.put(ref, data, etag, now)
+        return data
+
+    def put(self, ref, data, etag, checked=None):
+        key = reference_key(ref)
+        with self._lock:
+            self._entries[key] = {'data': data, 'etag': etag, 'checked': checked or time.monotonic()}
+            self._entries.move_to_end(key)
+            self._evict()
+
+    # Drop the least recently used snapshots over max_entries, called with the lock held
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    # Make the next get of ref revalidate its snapshot (a conditional request) even within ttl
+    def expire(self, ref):
+        with self._lock:
+            entry = self._entries.get(reference_key(ref))
+            if entry is not None:
+                entry['checked'] = float('-inf')
+
+    # Drop the snapshot of ref and of any parent or child node of it, or every snapshot when ref is None
+    def invalidate(self, ref=None):
+        with self._lock:
+            if ref is None:
+                self._entries.clear()
+                return
+            base, path = reference_key(ref)
+            for key in [key for key in self._entries if key[0] == base and _paths_overlap(key[1], path)]:
+                del self._entries[key]
+
+# Shared by every Admin and off unless SNAPSHOT_CACHE_SIZE (or configure) sets how many snapshots it keeps,
+# SNAPSHOT_CACHE_TTL=0 revalidates on every read
+snapshot_cache = SnapshotCache(ttl=float(os.getenv('SNAPSHOT_CACHE_TTL', '0')), max_entries=int(os.getenv('SNAPSHOT_CACHE_SIZE', '0')))
+
+#----------------------------------------------------------------------------------------------------------------------
+# Realtime mirror of a database reference, kept up to date by a ref.listen() stream.
+# A MirroredRef can be passed to any Admin method in place of the reference it wraps: reads (get, child().get,
+# shallow reads) are answered from memory, writes and queries go to firebase and come back through the stream.
+# Updates replace the containers along the changed path instead of mutating them, so a snapshot handed out by
+# get() never changes under the caller (it must still be treated as read only).
+
+def _mirror_child(node, key):
+    if isinstance(node, list):
+        return node[int(key)] if key.isdigit() and int(key) < len(node) else None
+    if isinstance(node, dict):
+        return node.get(key)
+    return None
+
+def _mirror_with_child(node, key, value):
+    if isinstance(node, list) and key.isdigit():
+        new = list(node)
+        index = int(key)
+        if index >= len(new):
+            new.extend([None] * (index + 1 - len(new)))
+        new[index] = value
+        while new and new[-1] is None:
+            new.pop()
+        return new or None
+    if isinstance(node, list):
+        new = {str(i): child for i, child in enumerate(node) if child is not None}
+    else:
+        new = dict(node) if isinstance(node, dict) else {}
+    if value is None:
+        new.pop(key, None)
+    else:
+        new[key] = value
+    return new or None
+
+def _mirror_put(node, parts, value):
+    if not parts:
+        return value
+    child = _mirror_put(_mirror_child(node, parts[0]), parts[1:], value)
+    return _mirror_with_child(node, parts[0], child)
+
+def _mirror_get(node, parts):
+    for part in parts:
+        node = _mirror_child(node, part)
+    return node
+
+class _MirrorView:
+    # Child of a MirroredRef, reads come from the mirror and writes go to the wrapped reference
+    def __init__(self, mirror, parts):
+        self._mirror = mirror
+        self._parts = parts
+        self.path = '/' + '/'.join(parts)
+        self.key = parts[-1] if parts else None
+
+    def child(self, path):
+        return _MirrorView(self._mirror, self._parts + [p for p in str(path).split('/') if p])
+
+    def get(self, etag=False, shallow=False):
+        return self._mirror._read(self._parts, etag, shallow)
+
+    def get_if_changed(self, etag):
+        return self._mirror._read_if_changed(self._parts, etag)
+
+    # The reference this view reads from
+    def _wrapped(self):
+        return self._mirror._ref.child('/'.join(self._parts)) if self._parts else self._mirror._ref
+
+    def __getattr__(self, name):
+        # set, update, push, delete, listen and queries
+        return getattr(self._wrapped(), name)
+
+class MirroredRef(_MirrorView):
+    # reconnect_delay is the first wait before reopening a dead stream, doubled up to max_reconnect_delay
+    def __init__(self, ref, check_interval=5.0, reconnect_delay=1.0, max_reconnect_delay=60.0):
+        super().__init__(self, [])
+        self._ref = ref
+        self.path = ref.path
+        self.key = ref.key
+        self.check_interval = check_interval
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        # Bumped on every applied event, stands in for the ETag of the mirrored data
+        self.version = 0
+        self.stats = {'events': 0, 'resyncs': 0, 'reconnects': 0, 'errors': 0}
+        self._data = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stopped = threading.Event()
+        self._registration = None
+        self._watchdog = None
+
+    def start(self):
+        self._stopped.clear()
+        self._connect()
+        if self._watchdog is None:
+            self._watchdog = threading.Thread(target=self._watch, name=f'mirror{self.path}', daemon=True)
+            self._watchdog.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._registration is not None:
+            self._registration.close()
+            self._registration = None
+
+    def wait_until_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    # Replace the mirror with a full read of the wrapped reference
+    def resync(self):
+        data = self._ref.get()
+        with self._lock:
+            self._data = data
+            self.version += 1
+        self.stats['resyncs'] += 1
+        self._ready.set()
+
+    def _connect(self):
+        self.resync()
+        self._registration = self._ref.listen(self._on_event)
+
+    def _connected(self):
+        thread = getattr(self._registration, '_thread', None)
+        return self._registration is not None and (thread is None or thread.is_alive())
+
+    # Reopen the stream (with a fresh full read) whenever the listener thread has died
+    def _watch(self):
+        delay = self.reconnect_delay
+        while not self._stopped.wait(self.check_interval):
+            if self._connected():
+                delay = self.reconnect_delay
+                continue
+            try:
+                self._connect()
+                self.stats['reconnects'] += 1
+                delay = self.reconnect_delay
+            except Exception as e:
+                print(f'Mirror of {self.path} could not reconnect, retrying in {delay:.0f} secs: {e}')
+                self._stopped.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _on_event(self, event):
+        try:
+            parts = [p for p in event.path.split('/') if p]
+            with self._lock:
+                if event.event_type == 'put':
+                    self._data = _mirror_put(self._data, parts, event.data)
+                elif event.event_type == 'patch':
+                    data = self._data
+                    for path, value in event.data.items():
+                        data = _mirror_put(data, parts + [p for p in path.split('/') if p], value)
+                    self._data = data
+                else:
+                    return
+                self.version += 1
+            self.stats['events'] += 1
+            self._ready.set()
+        except Exception as e:
+            # Never let a bad event kill the listener thread, fall back to a full read instead
+            self.stats['errors'] += 1
+            print(f'Mirror of {self.path} failed to apply a {event.event_type} event, resyncing: {e}')
+            self.resync()
+
+    def _read(self, parts, etag=False, shallow=False):
+        if not self._ready.is_set():
+            self.resync()
+        with self._lock:
+            data = _mirror_get(self._data, parts)
+            version = str(self.version)
+        if shallow:
+            if isinstance(data, list):
+                data = {str(i): True for i, child in enumerate(data) if child is not None}
+            elif isinstance(data, dict):
+                data = {key: True for key in data}
+        return (data, version) if etag else data
+
+    def _read_if_changed(self, parts, etag):
+        data, version = self._read(parts, etag=True)
+        if version == etag:
+            return False, None, None
+        return True, data, version
+
+#----------------------------------------------------------------------------------------------------------------------
+# On-disk snapshots: a database is stored as an Arrow IPC file (one row per child, one column per field) that
+# is reopened memory-mapped, so validation, EDA and comparisons can run repeatedly without touching firebase.
+# Files are named <name>_<UTC timestamp>_<etag hash>.arrow. pyarrow is only imported when snapshots are used.
+SNAPSHOT_SUFFIX = '.arrow'
+
+def _pyarrow():
+    import pyarrow
+    import pyarrow.ipc
+    return pyarrow
+
+# Pick an arrow type for a column, mixed or nested columns are stored as JSON strings
+def _column_type(pa, values):
+    types = {type(v) for v in values if v is not None}
+    if types == {bool}:
+        return pa.bool_()
+    if types == {int}:
+        return pa.int64()
+    if types and types <= {int, float}:
+        return pa.float64()
+    if types <= {str}:
+        return pa.string()
+    return None
+
+def records_to_table(data, metadata=None):
+    pa = _pyarrow()
+    keys = []
+    rows = []
+    for key, child in iter_children(data):
+        if child is None:
+            continue
+        keys.append(str(key))
+        rows.append(child if isinstance(child, dict) else {'_value': child})
+    fields = list(dict.fromkeys(field for row in rows for field in row))
+    columns = {'_key': pa.array(keys, pa.string())}
+    json_columns = []
+    for field in fields:
+        values = [row.get(field) for row in rows]
+        arrow_type = _column_type(pa, values)
+        if arrow_type is None:
+            json_columns.append(field)
+            values = [None if v is None else json.dumps(v, separators=(',', ':')) for v in values]
+            arrow_type = pa.string()
+        columns[field] = pa.array(values, arrow_type)
+    metadata = dict(metadata or {})
+    metadata['json_columns'] = json.dumps(json_columns)
+    metadata['container'] = 'list' if isinstance(data, list) else 'dict'
+    table = pa.table(columns)
+    return table.replace_schema_metadata({k: str(v) for k, v in metadata.items()})
+
+def table_metadata(schema):
+    return {k.decode(): v.decode() for k, v in (schema.metadata or {}).items()}
+
+# Rebuild the snapshot in the same shape ref.get() returns (list or dict of records)
+def table_to_records(table):
+    metadata = table_metadata(table.schema)
+    json_columns = set(json.loads(metadata.get('json_columns', '[]')))
+    columns = {name: table.column(name).to_pylist() for name in table.column_names}
+    keys = columns.pop('_key')
+    children = {}
+    for i, key in enumerate(keys):
+        record = {}
+        for field, values in columns.items():
+            value = values[i]
+            if value is None:
+                continue
+            record[field] = json.loads(value) if field in json_columns else value
+        children[key] = record['_value'] if list(record) == ['_value'] else record
+    if metadata.get('container') == 'list':
+        size = max((int(key) for key in children), default=-1) + 1
+        return [children.get(str(i)) for i in range(size)]
+    return children
+
+def list_snapshots(directory, name):
+    return sorted(Path(directory).glob(f'{name}_*{SNAPSHOT_SUFFIX}'))
+
+# ETags can contain '/', so the file name only carries a short hash and the ETag itself lives in the schema metadata
+def snapshot_etag(path):
+    pa = _pyarrow()
+    return table_metadata(pa.ipc.open_file(pa.memory_map(str(path), 'r')).schema).get('etag')
+
+def open_snapshot(path):
+    pa = _pyarrow()
+    return pa.ipc.open_file(pa.memory_map(str(path), 'r')).read_all()
+
 #----------------------------------------------------------------------------------------------------------------------
-# Database References for all of the live/verify prod databases
+# Streaming reads: the REST response is pulled in chunks and the children of the top level object (or array) are
+# decoded one at a time, so only the child being decoded and one chunk of text are ever held in memory.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Children per request when Admin.iter_children walks a reference in key order
+PAGE_SIZE = 1000
+
+_json_decoder = json.JSONDecoder()
+
+class _JsonStream:
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def more(self):
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    # Next non whitespace character, '' at the end of the stream
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\n\r':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.more():
+                return ''
 
-#Live
-prod_water_db_live = db.reference('/', app= prod_water_live)
-prod_food_db_live = db.reference('/', app= prod_food_live)
-prod_forage_db_live = db.reference('/', app= prod_forage_live)
-prod_bathroom_db_live = db.reference('/', app= prod_bathroom_live)
+    def take(self, expected):
+        char = self.peek()
+        if char not in expected:
+            raise ValueError(f'Expected one of {expected!r} in JSON stream, found {char!r}')
+        self.pos += 1
+        return char
+
+    # Decode the next complete value, reading more chunks until it is no longer cut off by the end of the buffer
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _json_decoder.raw_decode(self.buffer, self.pos)
+                # A number that runs up to (or into a partial exponent at) the end of the buffer may continue
+                # in the next chunk
+                cut_off = end == len(self.buffer) or (
+                    isinstance(value, (int, float)) and self.buffer[end] in '0123456789.eE+-')
+                if self.eof or not cut_off:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.more()
+
+# Iterate over (key, child) pairs of the JSON document in an iterable of text chunks, like iter_children does for
+# a decoded snapshot: array children are keyed by their index
+def stream_json_children(chunks):
+    stream = _JsonStream(chunks)
+    first = stream.peek()
+    if first not in ('{', '['):
+        stream.value()
+        return
+    stream.pos += 1
+    close = '}' if first == '{' else ']'
+    if stream.peek() == close:
+        stream.pos += 1
+        return
+    index = 0
+    while True:
+        if first == '{':
+            key = stream.value()
+            stream.take(':')
+        else:
+            key = index
+            index += 1
+        yield key, stream.value()
+        if stream.take(',' + close) == close:
+            return
+
+@contextlib.contextmanager
+def _no_executor():
+    yield None
+
+# Stream the children of a database reference over the REST API
+# References that don't talk to firebase over HTTP (mirrors, fakes) are read in one piece instead
+def stream_children(ref, chunk_size=STREAM_CHUNK_SIZE):
+    # A mirror forwards unknown attributes (_client included) to the reference it wraps, so check for it first
+    if isinstance(ref, _MirrorView):
+        yield from iter_children(ref.get())
+        return
+    client = getattr(ref, '_client', None)
+    if not hasattr(client, 'request') or not hasattr(ref, '_add_suffix'):
+        yield from iter_children(ref.get())
+        return
+    response = client.request('get', ref._add_suffix(), stream=True)
+    try:
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        yield from stream_json_children(decoder.decode(chunk) for chunk in response.iter_content(chunk_size))
+    finally:
+        response.close()
+
+#----------------------------------------------------------------------------------------------------------------------
+# Bulk writes: records are coalesced into multi-path ref.update() payloads instead of one request per record.
+# Firebase rejects single writes over 16MB, the caps keep each payload far below that.
+BULK_MAX_BYTES = 1024 * 1024
+BULK_MAX_PATHS = 1000
 
-#Verify
-prod_water_db_verify = db.reference('/', app= prod_water_verify)
-prod_food_db_verify = db.reference('/', app= prod_food_verify)
-prod_forage_db_verify = db.reference('/', app= prod_forage_verify)
-prod_bathroom_db_verify = db.reference('/', app= prod_bathroom_verify)
+# Split a {path: value} dict into multi-path update payloads under the byte and path caps
+def chunk_updates(updates, max_bytes=BULK_MAX_BYTES, max_paths=BULK_MAX_PATHS):
+    chunk = {}
+    chunk_bytes = 0
+    for path, value in updates.items():
+        size = len(str(path)) + len(json.dumps(value, separators=(',', ':'), default=str))
+        if chunk and (chunk_bytes + size > max_bytes or len(chunk) >= max_paths):
+            yield chunk
+            chunk = {}
+            chunk_bytes = 0
+        chunk[str(path)] = value
+        chunk_bytes += size
+    if chunk:
+        yield chunk
 
 #----------------------------------------------------------------------------------------------------------------------
-# Database References for all of the beta databases
+# Database comparison: every child of a snapshot is hashed once from its canonical JSON and the child hashes are
+# rolled up into a root hash, so equal databases are recognised from two digests and different ones are diffed
+# child by child without walking the records that did not change. Only changed children are compared field by field.
+MERKLE_DIGEST_SIZE = 16
 
-#Live
-beta_water_db_live = db.reference('/', app= beta_water_live)
-beta_food_db_live = db.reference('/', app= beta_food_live)
-beta_forage_db_live = db.reference('/', app= beta_forage_live)
-beta_bathroom_db_live = db.reference('/', app= beta_bathroom_live)
+# Per reference (snapshot the tree was built from, tree), reused as long as getDb returns the same snapshot
+_merkle_trees = weakref.WeakKeyDictionary()
 
-#Verify
-beta_water_db_verify = db.reference('/', app= beta_water_verify)
-beta_food_db_verify = db.reference('/', app= beta_food_verify)
-beta_forage_db_verify = db.reference('/', app= beta_forage_verify)
-beta_bathroom_db_verify = db.reference('/', app= beta_bathroom_verify)
+def _digest(payload):
+    return hashlib.blake2b(payload, digest_size=MERKLE_DIGEST_SIZE).digest()
+
+def node_digest(node):
+    return _digest(json.dumps(node, sort_keys=True, separators=(',', ':'), default=str).encode())
+
+# Names of the fields that differ between two children, an empty list when a child is not a dict
+def changed_fields(node, other):
+    if isinstance(node, dict) and isinstance(other, dict):
+        return sorted((field for field in node.keys() | other.keys() if node.get(field) != other.get(field)), key=str)
+    return []
+
+class MerkleTree:
+    def __init__(self, data):
+        self.data = data
+        # Child keys as strings, so a list snapshot and a dict snapshot of the same records line up
+        self.digests = {str(key): node_digest(child) for key, child in iter_children(data) if child is not None}
+        root = hashlib.blake2b(digest_size=MERKLE_DIGEST_SIZE)
+        for key in sorted(self.digests, key=key_order):
+            root.update(key.encode() + b'\0' + self.digests[key])
+        self.root = root.digest()
+
+    def child(self, key):
+        return _mirror_child(self.data, key)
+
+    def diff(self, other):
+        """
+        Children added, removed and changed going from this tree to other.
+
+        :return: dict - same, added and removed (lists of keys in firebase order) and changed (key -> changed fields)
+        """
+        report = {'same': True, 'added': [], 'removed': [], 'changed': {}}
+        if self.root == other.root:
+            return report
+        # Set operations on (key, digest) pairs find the removed and differing children in one pass
+        different = {key for key, _ in self.digests.items() - other.digests.items()}
+        removed = different - other.digests.keys()
+        report['added'] = sorted(other.digests.keys() - self.digests.keys(), key=key_order)
+        report['removed'] = sorted(removed, key=key_order)
+        for key in sorted(different - removed, key=key_order):
+            node, other_node = self.child(key), other.child(key)
+            # Children that are equal but were serialized differently (1 and 1.0) are not changes
+            if node != other_node:
+                report['changed'][key] = changed_fields(node, other_node)
+        report['same'] = not (report['added'] or report['removed'] or report['changed'])
+        return report
 
 #----------------------------------------------------------------------------------------------------------------------
-# Database References for all of the test databases
+# Encoding and decoding of structured fields (hours), which the dashboards show and edit as JSON strings.
+# Many taps share the same hours, so both directions are kept in a bounded LRU. Decoded values are kept marshalled,
+# every decode returns a fresh copy (several times cheaper than json.loads) that the caller is free to modify.
 
-#Live
-test_water_db_live = db.reference('/', app= test_water_live)
-test_food_db_live = db.reference('/', app= test_food_live)
-test_forage_db_live = db.reference('/', app= test_forage_live)
-test_bathroom_db_live = db.reference('/', app= test_bathroom_live)
+# Fields decoded when no schema says otherwise
+STRUCTURED_FIELDS = ('hours',)
 
-#Verify
-test_water_db_verify = db.reference('/', app= test_water_verify)
-test_food_db_verify = db.reference('/', app= test_food_verify)
-test_forage_db_verify = db.reference('/', app= test_forage_verify)
-test_bathroom_db_verify = db.reference('/', app= test_bathroom_verify)
+# Property names a resource schema declares as arrays or objects
+def structured_fields(schema):
+    fields = []
+    for name, subschema in schema.get('properties', {}).items():
+        kinds = subschema.get('type') if isinstance(subschema, dict) else None
+        kinds = kinds if isinstance(kinds, list) else [kinds]
+        if 'array' in kinds or 'object' in kinds:
+            fields.append(name)
+    return tuple(fields)
+
+class HoursCodec:
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.stats = {'hits': 0, 'misses': 0, 'skipped': 0, 'evictions': 0}
+        self._entries = OrderedDict()
+        self._encoded = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Decode a JSON (or Python style single quoted) string, anything else is returned as is
+    # Strings that cannot hold a list or object are skipped without trying, bad JSON raises json.JSONDecodeError
+    def decode(self, value):
+        if not isinstance(value, str):
+            return value
+        text = value.strip()
+        if not text or text[0] not in '[{':
+            self.stats['skipped'] += 1
+            return value
+        with self._lock:
+            if text in self._entries:
+                self._entries.move_to_end(text)
+                self.stats['hits'] += 1
+                return marshal.loads(self._entries[text])
+        try:
+            decoded = json.loads(text)
+        except json.JSONDecodeError:
+            decoded = json.loads(text.replace("'", '"'))
+        with self._lock:
+            self.stats['misses'] += 1
+            if self.max_entries > 0:
+                self._entries[text] = marshal.dumps(decoded)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.stats['evictions'] += 1
+        return decoded
+
+    # Encode hours as JSON text for display, anything that is not a list or dict is returned as is
+    # Hours of the usual [{'open': {day, time}, 'close': {day, time}}, ...] shape are memoized by their contents,
+    # building that key is several times cheaper than json.dumps
+    def encode(self, value):
+        if not isinstance(value, (list, dict)):
+            return value
+        try:
+            key = tuple((hour['open']['day'], hour['open']['time'], hour['close']['day'], hour['close']['time'])
+                        for hour in value if len(hour) == 2 and len(hour['open']) == 2 and len(hour['close']) == 2)
+        except (KeyError, TypeError):
+            key = None
+        if key is None or len(key) != len(value):
+            try:
+                return json.dumps(value)
+            except (TypeError, ValueError):
+                return value  # If encoding fails, leave the value as it is
+        with self._lock:
+            if key in self._encoded:
+                self._encoded.move_to_end(key)
+                self.stats['hits'] += 1
+                return self._encoded[key]
+        text = json.dumps(value)
+        with self._lock:
+            self.stats['misses'] += 1
+            if self.max_entries > 0:
+                self._encoded[key] = text
+                while len(self._encoded) > self.max_entries:
+                    self._encoded.popitem(last=False)
+                    self.stats['evictions'] += 1
+        return text
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._encoded.clear()
+
+# Shared by every Admin and dashboard, HOURS_CACHE_SIZE=0 turns the cache off
+hours_codec = HoursCodec(max_entries=int(os.getenv('HOURS_CACHE_SIZE', '4096')))
 
 #----------------------------------------------------------------------------------------------------------------------
 
 class Admin:
+    # Environment whose databases are resolved lazily (prod, beta or test)
+    dev_type = None
+
+    water_db_live = _LazyReference()
+    food_db_live = _LazyReference()
+    forage_db_live = _LazyReference()
+    bathroom_db_live = _LazyReference()
+    water_db_verify = _LazyReference()
+    food_db_verify = _LazyReference()
+    forage_db_verify = _LazyReference()
+    bathroom_db_verify = _LazyReference()
+
     # Constructor that initializes the different databases for an Admin object
-    def __init__(self, water_db_live, food_db_live, forage_db_live, bathroom_db_live, water_db_verify, food_db_verify, forage_db_verify, bathroom_db_verify):
-        self.water_db_live = water_db_live
-        self.food_db_live = food_db_live
-        self.forage_db_live = forage_db_live
-        self.bathroom_db_live = bathroom_db_live
-        self.water_db_verify = water_db_verify
-        self.food_db_verify = food_db_verify
-        self.forage_db_verify = forage_db_verify
-        self.bathroom_db_verify = bathroom_db_verify
-
-
-    # Method to convert json fields to strings specifically for the hours field
-    def convert_json_fields(self, record):
-        for key in record:
-            if isinstance(record[key], str) and key == 'hours':
-                # print(f'Original: {record[key]}')
+    # References that are not passed in are created on first access from dev_type
+    def __init__(self, water_db_live=None, food_db_live=None, forage_db_live=None, bathroom_db_live=None, water_db_verify=None, food_db_verify=None, forage_db_verify=None, bathroom_db_verify=None):
+        refs = {
+            'water_db_live': water_db_live,
+            'food_db_live': food_db_live,
+            'forage_db_live': forage_db_live,
+            'bathroom_db_live': bathroom_db_live,
+            'water_db_verify': water_db_verify,
+            'food_db_verify': food_db_verify,
+            'forage_db_verify': forage_db_verify,
+            'bathroom_db_verify': bathroom_db_verify,
+        }
+        for name, ref in refs.items():
+            if ref is not None:
+                setattr(self, name, ref)
+
+
+    # Method to convert json strings back to objects, by default only for the hours field
+    def convert_json_fields(self, record, fields=STRUCTURED_FIELDS):
+        for key in fields:
+            if isinstance(record.get(key), str):
                 try:
-                    record[key] = json.loads(record[key].replace("'", '"'))
-                    # print(f'Converted: {record[key]}')
+                    record[key] = hours_codec.decode(record[key])
                 except json.JSONDecodeError as e:
                     print(f'Error converting field: {e}')
-                    pass
         return record
     
-    # Method to get data from a given database reference
-    def getDb(self, ref):
+    # Method to get data from a given database reference, served from the snapshot cache when it is enabled
+    # Pass cached=False to force a plain full download
+    def getDb(self, ref, cached=True):
+        if cached and snapshot_cache.max_entries > 0:
+            return snapshot_cache.get(ref)
         ref_db = ref.get()
         return ref_db
 
     # Method to set data in a given database reference
     def setDb(self, ref):
         ref_db = ref.set()
+        self.invalidateCache(ref)
         return ref_db
 
     # Method to get changed data from a given database reference and URL
@@ -157,81 +874,285 @@ class Admin:
                 count += 1
         print(count)
 
-    # Method to compare two database references to see if their data is the same
+    # Method to build (or reuse) the Merkle tree of a given database reference or snapshot file
+    # The tree of a reference is only rebuilt when getDb returns a new snapshot, so an unchanged database is not rehashed
+    def getTree(self, ref):
+        if isinstance(ref, (str, Path)):
+            return MerkleTree(self.loadSnapshot(ref))
+        data = self.getDb(ref)
+        cached_data, tree = _merkle_trees.get(ref, (None, None))
+        if tree is None or cached_data is not data:
+            tree = MerkleTree(data)
+            _merkle_trees[ref] = (data, tree)
+        return tree
+
+    # Method to compare two database references (or snapshot files) to see if their data is the same
+    # Returns the keys only in alt_ref (added), only in ref (removed) and the changed keys with their changed fields
     def dbComparison(self, ref, alt_ref):
-        ref_data = self.getDb(ref)
-        alt_ref_data = self.getDb(alt_ref)
-        if ref_data == alt_ref_data:
+        report = self.getTree(ref).diff(self.getTree(alt_ref))
+        if report['same']:
             print("The databases are the same")
         else:
             print("The databases are not the same")
+            print(f"{len(report['added'])} added, {len(report['removed'])} removed, {len(report['changed'])} changed")
+        return report
+
+    # Method to write a {path: value} dict to a given database reference as chunked multi-path updates
+    # Returns one report per chunk with its size, timing and error (None when the chunk was written)
+    def bulkUpdate(self, ref, updates, max_bytes=BULK_MAX_BYTES, max_paths=BULK_MAX_PATHS):
+        reports = []
+        for i, chunk in enumerate(chunk_updates(updates, max_bytes, max_paths)):
+            start = time.perf_counter()
+            error = None
+            try:
+                ref.update(chunk)
+            except Exception as e:
+                error = str(e)
+            report = {
+                'chunk': i,
+                'paths': len(chunk),
+                'first_path': next(iter(chunk)),
+                'seconds': time.perf_counter() - start,
+                'error': error,
+            }
+            reports.append(report)
+            if error is None:
+                print(f"Chunk {i}: wrote {report['paths']} paths in {report['seconds']:.3f} secs")
+            else:
+                print(f"Chunk {i}: failed to write {report['paths']} paths starting at {report['first_path']}: {error}")
+        if reports:
+            self.invalidateCache(ref)
+        return reports
 
     # Method to update a given database reference with changed data from a URL, iterating through the data
-    def updateChangedDbIter(self, ref, url, iterate: str):
+    def updateChangedDbIter(self, ref, url, iterate: str, bulk=False):
         changed = self.getChangedData(ref, url)
         count = 0
+        updates = {}
         for dict in changed:
             if dict[iterate] == count:
-                ref.update({count: dict})
+                if bulk:
+                    updates[count] = dict
+                else:
+                    ref.update({count: dict})
+                    print(count + 1)
                 count += 1
-                print(count)
+        if bulk:
+            return self.bulkUpdate(ref, updates)
+        self.invalidateCache(ref)
 
     # Method to update a given database reference with changed data from a URL
-    def updateChangedDb(self, ref, url):
+    def updateChangedDb(self, ref, url, bulk=False):
         changed = self.getChangedData(ref, url)
         count = 0
+        updates = {}
         for dict in changed:
-            ref.update({count: dict})
+            if bulk:
+                updates[count] = dict
+            else:
+                ref.update({count: dict})
+                print(count + 1)
             count += 1
-            print(count)
+        if bulk:
+            return self.bulkUpdate(ref, updates)
+        self.invalidateCache(ref)
 
     # Method to update a given database reference with data from another reference, iterating through the data
-    def updateDbIter(self, ref, alt_ref, iterate: str):
-        alt_ref_data = self.getDb(alt_ref)
+    # With stream=True the source is streamed record by record, with page_size it is read page_size records per
+    # request, instead of downloaded in one piece
+    def updateDbIter(self, ref, alt_ref, iterate: str, bulk=False, stream=False, page_size=None):
+        alt_ref_data = self.iterRecords(alt_ref, stream, page_size)
         count = 0
+        updates = {}
         for dict in alt_ref_data:
             if dict[iterate] == count:
-                ref.update({count: dict})
+                if bulk:
+                    updates[count] = dict
+                else:
+                    ref.update({count: dict})
+                    print(count + 1)
                 count += 1
-                print(count)
+        if bulk:
+            return self.bulkUpdate(ref, updates)
+        self.invalidateCache(ref)
 
-    # Method to delete a node from a given database reference
-    def deleteNode(self, ref):
-        for node in ref.get():
-            ref.child(node).delete()
+    # Method to delete every child of a given database reference, one multi-path update per page of children
+    def deleteNode(self, ref, page_size=PAGE_SIZE):
+        for page in self.iterPages(ref, page_size, prefetch=True):
+            ref.update({key: None for key, _ in page})
+        self.invalidateCache(ref)
 
     # Method to add data to a given database reference
     def addToDb(self, ref, data):
         ref.push(data)
+        self.invalidateCache(ref)
+
+    # Method to dump a given database reference to a memory-mappable snapshot file in directory
+    # If the newest snapshot of name still matches the database ETag it is reused instead of writing a new one
+    def dumpSnapshot(self, ref, directory, name):
+        pa = _pyarrow()
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        snapshots = list_snapshots(directory, name)
+        if snapshots:
+            changed, data, etag = ref.get_if_changed(snapshot_etag(snapshots[-1]))
+            if not changed:
+                return snapshots[-1]
+        else:
+            data, etag = ref.get(etag=True)
+        created = dt.datetime.now(dt.timezone.utc)
+        table = records_to_table(data, {'name': name, 'etag': etag, 'created': created.isoformat(), 'path': ref.path})
+        etag_hash = hashlib.sha1(str(etag).encode('utf-8')).hexdigest()[:12]
+        path = directory / f"{name}_{created.strftime('%Y%m%dT%H%M%S%f')}_{etag_hash}{SNAPSHOT_SUFFIX}"
+        tmp_path = path.with_suffix('.tmp')
+        with pa.OSFile(str(tmp_path), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+        return path
+
+    # Method to load a snapshot file (or the newest snapshot of name in a directory) as getDb would return it
+    def loadSnapshot(self, path, name=None):
+        if name is not None:
+            snapshots = list_snapshots(path, name)
+            if not snapshots:
+                raise FileNotFoundError(f'No {name} snapshot in {path}')
+            path = snapshots[-1]
+        return table_to_records(open_snapshot(path))
+
+    # Method to count the records under a given database reference with a shallow read (keys only, no payload)
+    def getShallowCount(self, ref):
+        keys = ref.get(shallow=True)
+        if isinstance(keys, list):
+            return sum(1 for key in keys if key is not None)
+        if isinstance(keys, dict):
+            return len(keys)
+        return 0
+
+    # Method to run an ordered firebase query on a given database reference, returns [(key, child), ...] in query order
+    # order_by is a child field, or None to order by key. Ordering by a child field needs an .indexOn rule for it
+    def queryChildren(self, ref, order_by=None, start_at=None, end_at=None, equal_to=None, limit=None):
+        query = ref.order_by_key() if order_by is None else ref.order_by_child(order_by)
+        if equal_to is not None:
+            query = query.equal_to(equal_to)
+        if start_at is not None:
+            query = query.start_at(start_at)
+        if end_at is not None:
+            query = query.end_at(end_at)
+        if limit is not None:
+            query = query.limit_to_first(limit)
+        children = [(str(key), child) for key, child in iter_children(query_result(query)) if child is not None]
+        # JSON objects carry no order, put the children back in the order firebase applied the query in
+        if order_by is None:
+            children.sort(key=lambda item: key_order(item[0]))
+        else:
+            children.sort(key=lambda item: (value_order(child_value(item[1], order_by)), key_order(item[0])))
+        return children
 
     # Method to count the number of entries in a given database reference
-    def getCount(self, ref):
+    # With stream=True the entries are counted while they stream in, with page_size they are counted page by page
+    def getCount(self, ref, stream=False, page_size=None):
         count = 0
-        for dict in self.getDb(ref):
+        for dict in self.iterRecords(ref, stream, page_size):
             count += 1
         return count
-    # Method to get a specific tap from a given database reference based on their unique tapnum
-    def getTap(self, ref, tapnum):
-        taps = self.getDb(ref)
-        try:
-            for tap in taps:
-                try:
-                    if tap['tapnum'] == tapnum:
-                        return tap
-                except:
-                   pass
-                try:
-                    if tap['foodnum'] == tapnum:
-                        return tap
-                except:
-                    pass
-        except:
-            pass
+
+    # Method to iterate over the records of a given database reference, streamed, paged or from getDb
+    def iterRecords(self, ref, stream=False, page_size=None):
+        if page_size:
+            return (child for _, child in self.iter_children(ref, page_size, prefetch=True))
+        if stream:
+            return (child for _, child in self.streamDb(ref))
+        return self.getDb(ref)
+
+    # Method to walk the children of a given database reference in key order as lists of (key, child) pairs,
+    # with one order_by_key().start_at().limit_to_first() query per page
+    # With prefetch=True the next page is requested on a background thread while the current one is processed
+    def iterPages(self, ref, page_size=PAGE_SIZE, prefetch=False):
+        def fetch(start_key):
+            if start_key is None:
+                return self.queryChildren(ref, limit=page_size)
+            # start_at is inclusive, ask for one more child and drop the one the last page ended on
+            page = self.queryChildren(ref, start_at=start_key, limit=page_size + 1)
+            return [(key, child) for key, child in page if key != start_key][:page_size]
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='prefetch') if prefetch else _no_executor() as pool:
+            page = fetch(None)
+            while page:
+                last_key = page[-1][0] if len(page) == page_size else None
+                pending = pool.submit(fetch, last_key) if pool is not None and last_key is not None else None
+                yield page
+                if last_key is None:
+                    return
+                page = pending.result() if pending is not None else fetch(last_key)
+
+    # Method to iterate over the (key, child) pairs of a given database reference in key order, page_size per request
+    def iter_children(self, ref, page_size=PAGE_SIZE, prefetch=False):
+        for page in self.iterPages(ref, page_size, prefetch):
+            yield from page
+
+    # Method to iterate over the (key, child) pairs of a given database reference while the download streams in
+    # The cache is bypassed, so the whole database is never held in memory
+    def streamDb(self, ref, chunk_size=STREAM_CHUNK_SIZE):
+        return stream_children(ref, chunk_size)
+
+    # Method to build (or reuse) the id -> (child key, record) index of a given database reference
+    # Within TAP_INDEX_TTL of the last check the index is returned without touching the database, after that it is
+    # only rebuilt when getDb returns a new snapshot. Indexes of a MirroredRef are checked on every call, reading a
+    # mirror is free. revalidate=True checks the snapshot even within both TTLs, before writing through the index
+    def getIndex(self, ref, revalidate=False):
+        cached = _tap_indexes.get(ref)
+        if not revalidate and not isinstance(ref, _MirrorView) and cached is not None and time.monotonic() - cached[2] < TAP_INDEX_TTL:
+            return cached[1]
+        if revalidate:
+            snapshot_cache.expire(ref)
+        data = self.getDb(ref)
+        if cached is not None and cached[0] is data:
+            index = cached[1]
+        else:
+            index = {}
+            for key, tap in iter_children(data):
+                if isinstance(tap, dict):
+                    for field in ID_FIELDS:
+                        if field in tap:
+                            index.setdefault(tap[field], (key, tap))
+        _tap_indexes[ref] = (data, index, time.monotonic())
+        return index
+
+    # Method to drop the cached index and snapshots of a given database reference after its data has been changed
+    # Writes through a mirror land on the reference it wraps, so that reference's snapshots are dropped as well
+    def invalidateCache(self, ref):
+        _tap_indexes.pop(ref, None)
+        snapshot_cache.invalidate(ref)
+        if isinstance(ref, _MirrorView):
+            snapshot_cache.invalidate(ref._wrapped())
+
+    # Method to get a specific tap from a given database reference based on their unique tapnum (or foodnum/foragenum)
+    # With fresh=True the indexed child is re-read from firebase, otherwise the indexed record is returned as is
+    # A tap that is missing from the index or has moved is read once from the child keyed by its tapnum (where
+    # updateTap writes it). An index entry that turned out stale drops the index, so the next lookup rebuilds it
+    def getTap(self, ref, tapnum, fresh=True):
+        entry = self.getIndex(ref).get(tapnum)
+        if entry is not None:
+            key, tap = entry
+            if not fresh:
+                return tap
+            tap = ref.child(str(key)).get()
+            if isinstance(tap, dict) and any(tap.get(field) == tapnum for field in ID_FIELDS):
+                return tap
+            _tap_indexes.pop(ref, None)
+            if str(key) == str(tapnum):
+                return None
+        tap = ref.child(str(tapnum)).get()
+        if isinstance(tap, dict) and any(tap.get(field) == tapnum for field in ID_FIELDS):
+            return tap
+        return None
 
     # Method to delete a specific tap from a given database reference based on their tapnum number
     def deleteTap(self, ref, tapnum):
         try:
             ref.child(str(tapnum)).delete()
+            self.invalidateCache(ref)
         except:
             print("No tap found")
             
@@ -239,35 +1160,40 @@ class Admin:
     def updateTap(self, ref, tapnum, data):
         try:
             ref.child(str(int(tapnum))).update(data)
+            self.invalidateCache(ref)
         except:
             print(data)
             print("No tap found")
 
-        # Method to update a given database reference with data from another reference
-
-
-    def updateDb(self, ref, dict_list):
+    # Method to update a given database reference with a list of records keyed by their tapnum
+    # With bulk=True every field becomes its own "<tapnum>/<field>" path, so the multi-path update merges
+    # into existing taps exactly like updateTap does
+    def updateDb(self, ref, dict_list, bulk=False):
+        updates = {}
         for record in dict_list:
             if isinstance(record, dict):
                 tapnum = record.get('tapnum')
                 if tapnum is not None:
                     record = self.convert_json_fields(record)
-                    self.updateTap(ref, tapnum, record)
+                    if bulk:
+                        for field, value in record.items():
+                            updates[f'{int(tapnum)}/{field}'] = value
+                    else:
+                        self.updateTap(ref, tapnum, record)
             else:
                 print(f'Invalid record: {record}')
+        if bulk:
+            return self.bulkUpdate(ref, updates)
 
 
 
 class prodAdmin(Admin):
-    def __init__(self):
-        super().__init__(prod_water_db_live, prod_food_db_live, prod_forage_db_live, prod_bathroom_db_live, prod_water_db_verify, prod_food_db_verify, prod_forage_db_verify, prod_bathroom_db_verify)
+    dev_type = 'prod'
 
 
 class betaAdmin(Admin):
-    def __init__(self):
-        super().__init__(beta_water_db_live, beta_food_db_live, beta_forage_db_live, beta_bathroom_db_live, beta_water_db_verify, beta_food_db_verify, beta_forage_db_verify, beta_bathroom_db_verify)
+    dev_type = 'beta'
 
 
 class testAdmin(Admin):
-    def __init__(self):
-        super().__init__(test_water_db_live, test_food_db_live, test_forage_db_live, test_bathroom_db_live, test_water_db_verify, test_food_db_verify, test_forage_db_verify, test_bathroom_db_verify)
+    dev_type = 'test'
@@ -0,0 +1,535 @@
+# In-process stand-in for a Firebase Realtime Database, for benchmarking Admin without live credentials
+#
+# FakeReference mimics the parts of firebase_admin.db.Reference that admin_classes uses (get with shallow
+# reads and ETags, get_if_changed, set, multi-path update, push, delete, ordered queries and listen), so it
+# can be passed anywhere a real reference is expected:
+#
+#   from admin.fake_rtdb import FakeDatabase
+#   fake_db = FakeDatabase(latency=0.005)
+#   ref = fake_db.reference()
+#   ref.set([{'tapnum': 0}, {'tapnum': 1}])
+#   prodAdmin().getTap(ref, 1)
+#   print(fake_db.requests)
+#
+# FakeServer serves the same databases over the REST API on localhost, for code that talks to firebase through
+# the SDK (one database per ?ns= namespace). GETs with Accept: text/event-stream get the streaming API: a put of the
+# current data, then every change as chunked server-sent events, until drop_streams() cuts them off:
+#
+#   server = FakeServer(latency=0.005).start()
+#   firebase_admin.initialize_app(cred, {'databaseURL': server.url('phlask')})
+import copy
+import hashlib
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+# Firebase stores arrays as objects keyed "0", "1", ... and only hands them back as lists
+# when the keys are integers and more than half of the slots are filled
+def _to_tree(value):
+    if isinstance(value, list):
+        value = {str(i): v for i, v in enumerate(value)}
+    if isinstance(value, dict):
+        tree = {}
+        for key, child in value.items():
+            child = _to_tree(child)
+            if child is not None:
+                tree[str(key)] = child
+        return tree or None
+    return value
+
+def _from_tree(tree):
+    if not isinstance(tree, dict):
+        return tree
+    data = {key: _from_tree(child) if isinstance(child, dict) else child for key, child in tree.items()}
+    if all(key.isdigit() for key in data):
+        size = max(int(key) for key in data) + 1
+        if len(data) * 2 > size:
+            return [data.get(str(i)) for i in range(size)]
+    return data
+
+def _split(path):
+    return [part for part in str(path).split('/') if part]
+
+def _overlap(a, b):
+    size = min(len(a), len(b))
+    return a[:size] == b[:size]
+
+# Firebase orders keys that parse as 32 bit integers numerically, ahead of every other key
+def _key_order(key):
+    key = str(key)
+    digits = key[1:] if key.startswith('-') else key
+    if digits.isdigit() and -2**31 <= int(key) < 2**31:
+        return (0, int(key), '')
+    return (1, 0, key)
+
+# null < false < true < numbers < strings < objects
+def _value_order(value):
+    if value is None:
+        return (0, 0, '')
+    if value is False:
+        return (1, 0, '')
+    if value is True:
+        return (2, 0, '')
+    if isinstance(value, (int, float)):
+        return (3, value, '')
+    if isinstance(value, str):
+        return (4, 0, value)
+    return (5, 0, '')
+
+
+class FakeDatabase:
+    # latency is the number of seconds every request sleeps, to stand in for the network round trip
+    def __init__(self, data=None, latency=0.0):
+        self.root = _to_tree(copy.deepcopy(data))
+        self.latency = latency
+        self.requests = Counter()
+        self.base_url = f'fake://{uuid.uuid4().hex}/'
+        self._lock = threading.Lock()
+        self._listeners = []
+        # Encoded JSON (and ETag) of every path read since the last write, reads decode it like the SDK would
+        self._payloads = {}
+
+    def reference(self, path='/'):
+        return FakeReference(self, path)
+
+    def reset_counts(self):
+        self.requests.clear()
+
+    def _request(self, method):
+        self.requests[method] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _read(self, parts):
+        node = self.root
+        for part in parts:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def _write(self, parts, value):
+        self._payloads.clear()
+        value = _to_tree(copy.deepcopy(value))
+        if not parts:
+            self.root = value
+            return
+        if not isinstance(self.root, dict):
+            self.root = {}
+        nodes = [self.root]
+        for part in parts[:-1]:
+            if not isinstance(nodes[-1].get(part), dict):
+                nodes[-1][part] = {}
+            nodes.append(nodes[-1][part])
+        if value is None:
+            nodes[-1].pop(parts[-1], None)
+        else:
+            nodes[-1][parts[-1]] = value
+        # Writing null can leave empty parents behind, firebase drops those
+        for depth in range(len(nodes) - 1, 0, -1):
+            if nodes[depth]:
+                break
+            nodes[depth - 1].pop(parts[depth - 1], None)
+        if not self.root:
+            self.root = None
+
+    def _payload(self, parts):
+        key = tuple(parts)
+        if key not in self._payloads:
+            payload = json.dumps(_from_tree(self._read(parts)), separators=(',', ':'))
+            self._payloads[key] = (payload, hashlib.md5(payload.encode('utf-8')).hexdigest())
+        return self._payloads[key]
+
+    def _load(self, parts):
+        return json.loads(self._payload(parts)[0])
+
+    def _etag(self, parts):
+        return self._payload(parts)[1]
+
+    # Queue the events a write of paths (relative to base) causes for every listener, called with the lock held
+    # Listeners at or above base get one put (or a patch for multi-path updates), listeners below base that
+    # overlap a written path get a put of their whole location
+    def _notify(self, base, paths, patch=False):
+        for listener in list(self._listeners):
+            target = listener.parts
+            if target == base[:len(target)]:
+                relative = base[len(target):]
+                if patch:
+                    data = {'/'.join(_split(path)): _from_tree(self._read(base + _split(path))) for path in paths}
+                    listener.events.put(FakeEvent('patch', '/' + '/'.join(relative), data))
+                else:
+                    listener.events.put(FakeEvent('put', '/' + '/'.join(relative), _from_tree(self._read(base))))
+            elif any(_overlap(target, base + _split(path)) for path in paths):
+                listener.events.put(FakeEvent('put', '/', _from_tree(self._read(target))))
+
+
+class FakeReference:
+    def __init__(self, database, path='/'):
+        self._database = database
+        # Same attribute name as firebase_admin.db.Reference, so admin_classes.reference_key works on both
+        self._client = database
+        self._parts = _split(path)
+        self.path = '/' + '/'.join(self._parts)
+        self.key = self._parts[-1] if self._parts else None
+
+    @property
+    def parent(self):
+        if not self._parts:
+            return None
+        return FakeReference(self._database, '/'.join(self._parts[:-1]))
+
+    def child(self, path):
+        if not path or not isinstance(path, str):
+            raise ValueError(f'Invalid path argument: "{path}". Path must be a non-empty string.')
+        return FakeReference(self._database, '/'.join(self._parts + _split(path)))
+
+    def get(self, etag=False, shallow=False):
+        if etag and shallow:
+            raise ValueError('etag and shallow cannot both be set to True.')
+        self._database._request('get')
+        with self._database._lock:
+            node = self._database._read(self._parts)
+            if shallow:
+                return {key: True for key in node} if isinstance(node, dict) else node
+            data = self._database._load(self._parts)
+            if etag:
+                return data, self._database._etag(self._parts)
+            return data
+
+    def get_if_changed(self, etag):
+        self._database._request('get_if_changed')
+        with self._database._lock:
+            current = self._database._etag(self._parts)
+            if current == etag:
+                return False, None, None
+            return True, self._database._load(self._parts), current
+
+    def set(self, value):
+        self._database._request('set')
+        with self._database._lock:
+            self._database._write(self._parts, value)
+            self._database._notify(self._parts, [''])
+
+    # Multi-path update, every key is a path relative to this reference
+    def update(self, value):
+        if not isinstance(value, dict) or not value:
+            raise ValueError('Value argument must be a non-empty dictionary.')
+        self._database._request('update')
+        with self._database._lock:
+            for path, child in value.items():
+                self._database._write(self._parts + _split(path), child)
+            self._database._notify(self._parts, [str(path) for path in value], patch=True)
+
+    def push(self, value=''):
+        key = uuid.uuid4().hex
+        self._database._request('push')
+        with self._database._lock:
+            self._database._write(self._parts + [key], value)
+            self._database._notify(self._parts + [key], [''])
+        return self.child(key)
+
+    def delete(self):
+        self._database._request('delete')
+        with self._database._lock:
+            self._database._write(self._parts, None)
+            self._database._notify(self._parts, [''])
+
+    def order_by_child(self, path):
+        return FakeQuery(self, path)
+
+    def order_by_key(self):
+        return FakeQuery(self, '$key')
+
+    def order_by_value(self):
+        return FakeQuery(self, '$value')
+
+    # Events are delivered on a background thread, starting with a put of the current data like firebase does
+    def listen(self, callback):
+        self._database._request('listen')
+        registration = FakeListenerRegistration(self._parts, callback)
+        with self._database._lock:
+            registration.events.put(FakeEvent('put', '/', _from_tree(self._database._read(self._parts))))
+            self._database._listeners.append(registration)
+        registration.start(self._database)
+        return registration
+
+
+class FakeQuery:
+    def __init__(self, reference, order_by):
+        self._reference = reference
+        self._order_by = order_by
+        self._start = None
+        self._end = None
+        self._limit_first = None
+        self._limit_last = None
+
+    def start_at(self, start):
+        self._start = start
+        return self
+
+    def end_at(self, end):
+        self._end = end
+        return self
+
+    def equal_to(self, value):
+        self._start = self._end = value
+        return self
+
+    def limit_to_first(self, limit):
+        self._limit_first = limit
+        return self
+
+    def limit_to_last(self, limit):
+        self._limit_last = limit
+        return self
+
+    def _order(self, key, child):
+        if self._order_by == '$key':
+            return _key_order(key)
+        if self._order_by != '$value':
+            for part in _split(self._order_by):
+                child = child.get(part) if isinstance(child, dict) else None
+        return _value_order(child)
+
+    def _bound(self, value):
+        return _key_order(value) if self._order_by == '$key' else _value_order(value)
+
+    # Results come back as an OrderedDict in query order, like the SDK sorts them
+    def get(self):
+        database = self._reference._database
+        database._request('query')
+        with database._lock:
+            node = database._read(self._reference._parts)
+            if not isinstance(node, dict):
+                return node
+            entries = sorted(((self._order(key, child), _key_order(key)), key, child) for key, child in node.items())
+        if self._start is not None:
+            entries = [entry for entry in entries if entry[0][0] >= self._bound(self._start)]
+        if self._end is not None:
+            entries = [entry for entry in entries if entry[0][0] <= self._bound(self._end)]
+        if self._limit_first is not None:
+            entries = entries[:self._limit_first]
+        if self._limit_last is not None:
+            entries = entries[-self._limit_last:] if self._limit_last else []
+        return OrderedDict((key, _from_tree(child)) for _, key, child in entries)
+
+
+class FakeEvent:
+    def __init__(self, event_type, path, data):
+        self.event_type = event_type
+        self.path = path
+        self.data = data
+
+
+class FakeListenerRegistration:
+    def __init__(self, parts, callback):
+        self.parts = parts
+        self.events = queue.Queue()
+        self._callback = callback
+        self._database = None
+        self._thread = None
+
+    def start(self, database):
+        self._database = database
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            event = self.events.get()
+            if event is None:
+                return
+            self._callback(event)
+
+    def close(self):
+        with self._database._lock:
+            if self in self._database._listeners:
+                self._database._listeners.remove(self)
+        self.events.put(None)
+        self._thread.join()
+
+
+# Realtime Database REST API on top of FakeDatabase, enough of it for firebase_admin.db to run against
+class _RestHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _reference(self):
+        url = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        path = url.path[:-len('.json')] if url.path.endswith('.json') else url.path
+        return self.server.fake.database(params.get('ns')).reference(path), params
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'null')
+
+    def _send(self, status, data=None, etag=None):
+        payload = b'' if status in (204, 304) else json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        if etag is not None:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    # Streaming REST API: the current data as a put, then a put or patch per change and a keep-alive when idle
+    def _stream(self, ref):
+        database = ref._database
+        database._request('listen')
+        registration = FakeListenerRegistration(ref._parts, None)
+        with database._lock:
+            registration.events.put(FakeEvent('put', '/', _from_tree(database._read(ref._parts))))
+            database._listeners.append(registration)
+        self.server.fake._add_stream(registration)
+        self.protocol_version = 'HTTP/1.1'
+        self.close_connection = True
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            while True:
+                try:
+                    event = registration.events.get(timeout=self.server.fake.keep_alive)
+                except queue.Empty:
+                    event = FakeEvent('keep-alive', None, None)
+                if event is None:
+                    return
+                if event.event_type == 'keep-alive':
+                    message = 'event: keep-alive\ndata: null\n\n'
+                else:
+                    message = f'event: {event.event_type}\ndata: {json.dumps({"path": event.path, "data": event.data})}\n\n'
+                payload = message.encode('utf-8')
+                self.wfile.write(f'{len(payload):x}\r\n'.encode() + payload + b'\r\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with database._lock:
+                if registration in database._listeners:
+                    database._listeners.remove(registration)
+            self.server.fake._remove_stream(registration)
+
+    def do_GET(self):
+        ref, params = self._reference()
+        if 'text/event-stream' in self.headers.get('Accept', ''):
+            return self._stream(ref)
+        if 'orderBy' in params:
+            query = FakeQuery(ref, json.loads(params['orderBy']))
+            if 'startAt' in params:
+                query.start_at(json.loads(params['startAt']))
+            if 'endAt' in params:
+                query.end_at(json.loads(params['endAt']))
+            if 'equalTo' in params:
+                query.equal_to(json.loads(params['equalTo']))
+            if 'limitToFirst' in params:
+                query.limit_to_first(int(params['limitToFirst']))
+            if 'limitToLast' in params:
+                query.limit_to_last(int(params['limitToLast']))
+            result = query.get()
+            return self._send(200, dict(result) if isinstance(result, OrderedDict) else result)
+        if self.headers.get('if-none-match'):
+            changed, data, etag = ref.get_if_changed(self.headers['if-none-match'])
+            return self._send(200, data, etag) if changed else self._send(304)
+        if self.headers.get('X-Firebase-ETag') == 'true':
+            data, etag = ref.get(etag=True)
+            return self._send(200, data, etag)
+        return self._send(200, ref.get(shallow=params.get('shallow') == 'true'))
+
+    def do_PUT(self):
+        ref, params = self._reference()
+        value = self._body()
+        expected = self.headers.get('if-match')
+        if expected is not None:
+            data, etag = ref.get(etag=True)
+            if etag != expected:
+                return self._send(412, data, etag)
+        ref.set(value)
+        if params.get('print') == 'silent':
+            return self._send(204)
+        data, etag = ref.get(etag=True)
+        return self._send(200, data, etag)
+
+    def do_PATCH(self):
+        ref, params = self._reference()
+        value = self._body()
+        try:
+            ref.update(value)
+        except ValueError as e:
+            return self._send(400, {'error': str(e)})
+        return self._send(204) if params.get('print') == 'silent' else self._send(200, value)
+
+    def do_POST(self):
+        ref, _ = self._reference()
+        return self._send(200, {'name': ref.push(self._body()).key})
+
+    def do_DELETE(self):
+        ref, _ = self._reference()
+        ref.delete()
+        return self._send(200, None)
+
+
+class FakeServer:
+    # databases maps namespace -> FakeDatabase, missing namespaces are created empty on first use
+    def __init__(self, databases=None, latency=0.0, host='127.0.0.1', port=0, keep_alive=30.0):
+        self.databases = dict(databases or {})
+        self.latency = latency
+        self.keep_alive = keep_alive
+        self._lock = threading.Lock()
+        self._streams = set()
+        self._httpd = ThreadingHTTPServer((host, port), _RestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread = None
+
+    @property
+    def address(self):
+        host, port = self._httpd.server_address[:2]
+        return f'{host}:{port}'
+
+    # databaseURL for firebase_admin.initialize_app, or set FIREBASE_DATABASE_EMULATOR_HOST=server.address
+    def url(self, namespace):
+        return f'http://{self.address}/?ns={namespace}'
+
+    # The SDK's listen() leaves ?ns= out of the stream URL, requests without one go to the first database
+    def database(self, namespace=None):
+        with self._lock:
+            if namespace is None:
+                namespace = next(iter(self.databases), '')
+            if namespace not in self.databases:
+                self.databases[namespace] = FakeDatabase(latency=self.latency)
+            return self.databases[namespace]
+
+    def _add_stream(self, registration):
+        with self._lock:
+            self._streams.add(registration)
+
+    def _remove_stream(self, registration):
+        with self._lock:
+            self._streams.discard(registration)
+
+    # Close every open event stream, as a network drop or a server restart would
+    def drop_streams(self):
+        with self._lock:
+            streams = list(self._streams)
+        for registration in streams:
+            registration.events.put(None)
+        return len(streams)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.drop_streams()
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -3,12 +3,30 @@ from firebase_admin import credentials
 from firebase_admin import db
 import boto3
 import json
+import threading
+import time
 
-s3 = boto3.resource('s3')
+#----------------------------------------------------------------------------------------------------------------------
+#creds for initializing firebase admin, read from S3 on first use so cold starts only pay for it when a database is touched
+_cred = None
+
+def get_credentials():
+    global _cred
+    if _cred is None:
+        s3 = boto3.resource('s3')
+        content_object = s3.Object('phlaskkey', 'phlask.json')
+        file_content = content_object.get()['Body'].read().decode('utf-8')
+        json_data = json.loads(file_content)
+        _cred = credentials.Certificate(json_data)
+        initialize_firebase_app('[DEFAULT]', _cred, 'https://phlask-pyrebase-default-rtdb.firebaseio.com/')
+    return _cred
+
+def initialize_firebase_app(app_name, cred, database_url):
+    try:
+        return firebase_admin.get_app(app_name)
+    except ValueError:
+        return firebase_admin.initialize_app(cred, {'databaseURL': database_url}, name=app_name)
 
-content_object = s3.Object('phlaskkey', 'phlask.json')
-file_content = content_object.get()['Body'].read().decode('utf-8')
-json_data = json.loads(file_content)
 #----------------------------------------------------------------------------------------------------------------------
 # Prod database URL's
 pointer_url = "https://phlask-web-map-food-hours.firebaseio.com/"
@@ -40,55 +58,145 @@ test_forage_url_live = "https://phlask-web-map-test-foraging-live.firebaseio.com
 test_forage_url_verify = "https://phlask-web-map-test-foraging-verify.firebaseio.com/"
 test_bathroom_url_live = "https://phlask-web-map-test-bathroom-live.firebaseio.com/"
 test_bathroom_url_verify = "https://phlask-web-map-test-bathroom-verify.firebaseio.com/"
-#----------------------------------------------------------------------------------------------------------------------
-#creds for initializing firebase admin
 
-cred = credentials.Certificate(json_data)
-firebase_admin.initialize_app(cred, { 'databaseURL': 'https://phlask-pyrebase-default-rtdb.firebaseio.com/' })
-#----------------------------------------------------------------------------------------------------------------------
-# initialize firebase admin Prod DB's
-pointer_init =  firebase_admin.initialize_app(cred, { 'databaseURL': pointer_url}, name="pointer_app")
-prod_water_live=firebase_admin.initialize_app(cred, { 'databaseURL': prod_water_url_live }, name="prod_water_live") #name is the app name
-prod_food_live=firebase_admin.initialize_app(cred, { 'databaseURL': prod_food_url_live }, name="prod_food_live") #name is the app name
-prod_forage_live=firebase_admin.initialize_app(cred, { 'databaseURL': prod_forage_url_live }, name="prod_forage_live") #name is the app name
-prod_bathroom_live=firebase_admin.initialize_app(cred, { 'databaseURL': prod_bathroom_url_live }, name="prod_bathroom_live") #name is the app name
-#----------------------------------------------------------------------------------------------------------------------
-# initialize firebase admin Beta DB's
-beta_water_live=firebase_admin.initialize_app(cred, { 'databaseURL': beta_water_url_live }, name="beta_water_live") #name is the app name
-beta_food_live=firebase_admin.initialize_app(cred, { 'databaseURL': beta_food_url_live }, name="beta_food_live") #name is the app name
-beta_forage_live=firebase_admin.initialize_app(cred, { 'databaseURL': beta_forage_url_live }, name="beta_forage_live") #name is the app name
-beta_bathroom_live=firebase_admin.initialize_app(cred, { 'databaseURL': beta_bathroom_url_live }, name="beta_bathroom_live") #name is the app name
-#----------------------------------------------------------------------------------------------------------------------
-# initialize firebase admin Test DB's
-test_water_live=firebase_admin.initialize_app(cred, { 'databaseURL': test_water_url_live }, name="test_water_live") #name is the app name
-test_food_live=firebase_admin.initialize_app(cred, { 'databaseURL': test_food_url_live }, name="test_food_live") #name is the app name
-test_forage_live=firebase_admin.initialize_app(cred, { 'databaseURL': test_forage_url_live }, name="test_forage_live") #name is the app name
-test_bathroom_live=firebase_admin.initialize_app(cred, { 'databaseURL': test_bathroom_url_live }, name="test_bathroom_live") #name is the app name
+# URL of a database from the constants above, e.g. ('prod', 'water', 'live') -> prod_water_url_live
+def get_database_url(dev_type, resource, live_type):
+    return globals()[f'{dev_type}_{resource}_url_{live_type}']
+
 #----------------------------------------------------------------------------------------------------------------------
-# Database References for all of the prod databases
-prod_water_db_live = db.reference('/', app= prod_water_live)
-prod_food_db_live = db.reference('/', app= prod_food_live)
-prod_forage_db_live = db.reference('/', app= prod_forage_live)
-prod_bathroom_db_live = db.reference('/', app= prod_bathroom_live)
+# Lazy registry of the prod/beta/test x water/food/forage/bathroom live databases.
+# Apps and references are only created the first time a database is actually used.
+
+DEV_TYPES = ['prod', 'beta', 'test']
+LIVE_TYPES = ['live']
+# Resource name used in attribute names -> resource name used in the firebase URL
+RESOURCE_URL_NAMES = {
+    'water': 'water',
+    'food': 'food',
+    'forage': 'foraging',
+    'bathroom': 'bathroom',
+}
+
+_references = {}
+_registry_lock = threading.Lock()
+
+def get_db_reference(dev_type, resource, live_type):
+    key = (dev_type, resource, live_type)
+    ref = _references.get(key)
+    if ref is None:
+        with _registry_lock:
+            ref = _references.get(key)
+            if ref is None:
+                app_name = f'{dev_type}_{resource}_{live_type}'
+                database_url = get_database_url(dev_type, resource, live_type)
+                app = initialize_firebase_app(app_name, get_credentials(), database_url)
+                ref = db.reference('/', app= app)
+                _references[key] = ref
+    return ref
+
+# Eagerly create every app and reference (the old import time behaviour), e.g. to warm up a long running server
+def preload_references():
+    for dev_type in DEV_TYPES:
+        for resource in RESOURCE_URL_NAMES:
+            for live_type in LIVE_TYPES:
+                get_db_reference(dev_type, resource, live_type)
+
+# Keep the old module level names working, e.g. prod_water_db_live, prod_water_live or pointer_init
+def __getattr__(name):
+    if name == 'pointer_init':
+        return initialize_firebase_app('pointer_app', get_credentials(), pointer_url)
+    parts = name.split('_')
+    if len(parts) in (3, 4) and parts[0] in DEV_TYPES and parts[1] in RESOURCE_URL_NAMES and parts[-1] in LIVE_TYPES:
+        if len(parts) == 4 and parts[2] == 'db':
+            return get_db_reference(parts[0], parts[1], parts[-1])
+        if len(parts) == 3:
+            get_db_reference(parts[0], parts[1], parts[-1])
+            return firebase_admin.get_app(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Descriptor for the Admin database attributes, resolves the reference on first access
+class _LazyReference:
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.resource, _, self.live_type = name.partition('_db_')
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        ref = get_db_reference(instance.dev_type, self.resource, self.live_type)
+        instance.__dict__[self.name] = ref
+        return ref
+
 #----------------------------------------------------------------------------------------------------------------------
-# Database References for all of the beta databases
-beta_water_db_live = db.reference('/', app= beta_water_live)
-beta_food_db_live = db.reference('/', app= beta_food_live)
-beta_forage_db_live = db.reference('/', app= beta_forage_live)
-beta_bathroom_db_live = db.reference('/', app= beta_bathroom_live)
+# Iterate over (key, child) pairs of a database snapshot, firebase returns either a list or a dict
+def iter_children(data):
+    if isinstance(data, list):
+        return enumerate(data)
+    if isinstance(data, dict):
+        return iter(data.items())
+    return iter(())
+
 #----------------------------------------------------------------------------------------------------------------------
-# Database References for all of the test databases
-test_water_db_live = db.reference('/', app= test_water_live)
-test_food_db_live = db.reference('/', app= test_food_live)
-test_forage_db_live = db.reference('/', app= test_forage_live)
-test_bathroom_db_live = db.reference('/', app= test_bathroom_live)
+# Bulk writes: records are coalesced into multi-path ref.update() payloads instead of one request per record.
+# Firebase rejects single writes over 16MB, the caps keep each payload far below that.
+BULK_MAX_BYTES = 1024 * 1024
+BULK_MAX_PATHS = 1000
+
+# Split a {path: value} dict into multi-path update payloads under the byte and path caps
+def chunk_updates(updates, max_bytes=BULK_MAX_BYTES, max_paths=BULK_MAX_PATHS):
+    chunk = {}
+    chunk_bytes = 0
+    for path, value in updates.items():
+        size = len(str(path)) + len(json.dumps(value, separators=(',', ':'), default=str))
+        if chunk and (chunk_bytes + size > max_bytes or len(chunk) >= max_paths):
+            yield chunk
+            chunk = {}
+            chunk_bytes = 0
+        chunk[str(path)] = value
+        chunk_bytes += size
+    if chunk:
+        yield chunk
+
 #----------------------------------------------------------------------------------------------------------------------
-class prodAdmin:
-    def __init__(self):
-        self.water_db_live = prod_water_db_live
-        self.food_db_live = prod_food_db_live
-        self.forage_db_live = prod_forage_db_live
-        self.bathroom_db_live = prod_bathroom_db_live
+# Methods shared by the three admins, the databases are resolved lazily from dev_type
+class Admin:
+    dev_type = None
+
+    water_db_live = _LazyReference()
+    food_db_live = _LazyReference()
+    forage_db_live = _LazyReference()
+    bathroom_db_live = _LazyReference()
+
+    # Method to write a {path: value} dict to a given database reference as chunked multi-path updates
+    # Returns one report per chunk with its size, timing and error (None when the chunk was written)
+    def bulkUpdate(self, ref, updates, max_bytes=BULK_MAX_BYTES, max_paths=BULK_MAX_PATHS):
+        reports = []
+        for i, chunk in enumerate(chunk_updates(updates, max_bytes, max_paths)):
+            start = time.perf_counter()
+            error = None
+            try:
+                ref.update(chunk)
+            except Exception as e:
+                error = str(e)
+            report = {
+                'chunk': i,
+                'paths': len(chunk),
+                'first_path': next(iter(chunk)),
+                'seconds': time.perf_counter() - start,
+                'error': error,
+            }
+            reports.append(report)
+            if error is None:
+                print(f"Chunk {i}: wrote {report['paths']} paths in {report['seconds']:.3f} secs")
+            else:
+                print(f"Chunk {i}: failed to write {report['paths']} paths starting at {report['first_path']}: {error}")
+        return reports
+
+
+class prodAdmin(Admin):
+    dev_type = 'prod'
+
     def getDb(ref):
         ref_db = ref.get()
         return ref_db
@@ -148,12 +256,9 @@ class prodAdmin:
         ref.push(data)
 
 
-class betaAdmin:
-    def __init__(self):
-        self.water_db_live = beta_water_db_live
-        self.food_db_live = beta_food_db_live
-        self.forage_db_live = beta_forage_db_live
-        self.bathroom_db_live = beta_bathroom_db_live
+class betaAdmin(Admin):
+    dev_type = 'beta'
+
     def getDb(ref):
         ref_db = ref.get()
         return ref_db
@@ -213,12 +318,9 @@ class betaAdmin:
         ref.push(data)
     
 
-class testAdmin:
-    def __init__(self):
-        self.water_db_live = test_water_db_live
-        self.food_db_live = test_food_db_live
-        self.forage_db_live = test_forage_db_live
-        self.bathroom_db_live = test_bathroom_db_live
+class testAdmin(Admin):
+    dev_type = 'test'
+
     def getDb(self, ref):
         ref_db = ref.get()
         return ref_db
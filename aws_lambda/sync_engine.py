@@ -0,0 +1,192 @@
+# Incremental prod -> beta/test sync used by update_script.py
+#
+# Instead of copying every node on every run, each database is diffed against the target and only the
+# added, changed and deleted children are written (as chunked multi-path updates). The content hash of
+# every child and the ETags seen on the last run are kept in a state file, so a run where neither side
+# changed only costs two conditional requests.
+import hashlib
+import json
+import os
+import time
+
+import boto3
+
+from admin_classes import Admin, iter_children
+
+# The state lives next to the credentials in S3, set SYNC_STATE_FILE to use a local file instead
+SYNC_STATE_BUCKET = 'phlaskkey'
+SYNC_STATE_KEY = 'sync_state.json'
+
+# A run that would empty a target, or delete more than this fraction of its children, is refused: an empty or
+# truncated read of prod looks exactly like a mass deletion. Pass allow_mass_delete=True (or set
+# SYNC_ALLOW_MASS_DELETE=1) when the deletions are real
+SYNC_MAX_DELETE_FRACTION = float(os.getenv('SYNC_MAX_DELETE_FRACTION', '0.5'))
+
+
+def load_sync_state():
+    path = os.getenv('SYNC_STATE_FILE')
+    try:
+        if path:
+            with open(path) as f:
+                return json.load(f)
+        content_object = boto3.resource('s3').Object(SYNC_STATE_BUCKET, SYNC_STATE_KEY)
+        return json.loads(content_object.get()['Body'].read().decode('utf-8'))
+    except Exception as e:
+        print(f"No sync state loaded ({e}), every database will be diffed in full")
+        return {}
+
+def save_sync_state(state):
+    body = json.dumps(state, sort_keys=True)
+    path = os.getenv('SYNC_STATE_FILE')
+    if path:
+        with open(path, 'w') as f:
+            f.write(body)
+    else:
+        boto3.resource('s3').Object(SYNC_STATE_BUCKET, SYNC_STATE_KEY).put(Body=body.encode('utf-8'))
+
+
+def encode_node(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+
+# Content hash and encoded size of every child of a database snapshot, keyed by the child key as a string
+def hash_children(data):
+    hashes = {}
+    sizes = {}
+    for key, child in iter_children(data):
+        if child is None:
+            continue
+        encoded = encode_node(child)
+        hashes[str(key)] = hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+        sizes[str(key)] = len(encoded)
+    return hashes, sizes
+
+def children_by_key(data):
+    return {str(key): child for key, child in iter_children(data) if child is not None}
+
+
+# Build the {path: value} update that turns the target into the source
+# Children that exist on both sides are patched field by field when the target copy is at hand
+def diff_children(source_children, source_hashes, target_hashes, target_children=None):
+    updates = {}
+    added = [key for key in source_hashes if key not in target_hashes]
+    changed = [key for key in source_hashes if key in target_hashes and source_hashes[key] != target_hashes[key]]
+    deleted = [key for key in target_hashes if key not in source_hashes]
+
+    for key in added:
+        updates[key] = source_children[key]
+    for key in changed:
+        source_child = source_children[key]
+        target_child = (target_children or {}).get(key)
+        if isinstance(source_child, dict) and isinstance(target_child, dict):
+            for field, value in source_child.items():
+                if target_child.get(field) != value:
+                    updates[f'{key}/{field}'] = value
+            for field in target_child:
+                if field not in source_child:
+                    updates[f'{key}/{field}'] = None
+        else:
+            updates[key] = source_child
+    for key in deleted:
+        updates[key] = None
+    return updates, added, changed, deleted
+
+
+# Raise instead of writing when the deletions look like a bad source read rather than real changes
+def check_deletions(name, source_hashes, target_hashes, deleted):
+    if not deleted:
+        return
+    if not source_hashes:
+        raise RuntimeError(f"{name}: refusing to delete all {len(deleted)} children, the source is empty")
+    if len(deleted) > SYNC_MAX_DELETE_FRACTION * len(target_hashes):
+        raise RuntimeError(f"{name}: refusing to delete {len(deleted)} of {len(target_hashes)} children, "
+                           f"more than SYNC_MAX_DELETE_FRACTION={SYNC_MAX_DELETE_FRACTION}")
+
+
+# Sync a single target reference with its source reference, name identifies the pair in the state dict
+# Mass deletions are refused (see SYNC_MAX_DELETE_FRACTION) unless allow_mass_delete is set
+def sync_reference(source_ref, target_ref, name, state, allow_mass_delete=None):
+    if allow_mass_delete is None:
+        allow_mass_delete = os.getenv('SYNC_ALLOW_MASS_DELETE') == '1'
+    start = time.perf_counter()
+    entry = state.get(name, {})
+    requests = 0
+
+    # Conditional reads when the last run left ETags behind, full reads otherwise
+    if entry.get('source_etag'):
+        source_changed, source_data, source_etag = source_ref.get_if_changed(entry['source_etag'])
+    else:
+        source_changed = True
+        source_data, source_etag = source_ref.get(etag=True)
+    requests += 1
+    if entry.get('target_etag'):
+        target_changed, target_data, target_etag = target_ref.get_if_changed(entry['target_etag'])
+    else:
+        target_changed = True
+        target_data, target_etag = target_ref.get(etag=True)
+    requests += 1
+
+    full_copy_bytes = sum(entry.get('sizes', {}).values())
+    summary = {'name': name, 'added': 0, 'changed': 0, 'deleted': 0, 'skipped': False, 'bytes_written': 0}
+
+    if not source_changed and not target_changed:
+        summary['skipped'] = True
+        source_hashes = entry['hashes']
+        source_sizes = entry['sizes']
+        updates = {}
+    else:
+        if not source_changed:
+            # Only the target moved, the source payload is still needed to put it back
+            source_data, source_etag = source_ref.get(etag=True)
+            requests += 1
+        source_hashes, source_sizes = hash_children(source_data)
+        full_copy_bytes = sum(source_sizes.values())
+        if target_changed:
+            target_hashes, _ = hash_children(target_data)
+            target_children = children_by_key(target_data)
+        else:
+            target_hashes = entry.get('hashes', {})
+            target_children = None
+        updates, added, changed, deleted = diff_children(children_by_key(source_data), source_hashes, target_hashes, target_children)
+        if not allow_mass_delete:
+            # Nothing is written and the state is left alone, the next run diffs this pair again
+            check_deletions(name, source_hashes, target_hashes, deleted)
+        summary.update(added=len(added), changed=len(changed), deleted=len(deleted))
+
+    if updates:
+        reports = Admin().bulkUpdate(target_ref, updates)
+        requests += len(reports)
+        summary['failed_chunks'] = [report for report in reports if report['error']]
+        summary['bytes_written'] = sum(len(path) + len(encode_node(value)) for path, value in updates.items())
+        # Writing changes the target ETag, the next run re-reads the target once to pick it up
+        target_etag = None
+
+    state[name] = {
+        'source_etag': source_etag,
+        'target_etag': target_etag,
+        'hashes': source_hashes,
+        'sizes': source_sizes,
+    }
+    if summary.get('failed_chunks'):
+        # Leave no ETags behind so the next run diffs both sides in full and retries the failed writes
+        state[name]['source_etag'] = None
+        state[name]['target_etag'] = None
+
+    # The old full copy downloaded the source and wrote every child with its own request
+    summary['requests'] = requests
+    summary['requests_saved'] = 1 + len(source_hashes) - requests
+    summary['bytes_saved'] = full_copy_bytes - summary['bytes_written']
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+def print_sync_summary(summaries):
+    for s in summaries:
+        if s.get('error'):
+            print(f"{s['name']}: FAILED after {s['seconds']:.2f} secs: {s['error']}")
+            continue
+        status = 'unchanged, skipped' if s['skipped'] else f"+{s['added']} ~{s['changed']} -{s['deleted']}"
+        print(f"{s['name']}: {status}, {s['requests']} requests ({s['requests_saved']} saved), "
+              f"{s['bytes_written']} bytes written ({s['bytes_saved']} saved) in {s['seconds']:.2f} secs")
+    synced = [s for s in summaries if not s.get('error')]
+    print(f"Total: {sum(s['requests_saved'] for s in synced)} requests and "
+          f"{sum(s['bytes_saved'] for s in synced)} bytes saved over a full copy, "
+          f"{len(summaries) - len(synced)} of {len(summaries)} databases failed")
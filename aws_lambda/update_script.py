@@ -1,61 +1,68 @@
 # Import all the modules
-from admin_classes import prod_admin as prod
-from admin_classes import beta_admin as beta
-from admin_classes import test_admin as test
-
-# initialize the prod_admin class
-water_prod=prod()
-food_prod=prod()
-bathroom_prod=prod()
-forage_prod=prod()
-# initialize the beta_admin class
-water_beta=beta()
-food_beta=beta()
-bathroom_beta=beta()
-forage_beta=beta()
-# initialize the test_admin class
-water_test=test()
-food_test=test()
-bathroom_test=test()
-forage_test=test()
-
-# initialize the prod db reference
-water_db_prod=water_prod.water_db_live
-food_db_prod=food_prod.food_db_live
-bathroom_db_prod=bathroom_prod.bathroom_db_live
-forage_db_prod=forage_prod.forage_db_live
-
-# initialize the beta db reference
-water_db_beta=water_beta.water_db_live
-food_db_beta=food_beta.food_db_live
-bathroom_db_beta=bathroom_beta.bathroom_db_live
-forage_db_beta=forage_beta.forage_db_live
-
-# initialize the test db reference
-water_db_test=water_test.water_db_live
-food_db_test=food_test.food_db_live
-bathroom_db_test=bathroom_test.bathroom_db_live
-forage_db_test=forage_test.forage_db_live
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from admin_classes import prodAdmin as prod
+from admin_classes import betaAdmin as beta
+from admin_classes import testAdmin as test
+from sync_engine import load_sync_state, save_sync_state, sync_reference, print_sync_summary
+
+RESOURCES = ['water', 'food', 'bathroom', 'forage']
+TARGET_ADMINS = {'beta': beta, 'test': test}
+
+# Every resource/environment pair is independent I/O, so they are synced on a bounded thread pool
+# Set SYNC_MAX_WORKERS=1 to run them one after another
+SYNC_MAX_WORKERS = int(os.getenv('SYNC_MAX_WORKERS', '4'))
+
+# One (name, source reference, target reference) task per resource of each target environment
+def syncTasks(env_names):
+    tasks = []
+    for env_name in env_names:
+        target_admin = TARGET_ADMINS[env_name]()
+        for resource in RESOURCES:
+            source_ref = getattr(prod(), f'{resource}_db_live')
+            target_ref = getattr(target_admin, f'{resource}_db_live')
+            tasks.append((f'{env_name}_{resource}_live', source_ref, target_ref))
+    return tasks
+
+# Run a single task, a failing database is reported in its summary instead of stopping the others
+def runTask(task, state):
+    name, source_ref, target_ref = task
+    start = time.perf_counter()
+    try:
+        return sync_reference(source_ref, target_ref, name, state)
+    except Exception as e:
+        print(f"{name}: sync failed: {e}")
+        return {'name': name, 'error': str(e), 'seconds': time.perf_counter() - start}
+
+# Summaries come back in task order whatever order the tasks finish in
+def runTasks(tasks, state, max_workers=None):
+    max_workers = max_workers or SYNC_MAX_WORKERS
+    if max_workers <= 1:
+        return [runTask(task, state) for task in tasks]
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sync') as pool:
+        return list(pool.map(lambda task: runTask(task, state), tasks))
+
+def runSync(env_names, max_workers=None):
+    start = time.perf_counter()
+    state = load_sync_state()
+    summaries = runTasks(syncTasks(env_names), state, max_workers)
+    save_sync_state(state)
+    print_sync_summary(summaries)
+    print(f"Synced {', '.join(env_names)} in {time.perf_counter() - start:.2f} secs")
+    return summaries
 
 #update beta db with prod db
 
-def updateBeta():
-    prod.update_db(water_db_beta,water_db_prod)
-    prod.update_db(food_db_beta,food_db_prod)
-    prod.update_db(bathroom_db_beta,bathroom_db_prod)
-    prod.update_db(forage_db_beta,forage_db_prod)
+def updateBeta(max_workers=None):
+    return runSync(['beta'], max_workers)
 
-def updateTest():
-    prod.update_db(water_db_test,water_db_prod)
-    prod.update_db(food_db_test,food_db_prod)
-    prod.update_db(bathroom_db_test,bathroom_db_prod)
-    prod.update_db(forage_db_test,forage_db_prod)
+def updateTest(max_workers=None):
+    return runSync(['test'], max_workers)
 
-def fullUpdate():
-    updateBeta()
-    updateTest()
+def fullUpdate(max_workers=None):
+    return runSync(['beta', 'test'], max_workers)
 
 def fullTest():
-    print(prod.get_db(water_db_prod))
-
-    
\ No newline at end of file
+    print(prod.getDb(prod().water_db_live))
@@ -0,0 +1,81 @@
+# Startup time benchmark for admin/admin_classes.py
+#
+# Compares the cost of importing the module and reading a single database (lazy registry)
+# against creating every app and reference up front, which is what importing the module used to do.
+# The databases are served by a FakeServer (FIREBASE_DATABASE_EMULATOR_HOST) and the snippets use an emulator
+# credential, so no firebase credentials are needed.
+#
+# Run from the project root:
+#   python benchmarks/bench_admin_import.py --runs 5
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from admin.fake_rtdb import FakeDatabase, FakeServer
+
+# Stands in for phlask.json, set right after the import so the import itself is timed as is
+CREDENTIAL = """
+from firebase_admin import _utils, credentials
+class EmulatorCredential(credentials.Base):
+    def get_credential(self):
+        return _utils.EmulatorAdminCredentials()
+a._cred = EmulatorCredential()
+"""
+
+# (import, then what is timed after it) per case, each runs in a fresh interpreter so nothing is cached between runs
+SNIPPETS = {
+    'import only': ("import admin.admin_classes as a", ""),
+    'import + read prodAdmin().water_db_live':
+        ("import admin.admin_classes as a", CREDENTIAL + "a.prodAdmin().water_db_live.get(shallow=True)"),
+    'import + all 24 databases (old behaviour) + read':
+        ("import admin.admin_classes as a",
+         CREDENTIAL + "a.preload_references()\na.prodAdmin().water_db_live.get(shallow=True)"),
+}
+
+TIMER = '''
+import time
+start = time.perf_counter()
+{imports}
+imported = time.perf_counter()
+{rest}
+print(imported - start, time.perf_counter() - imported)
+'''
+
+def time_snippet(imports, rest, runs, env):
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', TIMER.format(imports=imports, rest=rest)],
+                                cwd=PROJECT_ROOT, capture_output=True, text=True, env=env)
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1]
+        timings.append([float(value) for value in result.stdout.strip().splitlines()[-1].split()])
+    return timings, None
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark admin_classes startup cost.')
+    parser.add_argument('--runs', type=int, default=5, help='Number of fresh interpreters per case')
+    args = parser.parse_args()
+
+    taps = [{'tapnum': i, 'address': f'{i} Market St'} for i in range(100)]
+    server = FakeServer({'phlask-web-map-prod-water-live': FakeDatabase(taps)}).start()
+    env = dict(os.environ, FIREBASE_DATABASE_EMULATOR_HOST=server.address)
+    try:
+        print(f"{'':50s} {'import ms':>10s} {'databases ms':>13s} {'total ms':>9s}  (medians)")
+        for name, (imports, rest) in SNIPPETS.items():
+            timings, error = time_snippet(imports, rest, args.runs, env)
+            if timings is None:
+                print(f"{name:50s} failed ({error})")
+                continue
+            imported, after = (statistics.median(column) * 1000 for column in zip(*timings))
+            total = statistics.median(sum(timing) for timing in timings) * 1000
+            print(f"{name:50s} {imported:10.1f} {after:13.1f} {total:9.1f}")
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
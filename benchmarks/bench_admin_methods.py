@@ -0,0 +1,214 @@
+# Throughput benchmark for every Admin method against the fake RTDB, at 1k, 10k and 100k records
+#
+# Each case runs on a freshly loaded database. Whole-database methods run once, per-record methods
+# (getTap, updateTap, deleteTap, addToDb, per record updateDb) run --ops times on records spread over the
+# database. --latency adds a fixed delay per request to stand in for the network, --http runs every case
+# through firebase_admin against a FakeServer on localhost instead of calling FakeReference directly.
+#
+# Run from the project root:
+#   python benchmarks/bench_admin_methods.py --sizes 1000 10000 100000 --ops 200
+#   python benchmarks/bench_admin_methods.py --sizes 1000 --http --only getTap getDb
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from admin.admin_classes import Admin, snapshot_cache
+from admin.fake_rtdb import FakeDatabase, FakeServer
+
+def make_taps(count):
+    return [{'tapnum': i, 'address': f'{i} Market St', 'access': 'Public', 'handicap': 'Yes', 'zip_code': 19100 + i % 50,
+             'hours': [{'open': {'day': d, 'time': '0900'}, 'close': {'day': d, 'time': '1700'}} for d in range(5)]}
+            for i in range(count)]
+
+def sample(count, ops):
+    step = max(count // ops, 1)
+    return list(range(0, count, step))[:ops]
+
+# Every case returns the number of operations it ran
+def bench_getDb(admin, ref, taps, ops):
+    admin.getDb(ref, cached=False)
+    return 1
+
+def bench_getDb_cached(admin, ref, taps, ops):
+    admin.getDb(ref)
+    for _ in range(ops):
+        admin.getDb(ref)
+    return ops + 1
+
+def bench_getCount(admin, ref, taps, ops):
+    admin.getCount(ref)
+    return 1
+
+def bench_getCount_paged(admin, ref, taps, ops):
+    admin.getCount(ref, page_size=1000)
+    return 1
+
+def bench_iter_children(admin, ref, taps, ops):
+    return sum(1 for _ in admin.iter_children(ref, 1000, prefetch=True))
+
+def bench_getShallowCount(admin, ref, taps, ops):
+    admin.getShallowCount(ref)
+    return 1
+
+def bench_getIndex(admin, ref, taps, ops):
+    admin.getIndex(ref)
+    return 1
+
+def bench_getTap(admin, ref, taps, ops):
+    tapnums = sample(len(taps), ops)
+    for tapnum in tapnums:
+        admin.getTap(ref, tapnum)
+    return len(tapnums)
+
+def bench_getTap_indexed(admin, ref, taps, ops):
+    tapnums = sample(len(taps), ops)
+    for tapnum in tapnums:
+        admin.getTap(ref, tapnum, fresh=False)
+    return len(tapnums)
+
+def bench_queryChildren(admin, ref, taps, ops):
+    for i in range(ops):
+        admin.queryChildren(ref, start_at=str(i), limit=50)
+    return ops
+
+def bench_updateTap(admin, ref, taps, ops):
+    tapnums = sample(len(taps), ops)
+    for tapnum in tapnums:
+        admin.updateTap(ref, tapnum, {'access': 'Private'})
+    return len(tapnums)
+
+def bench_deleteTap(admin, ref, taps, ops):
+    tapnums = sample(len(taps), ops)
+    for tapnum in tapnums:
+        admin.deleteTap(ref, tapnum)
+    return len(tapnums)
+
+def bench_addToDb(admin, ref, taps, ops):
+    for i in range(ops):
+        admin.addToDb(ref, dict(taps[0], tapnum=len(taps) + i))
+    return ops
+
+def bench_updateDb(admin, ref, taps, ops):
+    edits = [dict(taps[i], access='Private') for i in sample(len(taps), ops)]
+    admin.updateDb(ref, edits)
+    return len(edits)
+
+def bench_updateDb_bulk(admin, ref, taps, ops):
+    admin.updateDb(ref, [dict(tap, access='Private') for tap in taps], bulk=True)
+    return len(taps)
+
+def bench_updateDbIter_bulk(admin, ref, taps, ops):
+    target = ref.child('copy')
+    admin.updateDbIter(target, ref, 'tapnum', bulk=True)
+    return len(taps)
+
+def bench_bulkUpdate(admin, ref, taps, ops):
+    admin.bulkUpdate(ref, {f'{i}/access': 'Private' for i in range(len(taps))})
+    return len(taps)
+
+def bench_dbComparison(admin, ref, taps, ops):
+    admin.dbComparison(ref, ref)
+    return 1
+
+def bench_deleteNode(admin, ref, taps, ops):
+    admin.deleteNode(ref)
+    return len(taps)
+
+def bench_dumpSnapshot(admin, ref, taps, ops):
+    with tempfile.TemporaryDirectory() as directory:
+        admin.dumpSnapshot(ref, directory, 'bench')
+    return 1
+
+def bench_loadSnapshot(admin, ref, taps, ops):
+    with tempfile.TemporaryDirectory() as directory:
+        path = admin.dumpSnapshot(ref, directory, 'bench')
+        admin.loadSnapshot(path)
+    return 1
+
+CASES = {name[len('bench_'):]: func for name, func in globals().items() if name.startswith('bench_')}
+
+
+class LocalBackend:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def load(self, taps):
+        fake_db = FakeDatabase(taps, latency=self.latency)
+        return fake_db, fake_db.reference()
+
+    def close(self):
+        pass
+
+# The same cases through the firebase_admin SDK and a localhost FakeServer, one namespace per case
+class HttpBackend:
+    def __init__(self, latency):
+        import firebase_admin
+        from firebase_admin import _utils, credentials, db
+
+        class EmulatorCredential(credentials.Base):
+            def get_credential(self):
+                return _utils.EmulatorAdminCredentials()
+
+        self.db = db
+        self.server = FakeServer(latency=latency).start()
+        self.app = firebase_admin.initialize_app(EmulatorCredential(), {'databaseURL': self.server.url('bench')},
+                                                 name='bench_admin_methods')
+        self.latency = latency
+        self.cases = 0
+
+    def load(self, taps):
+        self.cases += 1
+        namespace = f'bench{self.cases}'
+        fake_db = FakeDatabase(taps, latency=self.latency)
+        self.server.databases[namespace] = fake_db
+        return fake_db, self.db.reference('/', app=self.app, url=self.server.url(namespace))
+
+    def close(self):
+        self.server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every Admin method against the fake RTDB.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Database sizes to run')
+    parser.add_argument('--ops', type=int, default=200, help='Operations per case for the per-record methods')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of latency per request')
+    parser.add_argument('--http', action='store_true', help='Go through firebase_admin and a localhost FakeServer')
+    parser.add_argument('--only', nargs='+', choices=sorted(CASES), help='Run only these cases')
+    args = parser.parse_args()
+
+    backend = HttpBackend(args.latency) if args.http else LocalBackend(args.latency)
+    admin = Admin()
+    # getDb_cached measures the snapshot cache the dashboards opt in to
+    snapshot_cache.configure(max_entries=8)
+    print(f"{'method':22s} {'records':>8s} {'ops':>7s} {'requests':>9s} {'secs':>9s} {'ms/op':>9s}")
+    try:
+        for size in args.sizes:
+            taps = make_taps(size)
+            for name, func in CASES.items():
+                if args.only and name not in args.only:
+                    continue
+                fake_db, ref = backend.load(taps)
+                snapshot_cache.invalidate()
+                start = time.perf_counter()
+                try:
+                    # Admin prints a line per record (or per chunk), keep the benchmark output readable
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        ops = func(admin, ref, taps, args.ops)
+                except Exception as e:
+                    print(f"{name:22s} {size:8d} failed: {type(e).__name__}: {str(e)[:80]}")
+                    continue
+                elapsed = time.perf_counter() - start
+                requests = sum(fake_db.requests.values())
+                print(f"{name:22s} {size:8d} {ops:7d} {requests:9d} {elapsed:9.3f} {elapsed / ops * 1000:9.3f}")
+    finally:
+        backend.close()
+
+if __name__ == "__main__":
+    main()
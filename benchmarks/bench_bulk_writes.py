@@ -0,0 +1,54 @@
+# Round trip benchmark for Admin bulk writes against the in-process fake RTDB
+#
+# Copies N records with updateDbIter and writes N edited records with updateDb, once with one request per
+# record and once with bulk=True, using a fixed per-request latency to stand in for the network.
+#
+# Run from the project root:
+#   python benchmarks/bench_bulk_writes.py --records 2000 --latency 0.005
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from admin.admin_classes import Admin
+from admin.fake_rtdb import FakeDatabase
+
+def make_taps(count):
+    return [{'tapnum': i, 'address': f'{i} Market St', 'access': 'Public', 'handicap': 'Yes', 'zip_code': 19100 + i % 50}
+            for i in range(count)]
+
+def run(label, func, fake_db):
+    fake_db.reset_counts()
+    start = time.perf_counter()
+    # Admin prints a line per record (or per chunk), keep the benchmark output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:40s} {sum(fake_db.requests.values()):8d} requests {elapsed:8.2f} secs")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark per-record vs bulk multi-path writes.')
+    parser.add_argument('--records', type=int, default=2000, help='Number of records to write')
+    parser.add_argument('--latency', type=float, default=0.005, help='Seconds of latency per request')
+    args = parser.parse_args()
+
+    admin = Admin()
+    taps = make_taps(args.records)
+    source = FakeDatabase(taps).reference()
+    edits = [dict(tap, access='Private') for tap in taps]
+
+    for bulk in (False, True):
+        mode = 'bulk' if bulk else 'per record'
+        target_db = FakeDatabase(latency=args.latency)
+        target = target_db.reference()
+        run(f'updateDbIter ({mode})', lambda: admin.updateDbIter(target, source, 'tapnum', bulk=bulk), target_db)
+        run(f'updateDb ({mode})', lambda: admin.updateDb(target, edits, bulk=bulk), target_db)
+        assert target.get() == edits
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# Nested loop vs NumPy business hours analysis in misc_scripts/validate_resource_db.py
+#
+# Builds the hours of many water taps (regular days, split shifts, overnight hours, closed days, open 24 hours,
+# missing opens or closes), checks that BusinessHours.period_counts gives the same morning/evening/night
+# breakdown as the loop analyze_business_hours used to run and that open_at agrees with a per tap check, then
+# times the breakdown, an open now query and coverage per zip code.
+#
+# Run from the project root:
+#   python benchmarks/bench_business_hours.py --records 100000
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'misc_scripts'))
+
+from validate_resource_db import BusinessHours, DAYS, PERIODS
+
+def make_hours(rng):
+    kind = rng.random()
+    if kind < 0.05:
+        return [{'open': {'day': 0, 'time': '0000'}}]
+    if kind < 0.1:
+        return float('nan')
+    hours = []
+    for day in range(7):
+        if rng.random() < 0.15:
+            continue
+        opening = rng.choice(['0500', '0600', '0830', '0900', '1100', '1200', '1330', '1800', '2100'])
+        if rng.random() < 0.1:
+            hours.append({'open': {'day': day, 'time': opening}, 'close': {'day': (day + 1) % 7, 'time': '0200'}})
+        elif rng.random() < 0.1:
+            hours.append({'open': {'day': day, 'time': '0700'}, 'close': {'day': day, 'time': '1100'}})
+            hours.append({'open': {'day': day, 'time': '1300'}, 'close': {'day': day, 'time': '2300'}})
+        else:
+            closing = f"{min(int(opening[:2]) + rng.randint(2, 10), 23):02d}{rng.choice(['00', '30'])}"
+            hours.append({'open': {'day': day, 'time': opening}, 'close': {'day': day, 'time': closing}})
+    if hours and rng.random() < 0.05:
+        del hours[0]['close' if rng.random() < 0.5 else 'open']
+    return hours
+
+# analyze_business_hours before BusinessHours, returning its counts instead of logging them
+def loop_period_counts(hours_col):
+    business_hours = {day: {period: 0 for period in PERIODS} for day in DAYS}
+    for hours in hours_col:
+        if isinstance(hours, list):
+            daily_hours = {day: {period: False for period in PERIODS} for day in DAYS}
+            for hour in hours:
+                if 'open' in hour and 'time' in hour['open'] and 'day' in hour['open']:
+                    opening_time = int(hour['open']['time'])
+                    opening_day = int(hour['open']['day'])
+                    if 600 <= opening_time < 1200:
+                        daily_hours[DAYS[opening_day % 7]]['Morning'] = True
+                    elif 1200 <= opening_time < 1800:
+                        daily_hours[DAYS[opening_day % 7]]['Evening'] = True
+                    else:
+                        daily_hours[DAYS[opening_day % 7]]['Night'] = True
+                if 'close' in hour and 'time' in hour['close'] and 'day' in hour['close']:
+                    closing_time = int(hour['close']['time'])
+                    closing_day = int(hour['close']['day'])
+                    if closing_time < 600:
+                        daily_hours[DAYS[closing_day % 7]]['Morning'] = True
+                    elif closing_time < 1200:
+                        daily_hours[DAYS[closing_day % 7]]['Evening'] = True
+                    else:
+                        daily_hours[DAYS[closing_day % 7]]['Night'] = True
+            for day in DAYS:
+                for period in PERIODS:
+                    if daily_hours[day][period]:
+                        business_hours[day][period] += 1
+    return business_hours
+
+# Straightforward open at check for one tap, to compare with BusinessHours.open_at
+def loop_open_at(hours, day, minute):
+    if not isinstance(hours, list):
+        return False
+    week = 7 * 1440
+    t = day * 1440 + minute
+    for hour in hours:
+        if 'open' not in hour:
+            continue
+        start = hour['open']['day'] * 1440 + int(hour['open']['time'][:2]) * 60 + int(hour['open']['time'][2:])
+        if 'close' not in hour:
+            if start == 0 and len(hours) == 1:
+                return True
+            continue
+        end = hour['close']['day'] * 1440 + int(hour['close']['time'][:2]) * 60 + int(hour['close']['time'][2:])
+        if end <= start:
+            end += week
+        if start <= t < end or start <= t + week < end:
+            return True
+    return False
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the loop and NumPy business hours analysis.')
+    parser.add_argument('--records', type=int, default=100000, help='Number of taps')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    hours_col = [make_hours(rng) for _ in range(args.records)]
+    zip_codes = np.array([str(19100 + i % 50) for i in range(args.records)])
+
+    expected, loop_seconds = timed(loop_period_counts, hours_col)
+    business_hours, build_seconds = timed(BusinessHours, hours_col)
+    counts, counts_seconds = timed(business_hours.period_counts)
+    assert counts.to_dict(orient='index') == expected, 'period_counts disagrees with the loop'
+
+    checks = [(day, minute) for day in range(7) for minute in (0, 90, 420, 720, 1230, 1439)]
+    for day, minute in checks[::7]:
+        reference = [loop_open_at(hours, day, minute) for hours in hours_col]
+        assert business_hours.open_at(day, minute).tolist() == reference, f'open_at({day}, {minute}) disagrees'
+
+    start = time.perf_counter()
+    for day, minute in checks:
+        business_hours.open_at(day, minute)
+    open_at_seconds = (time.perf_counter() - start) / len(checks)
+    coverage, coverage_seconds = timed(business_hours.coverage, zip_codes)
+
+    print(f"{args.records} taps, {len(business_hours.period_starts)} periods, {coverage.shape[0]} zip codes (identical counts)")
+    print(f"{'loop breakdown':28s} {loop_seconds:8.3f} secs")
+    print(f"{'BusinessHours build':28s} {build_seconds:8.3f} secs")
+    print(f"{'period_counts':28s} {counts_seconds:8.3f} secs ({loop_seconds / counts_seconds:.0f}x the loop)")
+    print(f"{'open_at (one query)':28s} {open_at_seconds:8.4f} secs")
+    print(f"{'coverage by zip code':28s} {coverage_seconds:8.3f} secs")
+
+if __name__ == "__main__":
+    main()
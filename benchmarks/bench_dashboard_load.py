@@ -0,0 +1,121 @@
+# Cost of a Streamlit dashboard rerun, before and after the ETag validated table cache
+#
+# Serves a water database from a FakeServer on localhost and loads it through firebase_admin the way
+# dashboard_st/server_st.py does on every rerun: the old path downloads everything and builds the DataFrame row by
+# row with a json.dumps per hours value, the new path (load_table and Resource.create_dataframe, read out of
+# server_st.py without running the Streamlit app) builds it column-wise once and afterwards only revalidates the
+# ETag. Both tables are checked to hold the same values. --latency adds a delay per request for the network.
+#
+# Run from the project root:
+#   python benchmarks/bench_dashboard_load.py --records 20000 --latency 0.05
+import argparse
+import ast
+import dataclasses
+import json
+import numbers
+import os
+import sys
+import time
+
+import pandas as pd
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+import firebase_admin
+from firebase_admin import _utils, credentials, db
+
+import admin.admin_classes as admin_classes
+from admin.admin_classes import Admin
+from admin.fake_rtdb import FakeDatabase, FakeServer
+
+WATER_KEYS = ['access', 'address', 'city', 'description', 'filtration', 'gp_id', 'handicap', 'hours', 'lat', 'lon',
+              'norms_rules', 'organization', 'phone', 'quality', 'service', 'statement', 'tap_type', 'tapnum',
+              'vessel', 'zip_code']
+
+class EmulatorCredential(credentials.Base):
+    def get_credential(self):
+        return _utils.EmulatorAdminCredentials()
+
+def load_dashboard_code():
+    path = os.path.join(PROJECT_ROOT, 'dashboard_st', 'server_st.py')
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    tree.body = [node for node in tree.body
+                 if isinstance(node, (ast.FunctionDef, ast.ClassDef)) and node.name in ('Resource', 'load_table')]
+    namespace = {'json': json, 'numbers': numbers, 'time': time, 'pd': pd, 'dataclass': dataclasses.dataclass,
+                 'hours_codec': admin_classes.hours_codec, 'iter_children': admin_classes.iter_children,
+                 'STRUCTURED_FIELDS': admin_classes.STRUCTURED_FIELDS, 'TABLE_CACHE_TTL': 0.0}
+    exec(compile(tree, path, 'exec'), namespace)
+    return namespace['Resource'], namespace['load_table']
+
+# Resource.create_dataframe before the column-wise build
+def old_create_dataframe(allowed_keys, data_list):
+    records = []
+    for item in data_list:
+        if item is not None:
+            record = {key: item.get(key) for key in allowed_keys if key in item}
+            if 'hours' in record and isinstance(record['hours'], list):
+                record['hours'] = json.dumps(record['hours'])
+            records.append(record)
+    return pd.DataFrame(records)
+
+def make_taps(count):
+    schedules = [('0900', '1700'), ('0800', '2000'), ('0600', '2200'), ('1000', '1600')]
+    taps = []
+    for i in range(count):
+        opening, closing = schedules[i % len(schedules)]
+        tap = {'tapnum': i, 'address': f'{i} Market St', 'access': 'Public', 'city': 'Philadelphia', 'handicap': 'Yes',
+               'lat': 39.95, 'lon': -75.16, 'organization': 'PHLASK', 'quality': 'Good', 'tap_type': 'Drinking Fountain',
+               'zip_code': str(19100 + i % 50),
+               'hours': [{'open': {'day': d, 'time': opening}, 'close': {'day': d, 'time': closing}} for d in range(7)]}
+        if i % 10 == 0:
+            del tap['hours']
+        taps.append(tap)
+    return taps
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare dashboard reruns with and without the table cache.')
+    parser.add_argument('--records', type=int, default=20000, help='Number of taps')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of latency per request')
+    parser.add_argument('--reruns', type=int, default=5, help='Reruns to average')
+    args = parser.parse_args()
+
+    Resource, load_table = load_dashboard_code()
+    resource = Resource(WATER_KEYS, ('hours',))
+    server = FakeServer({'water': FakeDatabase(make_taps(args.records), latency=args.latency)}).start()
+    try:
+        app = firebase_admin.initialize_app(EmulatorCredential(), {'databaseURL': server.url('water')},
+                                            name='bench_dashboard_load')
+        ref = db.reference('/', app=app)
+        admin = Admin()
+
+        def old_rerun():
+            return old_create_dataframe(WATER_KEYS, admin.getDb(ref, cached=False))
+
+        cache = {}
+        expected, old_seconds = timed(old_rerun)
+        df, first_seconds = timed(load_table, cache, ('prod', 'water', 'live'), ref, resource)
+        pd.testing.assert_frame_equal(df, expected[df.columns], check_dtype=False)
+
+        rows = [('old rerun (download + rows)', sum(timed(old_rerun)[1] for _ in range(args.reruns)) / args.reruns),
+                ('load_table, first load', first_seconds),
+                ('load_table, unchanged rerun',
+                 sum(timed(load_table, cache, ('prod', 'water', 'live'), ref, resource)[1] for _ in range(args.reruns)) / args.reruns)]
+        _, build_seconds = timed(resource.create_dataframe, ref.get())
+        _, old_build_seconds = timed(old_create_dataframe, WATER_KEYS, ref.get())
+        rows += [('DataFrame build, old row by row', old_build_seconds), ('DataFrame build, column-wise', build_seconds)]
+    finally:
+        server.stop()
+
+    print(f"{args.records} taps, {args.latency * 1000:.0f}ms latency per request (identical tables)")
+    for label, seconds in rows:
+        print(f"{label:34s} {seconds * 1000:10.1f} ms")
+
+if __name__ == "__main__":
+    main()
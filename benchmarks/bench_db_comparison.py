@@ -0,0 +1,102 @@
+# Cross-database comparison with Admin.dbComparison, the way an hourly prod vs beta drift check would run it
+#
+# Loads two fake databases with the same taps, then drifts the second one (changed fields, removed and added taps).
+# Times the old full tree == check (yes/no only) against the Merkle tree diff on the first run, on a rerun with
+# both databases unchanged (ETags revalidated, trees reused) and after one more write to the second database,
+# and checks the reported added, removed and changed keys and fields against a plain per record comparison.
+#
+# Run from the project root:
+#   python benchmarks/bench_db_comparison.py --records 100000
+import argparse
+import contextlib
+import copy
+import io
+import os
+import random
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from admin.admin_classes import Admin, MerkleTree, iter_children
+from admin.fake_rtdb import FakeDatabase
+
+def make_taps(count):
+    return {str(i): {'tapnum': i, 'address': f'{i} Market St', 'access': 'Public', 'handicap': 'Yes',
+                     'zip_code': 19100 + i % 50, 'lat': 39.95 + i * 1e-6, 'lon': -75.16,
+                     'hours': [{'open': {'day': d, 'time': '0900'}, 'close': {'day': d, 'time': '1700'}} for d in range(7)]}
+            for i in range(count)}
+
+def drift(taps, rng, rate):
+    taps = copy.deepcopy(taps)
+    keys = list(taps)
+    for key in rng.sample(keys, int(len(keys) * rate)):
+        taps[key]['access'] = 'Private'
+        if rng.random() < 0.3:
+            taps[key]['hours'][0]['close']['time'] = '1800'
+    for key in rng.sample(keys, int(len(keys) * rate / 5)):
+        taps.pop(key, None)
+    for i in range(int(len(keys) * rate / 5)):
+        taps[str(len(keys) + i)] = {'tapnum': len(keys) + i, 'address': 'New tap'}
+    return taps
+
+def expected_report(data, other):
+    data = {str(key): child for key, child in iter_children(data) if child is not None}
+    other = {str(key): child for key, child in iter_children(other) if child is not None}
+    changed = {}
+    for key in data.keys() & other.keys():
+        if data[key] != other[key]:
+            changed[key] = sorted(f for f in data[key].keys() | other[key].keys() if data[key].get(f) != other[key].get(f))
+    return set(other) - set(data), set(data) - set(other), changed
+
+def timed(func, *args):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Merkle tree database comparison.')
+    parser.add_argument('--records', type=int, default=100000, help='Children per database')
+    parser.add_argument('--drift', type=float, default=0.01, help='Fraction of taps changed in the second database')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of latency per request')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    taps = make_taps(args.records)
+    prod, beta = FakeDatabase(taps, latency=args.latency), FakeDatabase(drift(taps, rng, args.drift), latency=args.latency)
+    prod_ref, beta_ref = prod.reference(), beta.reference()
+    admin = Admin()
+
+    def old_comparison():
+        return admin.getDb(prod_ref, cached=False) == admin.getDb(beta_ref, cached=False)
+
+    _, old_seconds = timed(old_comparison)
+    report, first_seconds = timed(admin.dbComparison, prod_ref, beta_ref)
+    added, removed, changed = expected_report(prod_ref.get(), beta_ref.get())
+    assert set(report['added']) == added and set(report['removed']) == removed and report['changed'] == changed
+    _, rerun_seconds = timed(admin.dbComparison, prod_ref, beta_ref)
+    admin.updateTap(beta_ref, 1, {'access': 'Restricted'})
+    report_after_write, write_seconds = timed(admin.dbComparison, prod_ref, beta_ref)
+    assert report_after_write['changed']['1'] == ['access']
+    same, same_seconds = timed(admin.dbComparison, prod_ref, prod_ref)
+    assert same['same']
+    # The hashing and diffing alone, without the fake database reads
+    prod_tree, build_seconds = timed(MerkleTree, prod_ref.get())
+    beta_tree = MerkleTree(beta_ref.get())
+    _, diff_seconds = timed(prod_tree.diff, beta_tree)
+
+    print(f"{args.records} children, {len(report['added'])} added, {len(report['removed'])} removed, "
+          f"{len(report['changed'])} changed (matches a per record comparison)")
+    for label, seconds in [('old getDb x2 and == (yes/no only)', old_seconds),
+                           ('dbComparison, first run', first_seconds),
+                           ('dbComparison, unchanged rerun', rerun_seconds),
+                           ('dbComparison, after one write', write_seconds),
+                           ('dbComparison, same database', same_seconds),
+                           ('MerkleTree build (one database)', build_seconds),
+                           ('MerkleTree diff', diff_seconds)]:
+        print(f"{label:36s} {seconds * 1000:10.1f} ms")
+
+if __name__ == "__main__":
+    main()
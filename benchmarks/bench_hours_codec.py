@@ -0,0 +1,120 @@
+# Throughput of the dashboard hours paths for a 10k record table, before and after the shared hours codec
+#
+# Runs the two places the Streamlit dashboard goes through the codec: Resource.create_dataframe, which encodes every
+# hours value to the JSON string shown in the data editor, and Resource.editor_value, which decodes an edited hours
+# cell back into the value written to firebase ("Update Firebase" with every row's hours edited). Resource is read
+# out of dashboard_st/server_st.py without running the Streamlit app. The same paths with the old json.dumps /
+# json.loads per value are timed for reference, encoded strings and decoded hours are checked to be identical, and
+# decoded values are checked to be independent copies (modifying one never changes what the next decode returns).
+#
+# Run from the project root:
+#   python benchmarks/bench_hours_codec.py --records 10000
+import argparse
+import ast
+import dataclasses
+import json
+import numbers
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+import yaml
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+import admin.admin_classes as admin_classes
+from admin.admin_classes import HoursCodec, structured_fields
+
+WATER_KEYS = ['access', 'address', 'city', 'description', 'filtration', 'gp_id', 'handicap', 'hours', 'lat', 'lon',
+              'norms_rules', 'organization', 'phone', 'quality', 'service', 'statement', 'tap_type', 'tapnum',
+              'vessel', 'zip_code']
+
+def load_resource():
+    path = os.path.join(PROJECT_ROOT, 'dashboard_st', 'server_st.py')
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    tree.body = [node for node in tree.body
+                 if isinstance(node, (ast.FunctionDef, ast.ClassDef)) and node.name in ('Resource', 'record_id')]
+    namespace = {'json': json, 'numbers': numbers, 'pd': pd, 'dataclass': dataclasses.dataclass,
+                 'hours_codec': admin_classes.hours_codec, 'iter_children': admin_classes.iter_children,
+                 'STRUCTURED_FIELDS': admin_classes.STRUCTURED_FIELDS}
+    exec(compile(tree, path, 'exec'), namespace)
+    return namespace
+
+# Hours cells before the codec: json.dumps for the table, json.loads (with the quote fix) for the write back
+class OldCodec:
+    stats = {'hits': 0}
+
+    def encode(self, value):
+        return json.dumps(value) if isinstance(value, (list, dict)) else value
+
+    def decode(self, value):
+        return json.loads(value.replace("'", '"'))
+
+def make_taps(count, seed=0):
+    rng = random.Random(seed)
+    common = [[{'open': {'day': d, 'time': opening}, 'close': {'day': d, 'time': closing}} for d in days]
+              for opening, closing, days in [('0900', '1700', range(7)), ('0800', '2000', range(7)),
+                                             ('0600', '2200', range(5)), ('1000', '1600', range(1, 6))]]
+    taps = []
+    for i in range(count):
+        if rng.random() < 0.9:
+            hours = rng.choice(common)
+        else:
+            hours = [{'open': {'day': d, 'time': f'{rng.randint(5, 11):02d}00'},
+                      'close': {'day': d, 'time': f'{rng.randint(13, 22):02d}00'}} for d in range(7)]
+        taps.append({
+            'access': 'Public', 'address': f'{i} Market St', 'city': 'Philadelphia', 'description': 'Fountain by the door',
+            'handicap': 'Yes', 'hours': json.loads(json.dumps(hours)), 'lat': 39.95, 'lon': -75.16,
+            'organization': 'PHLASK', 'tap_type': 'Drinking Fountain', 'tapnum': i, 'zip_code': str(19100 + i % 50),
+        })
+    return taps
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def use_codec(namespace, codec):
+    admin_classes.hours_codec = codec
+    namespace['hours_codec'] = codec
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the old and codec based dashboard hours paths.')
+    parser.add_argument('--records', type=int, default=10000, help='Number of taps in the table')
+    args = parser.parse_args()
+
+    namespace = load_resource()
+    with open(os.path.join(PROJECT_ROOT, 'misc_scripts', 'water_schema.yaml')) as f:
+        json_fields = structured_fields(yaml.safe_load(f))
+    resource = namespace['Resource'](WATER_KEYS, json_fields)
+    taps = make_taps(args.records)
+
+    rows, expected_cells, expected_hours = [], None, None
+    for label, codec in [('old json.dumps/loads', OldCodec()), ('codec, cache off', HoursCodec(max_entries=0)),
+                         ('codec, LRU cache', HoursCodec())]:
+        use_codec(namespace, codec)
+        df, encode_seconds = timed(resource.create_dataframe, taps)
+        cells = list(df['hours'])
+        hits = codec.stats['hits']
+        decoded, decode_seconds = timed(lambda: [resource.editor_value('hours', cell) for cell in cells])
+        if expected_cells is None:
+            expected_cells, expected_hours = cells, decoded
+        assert cells == expected_cells, f'{label} encodes different hours'
+        assert decoded == expected_hours, f'{label} decodes different hours'
+        rows += [(f'create_dataframe, {label} ({hits} hits)', encode_seconds),
+                 (f'editor_value hours, {label} ({codec.stats["hits"] - hits} hits)', decode_seconds)]
+
+    # Callers own what decode returns, editing it must not leak into the next decode of the same text
+    decoded[0][0]['open']['time'] = '0000'
+    assert resource.editor_value('hours', cells[0]) == expected_hours[0], 'decoded hours are shared between callers'
+
+    print(f"{args.records} taps, structured fields: {', '.join(json_fields)} (identical hours, independent copies)")
+    for label, seconds in rows:
+        print(f"{label:52s} {seconds:8.3f} secs {args.records / seconds:10.0f} records/sec")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Row by row jsonschema vs column-wise CompiledSchema validation in misc_scripts/validate_resource_db.py
+#
+# Builds DataFrames of messy water and food records (missing fields, explicitly null fields, wrong types, bad hours)
+# the way validate_environment does, runs DataValidator.iter_invalid_rows with and without the compiled engine,
+# checks that every row gets the same errors and that explicit nulls are reported as None, and times both.
+#
+# Run from the project root:
+#   python benchmarks/bench_schema_validation.py --records 20000
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+from jsonschema import Draft202012Validator
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'misc_scripts'))
+
+from validate_resource_db import DataValidator, records_frame, schema_path
+
+def make_hours(rng):
+    hours = [{'open': {'day': d, 'time': '0900'}, 'close': {'day': d, 'time': '1700'}} for d in range(7)]
+    damage = rng.random()
+    if damage < 0.1:
+        return hours[:5]
+    if damage < 0.15:
+        return str(hours)
+    if damage < 0.2:
+        hours[2]['close']['time'] = '5pm'
+    elif damage < 0.25:
+        hours[3]['open']['day'] = 9
+    elif damage < 0.3:
+        del hours[1]['close']
+    return hours
+
+def make_taps(count, seed=0):
+    rng = random.Random(seed)
+    taps = []
+    for i in range(count):
+        tap = {
+            'access': 'Public', 'address': f'{i} Market St', 'city': 'Philadelphia', 'description': '',
+            'filtration': 'Yes', 'gp_id': f'gp{i}', 'handicap': 'Yes', 'lat': 39.95, 'lon': -75.16,
+            'norms_rules': '', 'organization': 'PHLASK', 'permanently_closed': False, 'phone': '', 'quality': 'Good',
+            'service': 'Self', 'statement': '', 'status': 'Active', 'tap_type': 'Drinking Fountain', 'tapnum': i,
+            'vessel': 'Yes', 'zip_code': 19100 + i % 50, 'hours': make_hours(rng),
+        }
+        for field in rng.sample(sorted(tap), rng.choice([0, 0, 0, 1, 2])):
+            del tap[field]
+        if rng.random() < 0.05:
+            tap['zip_code'] = str(tap.get('zip_code', '19103'))
+        if rng.random() < 0.05:
+            tap['handicap'] = True
+        if rng.random() < 0.05:
+            tap[rng.choice(['lat', 'tapnum', 'hours', 'address', 'permanently_closed'])] = None
+        taps.append(tap)
+    return taps
+
+def make_food_sites(count, seed=0):
+    rng = random.Random(seed)
+    sites = []
+    for i in range(count):
+        site = {
+            'access': 'Public', 'address': f'{i} Market St', 'city': 'Philadelphia', 'days_open': 'Mon-Fri',
+            'description': 'Food pantry', 'foodnum': i, 'id_required': 'No', 'kid_only': 'No', 'lat': 39.95,
+            'lon': -75.16, 'organization': 'PHLASK', 'time_open': '9am-5pm', 'url': '', 'zip_code': str(19100 + i % 50),
+            'hours': make_hours(rng),
+        }
+        for field in rng.sample(sorted(site), rng.choice([0, 0, 0, 1])):
+            del site[field]
+        if rng.random() < 0.1:
+            site[rng.choice(['lat', 'lon', 'foodnum', 'hours', 'url'])] = None
+        sites.append(site)
+    return sites
+
+def run(validator, df):
+    errors = {}
+    start = time.perf_counter()
+    for i, _, messages in validator.iter_invalid_rows(df, Draft202012Validator(validator.schema)):
+        errors[i] = messages
+    return errors, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare row by row and column-wise schema validation.')
+    parser.add_argument('--records', type=int, default=20000, help='Number of records to validate per resource')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        log_path = os.path.join(directory, 'bench.log')
+        for resource, records in [('water', make_taps(args.records)), ('food', make_food_sites(args.records))]:
+            df = records_frame(records)
+            row_by_row = DataValidator(schema_path(resource), log_path, vectorized=False)
+            compiled = DataValidator(schema_path(resource), log_path, vectorized=True)
+            expected, row_seconds = run(row_by_row, df)
+            errors, compiled_seconds = run(compiled, df)
+            logging.getLogger('validate_resource_db').handlers.clear()
+
+            assert errors == expected, f'compiled {resource} validation disagrees with jsonschema'
+            nulls = sum(message.startswith('None is not of type') for messages in errors.values() for message in messages)
+            assert nulls, f'explicit nulls in the {resource} records were not reported as None'
+            results.append((resource, len(df), errors, nulls, row_seconds, compiled_seconds))
+
+    for resource, rows, errors, nulls, row_seconds, compiled_seconds in results:
+        print(f"{resource}: {rows} rows, {len(errors)} invalid, {sum(len(m) for m in errors.values())} errors, "
+              f"{nulls} for explicit nulls (identical)")
+        print(f"  {'jsonschema row by row':24s} {row_seconds:8.2f} secs")
+        print(f"  {'CompiledSchema':24s} {compiled_seconds:8.2f} secs ({row_seconds / compiled_seconds:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# Load test of the Slack notifications in misc_scripts/old_linode_script.py against a local webhook stand-in
+#
+# A ThreadingHTTPServer on localhost plays the Slack webhook: every request waits --latency seconds, and the first
+# --failures requests answer 500 or 429 (with Retry-After) to exercise the retries. A bulk put of --nodes taps is
+# fed to handle_event, once with the old blocking requests.post per node and once through SlackNotifier. Reports
+# how long the listener callback was blocked, how long delivery took, how many requests reached the webhook, and
+# checks that every tap was delivered exactly once. A last run with a tiny queue shows overflow being counted.
+#
+# Run from the project root:
+#   python benchmarks/bench_slack_notifier.py --nodes 300 --latency 0.05
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'misc_scripts'))
+
+import old_linode_script
+from old_linode_script import SlackNotifier, handle_event
+from admin.fake_rtdb import FakeEvent
+
+
+class WebhookStandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency, failures):
+        super().__init__(('127.0.0.1', 0), WebhookHandler)
+        self.latency = latency
+        self.failures = failures
+        self.requests = 0
+        self.texts = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/hook'
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.requests += 1
+            attempt = self.server.requests
+            if attempt > self.server.failures:
+                self.server.texts.append(json.loads(body)['text'])
+        if attempt <= self.server.failures:
+            status, extra = (429, {'Retry-After': '0'}) if attempt % 2 else (500, {})
+        else:
+            status, extra = 200, {}
+        payload = b'ok' if status == 200 else b'error'
+        self.send_response(status)
+        for name, value in extra.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+# send_slack_message before SlackNotifier, one blocking post per node
+def blocking_send(url):
+    def send_slack_message(message):
+        response = requests.post(url, data=json.dumps({'text': message}), headers={'content-type': 'application/json'})
+        if response.status_code != 200:
+            raise ValueError(f'Request to Slack returned an error {response.status_code}')
+    return send_slack_message
+
+def make_put(count):
+    return FakeEvent('put', '/', [{'name': 'PHLASK', 'address': f'{i} Market St', 'description': 'Fountain'}
+                                  for i in range(count)])
+
+def delivered(texts, count):
+    joined = '\n'.join(texts)
+    return all(joined.count(f'*Address:* {i} Market St\n') == 1 for i in range(count))
+
+def run(server, label, event, send=None, notifier=None):
+    server.requests, server.texts = 0, []
+    old_send = old_linode_script.send_slack_message
+    if send is not None:
+        old_linode_script.send_slack_message = send
+    if notifier is not None:
+        old_linode_script.notifier = notifier.start()
+    try:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            handle_event(event, 'water')
+        blocked = time.perf_counter() - start
+        if notifier is not None:
+            notifier.stop()
+        total = time.perf_counter() - start
+    finally:
+        old_linode_script.send_slack_message = old_send
+    return label, blocked, total, server.requests, server.texts
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the Slack notifier against a local webhook.')
+    parser.add_argument('--nodes', type=int, default=300, help='Taps in the bulk put')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds the webhook takes per request')
+    parser.add_argument('--failures', type=int, default=4, help='Requests answered with 429/500 before succeeding')
+    args = parser.parse_args()
+
+    event = make_put(args.nodes)
+    server = WebhookStandIn(args.latency, 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        rows = [run(server, 'blocking post per node', event, send=blocking_send(server.url))]
+        assert delivered(rows[-1][4], args.nodes)
+
+        server.failures = args.failures
+        notifier = SlackNotifier(server.url, digest_wait=0.2, backoff=0.05)
+        rows.append(run(server, 'SlackNotifier digests', event, notifier=notifier))
+        assert delivered(rows[-1][4], args.nodes), 'a tap was lost or sent twice'
+        print(f"{args.nodes} taps in one put, {args.latency * 1000:.0f}ms per webhook request, "
+              f"{args.failures} failed requests retried ({notifier.stats['retries']} retries)")
+
+        server.failures = 0
+        overflow = SlackNotifier(server.url, max_queue=10, digest_wait=0.2)
+        rows.append(run(server, 'SlackNotifier, queue of 10', event, notifier=overflow))
+    finally:
+        server.shutdown()
+
+    print(f"{'mode':28s} {'callback ms':>12s} {'delivered ms':>13s} {'requests':>9s}")
+    for label, blocked, total, requests_made, _ in rows:
+        print(f"{label:28s} {blocked * 1000:12.1f} {total * 1000:13.1f} {requests_made:9d}")
+    print(f"Overflow run: {overflow.stats['sent']} sent, {overflow.stats['dropped']} dropped and counted")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Peak memory benchmark for streamed vs full database reads
+#
+# Serves a forage-like database (city tree inventory records) from a FakeServer on localhost and counts its
+# records through firebase_admin in a fresh child process, once with getDb (the whole JSON tree in memory) and
+# once with getCount(stream=True). Each child reports its peak RSS before and after the read.
+#
+# Run from the project root:
+#   python benchmarks/bench_stream_memory.py --records 200000
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from admin.fake_rtdb import FakeDatabase, FakeServer
+
+MODES = {
+    'getDb (full download)': "len(admin.getDb(ref, cached=False))",
+    'getCount(stream=True)': "admin.getCount(ref, stream=True)",
+}
+
+CHILD = '''
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+import firebase_admin
+from firebase_admin import _utils, credentials, db
+from admin.admin_classes import Admin
+
+class EmulatorCredential(credentials.Base):
+    def get_credential(self):
+        return _utils.EmulatorAdminCredentials()
+
+# ru_maxrss is inherited from the parent across fork/exec on Linux, the VmHWM of the new address space is not
+def peak_kb():
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+app = firebase_admin.initialize_app(EmulatorCredential(), {{'databaseURL': {url!r}}})
+ref = db.reference('/')
+admin = Admin()
+before = peak_kb()
+start = time.perf_counter()
+count = {expression}
+seconds = time.perf_counter() - start
+after = peak_kb()
+print(json.dumps({{'count': count, 'before': before, 'after': after, 'seconds': seconds}}))
+'''
+
+def make_trees(count):
+    return [{'tree_id': i, 'planting_site_id': 500000 + i, 'point_x': -75.16 + i * 1e-6, 'point_y': 39.95 + i * 1e-6,
+             'species': 'Acer rubrum', 'common_name': 'Red maple', 'dbh': 12.5, 'Street Address': f'{i} Walnut St',
+             'foragenum': i}
+            for i in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare peak RSS of streamed and full database reads.')
+    parser.add_argument('--records', type=int, default=200000, help='Number of records in the database')
+    args = parser.parse_args()
+
+    server = FakeServer({'forage': FakeDatabase(make_trees(args.records))}).start()
+    try:
+        print(f"{'mode':24s} {'records':>8s} {'baseline MB':>12s} {'peak MB':>9s} {'growth MB':>10s} {'secs':>7s}")
+        for label, expression in MODES.items():
+            code = CHILD.format(root=PROJECT_ROOT, url=server.url('forage'), expression=expression)
+            output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            before, after = result['before'] / 1024, result['after'] / 1024
+            print(f"{label:24s} {result['count']:8d} {before:12.1f} {after:9.1f} {after - before:10.1f} {result['seconds']:7.2f}")
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# The four verify database listeners of misc_scripts/old_linode_script.py, per database listen() vs StreamSupervisor
+#
+# Serves four databases of --records taps each from FakeServers on localhost (streaming API included, one server per
+# database since listen() drops the ?ns= of emulator URLs, fresh servers for each kind of listener) and listens to
+# all of them, once with an app and a
+# db.reference().listen() per database and once with one StreamSupervisor. For each it reports the client threads
+# the listeners added, then writes --burst new taps to every database and reports the time until every callback ran,
+# events per second and the lag the supervisor measured. Last it cuts every stream (drop_streams), writes a few taps
+# while they are down and counts what the callbacks got once they reconnected, and does the same across a
+# supervisor restart with a state file.
+#
+# Run from the project root:
+#   python benchmarks/bench_stream_supervisor.py --records 2000 --burst 200
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'misc_scripts'))
+
+import firebase_admin
+from firebase_admin import _utils, credentials, db
+
+from admin.fake_rtdb import FakeDatabase, FakeServer
+from stream_supervisor import StreamSupervisor
+
+DATABASES = ['water', 'food', 'foraging', 'bathroom']
+
+class EmulatorCredential(credentials.Base):
+    def get_credential(self):
+        return _utils.EmulatorAdminCredentials()
+
+class Collector:
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def callback(self, db_name):
+        def on_event(event):
+            with self.lock:
+                self.events.append((db_name, event.event_type, event.path, event.data))
+        return on_event
+
+    def clear(self):
+        with self.lock:
+            self.events = []
+
+    # Taps announced since the last clear, the way handle_event counts them
+    def taps(self):
+        with self.lock:
+            events = list(self.events)
+        count = 0
+        for _, event_type, _, data in events:
+            if event_type == 'put':
+                count += len([node for node in data if node is not None]) if isinstance(data, list) else \
+                    1 if isinstance(data, dict) else 0
+        return count
+
+    def wait_for(self, taps, timeout=60.0):
+        deadline = time.monotonic() + timeout
+        while self.taps() < taps and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return self.taps()
+
+# Threads on the listening side, the FakeServer handler threads are left out
+def client_threads():
+    return sum(1 for thread in threading.enumerate() if 'process_request_thread' not in thread.name)
+
+def make_taps(count):
+    return [{'tapnum': i, 'name': 'PHLASK', 'address': f'{i} Market St', 'description': 'Fountain'} for i in range(count)]
+
+def start_servers(args):
+    servers = {}
+    for name in DATABASES:
+        database = FakeDatabase(make_taps(args.records))
+        servers[name] = FakeServer({name: database, '': database}, keep_alive=1.0).start()
+    return servers
+
+def stop_servers(servers):
+    for server in servers.values():
+        server.stop()
+
+def write_burst(servers, start, count):
+    for name in DATABASES:
+        ref = servers[name].database(name).reference()
+        for i in range(start, start + count):
+            ref.child(str(i)).set({'tapnum': i, 'name': 'PHLASK', 'address': f'{i} Market St'})
+
+def settle(collector, seconds=0.5):
+    # Wait until no callback ran for a while
+    last = -1
+    while last != len(collector.events):
+        last = len(collector.events)
+        time.sleep(seconds)
+
+def drop_streams(servers):
+    for server in servers.values():
+        server.drop_streams()
+
+def run_listen(servers, args):
+    collector = Collector()
+    before = client_threads()
+    registrations, apps = [], []
+    for name in DATABASES:
+        app = firebase_admin.initialize_app(EmulatorCredential(), {'databaseURL': servers[name].url(name)},
+                                            name=f'bench-{name}-verify')
+        apps.append(app)
+        registrations.append(db.reference('/', app=app).listen(collector.callback(name)))
+    collector.wait_for(args.records * len(DATABASES))
+    threads = client_threads() - before
+    collector.clear()
+
+    start = time.perf_counter()
+    write_burst(servers, args.records, args.burst)
+    collector.wait_for(args.burst * len(DATABASES))
+    burst_seconds = time.perf_counter() - start
+
+    collector.clear()
+    drop_streams(servers)
+    write_burst(servers, args.records + args.burst, args.missed)
+    time.sleep(args.reconnect_wait)
+    settle(collector)
+    resumed = collector.taps()
+
+    for registration in registrations:
+        registration.close()
+    for app in apps:
+        firebase_admin.delete_app(app)
+    return threads, burst_seconds, resumed, None
+
+def run_supervisor(servers, args, state_file):
+    collector = Collector()
+    before = client_threads()
+    supervisor = StreamSupervisor(state_file=state_file, reconnect_delay=0.1)
+    for name in DATABASES:
+        supervisor.add(f'{name}-verify', servers[name].url(name), collector.callback(name))
+    supervisor.start()
+    collector.wait_for(args.records * len(DATABASES))
+    threads = client_threads() - before
+    collector.clear()
+
+    start = time.perf_counter()
+    write_burst(servers, args.records, args.burst)
+    collector.wait_for(args.burst * len(DATABASES))
+    burst_seconds = time.perf_counter() - start
+    metrics = supervisor.metrics()
+
+    collector.clear()
+    drop_streams(servers)
+    write_burst(servers, args.records + args.burst, args.missed)
+    time.sleep(args.reconnect_wait)
+    settle(collector)
+    resumed = collector.taps()
+
+    # A restart reads the positions back from the state file
+    supervisor.stop()
+    write_burst(servers, args.records + args.burst + args.missed, args.missed)
+    restarted = Collector()
+    supervisor = StreamSupervisor(state_file=state_file, reconnect_delay=0.1)
+    for name in DATABASES:
+        supervisor.add(f'{name}-verify', servers[name].url(name), restarted.callback(name))
+    supervisor.start()
+    settle(restarted)
+    supervisor.stop()
+    return threads, burst_seconds, resumed, (metrics, restarted.taps())
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per database listeners with the StreamSupervisor.')
+    parser.add_argument('--records', type=int, default=2000, help='Taps per database')
+    parser.add_argument('--burst', type=int, default=200, help='Taps written to every database in the burst')
+    parser.add_argument('--missed', type=int, default=3, help='Taps written to every database while disconnected')
+    parser.add_argument('--reconnect-wait', type=float, default=4.0, help='Seconds given to the listeners to reconnect')
+    args = parser.parse_args()
+
+    servers = start_servers(args)
+    try:
+        listen = run_listen(servers, args)
+    finally:
+        stop_servers(servers)
+    servers = start_servers(args)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            supervised = run_supervisor(servers, args, os.path.join(directory, 'listener_state.json'))
+    finally:
+        stop_servers(servers)
+
+    burst = args.burst * len(DATABASES)
+    missed = args.missed * len(DATABASES)
+    print(f"{len(DATABASES)} databases of {args.records} taps, bursts of {burst} taps, {missed} taps written while "
+          f"the streams were down")
+    print(f"{'listeners':24s} {'threads':>8s} {'burst ms':>9s} {'taps/sec':>9s} {'taps after reconnect':>21s}")
+    for label, (threads, seconds, resumed, _) in [('listen() per database', listen),
+                                                  ('StreamSupervisor', supervised)]:
+        print(f"{label:24s} {threads:8d} {seconds * 1000:9.1f} {burst / seconds:9.0f} {resumed:21d}")
+    metrics, restarted = supervised[3]
+    print(f"Supervisor restart from the state file announced {restarted} taps ({missed} written while it was stopped)")
+    for name, stream in metrics.items():
+        print(f"{name:18s} {stream['events_per_sec']:8.1f} events/sec, lag {stream['lag_ms']:.2f}ms "
+              f"(max {stream['max_lag_ms']:.2f}ms)")
+
+if __name__ == "__main__":
+    main()
@@ -4,21 +4,29 @@ from firebase_admin import credentials
 from firebase_admin import db
 import json
 import os
-
-json_data = None
+import threading
+import time
+import weakref
+from collections import OrderedDict
 
 #----------------------------------------------------------------------------------------------------------------------
-#creds for initializing firebase admin
-try :
-    with open('phlask.json') as f:
-        json_data = json.load(f)
+#creds for initializing firebase admin, loaded on first use so importing this module stays cheap
+_cred = None
+
+def get_credentials():
+    global _cred
+    if _cred is None:
+        try :
+            with open('phlask.json') as f:
+                json_data = json.load(f)
 
-# if there is no json file, then this will use the environment variable
+        # if there is no json file, then this will use the environment variable
 
-except FileNotFoundError:
-    json_data = os.getenv('FIREBASE_CREDENTIALS')
+        except FileNotFoundError:
+            json_data = os.getenv('FIREBASE_CREDENTIALS')
 
-cred = credentials.Certificate(json_data)
+        _cred = credentials.Certificate(json_data)
+    return _cred
 
 def get_firebase_url(dev_type, data_type, live_type):
     return f'https://phlask-web-map-{dev_type}-{data_type}-{live_type}.firebaseio.com/'
@@ -30,62 +38,261 @@ def initialize_firebase_app(app_name, cred, database_url):
 
 
 #----------------------------------------------------------------------------------------------------------------------
-# initialize firebase admin Prod DB's
-prod_water_live = initialize_firebase_app("prod_water_live", cred, get_firebase_url("prod","water","live"))
-prod_water_verify = initialize_firebase_app("prod_water_verify", cred, get_firebase_url("prod", "water", "verify"))
-prod_food_live = initialize_firebase_app("prod_food_live", cred, get_firebase_url("prod", "food", "live"))
-prod_food_verify = initialize_firebase_app("prod_food_verify", cred, get_firebase_url("prod", "food", "verify"))
-prod_forage_live = initialize_firebase_app("prod_forage_live", cred, get_firebase_url("prod", "foraging", "live"))
-prod_forage_verify = initialize_firebase_app("prod_forage_verify", cred, get_firebase_url("prod", "foraging", "verify"))
-prod_bathroom_live = initialize_firebase_app("prod_bathroom_live", cred, get_firebase_url("prod", "bathroom", "live"))
-prod_bathroom_verify = initialize_firebase_app("prod_bathroom_verify", cred, get_firebase_url("prod", "bathroom", "verify"))
-#----------------------------------------------------------------------------------------------------------------------
-# initialize firebase admin Beta DB's
-beta_water_live = initialize_firebase_app("beta_water_live", cred, get_firebase_url("beta", "water", "live"))
-beta_water_verify = initialize_firebase_app("beta_water_verify", cred, get_firebase_url("beta", "water", "verify"))
-beta_food_live = initialize_firebase_app("beta_food_live", cred, get_firebase_url("beta", "food", "live"))
-beta_food_verify = initialize_firebase_app("beta_food_verify", cred, get_firebase_url("beta", "food", "verify"))
-beta_forage_live = initialize_firebase_app("beta_forage_live", cred, get_firebase_url("beta", "foraging", "live"))
-beta_forage_verify = initialize_firebase_app("beta_forage_verify", cred, get_firebase_url("beta", "foraging", "verify"))
-beta_bathroom_live = initialize_firebase_app("beta_bathroom_live", cred, get_firebase_url("beta", "bathroom", "live"))
-beta_bathroom_verify = initialize_firebase_app("beta_bathroom_verify", cred, get_firebase_url("beta", "bathroom", "verify"))
-#----------------------------------------------------------------------------------------------------------------------
-# initialize firebase admin Test DB's
-test_water_live = initialize_firebase_app("test_water_live", cred, get_firebase_url("test", "water", "live"))
-test_water_verify = initialize_firebase_app("test_water_verify", cred, get_firebase_url("test", "water", "verify"))
-test_food_live = initialize_firebase_app("test_food_live", cred, get_firebase_url("test", "food", "live"))
-test_food_verify = initialize_firebase_app("test_food_verify", cred, get_firebase_url("test", "food", "verify"))
-test_forage_live = initialize_firebase_app("test_forage_live", cred, get_firebase_url("test", "foraging", "live"))
-test_forage_verify = initialize_firebase_app("test_forage_verify", cred, get_firebase_url("test", "foraging", "verify"))
-test_bathroom_live = initialize_firebase_app("test_bathroom_live", cred, get_firebase_url("test", "bathroom", "live"))
-test_bathroom_verify = initialize_firebase_app("test_bathroom_verify", cred, get_firebase_url("test", "bathroom", "verify"))
+# Lazy registry of the prod/beta/test x water/food/forage/bathroom live databases.
+# Apps and references are only created the first time a database is actually used.
+
+DEV_TYPES = ['prod', 'beta', 'test']
+LIVE_TYPES = ['live']
+# Resource name used in attribute names -> resource name used in the firebase URL
+RESOURCE_URL_NAMES = {
+    'water': 'water',
+    'food': 'food',
+    'forage': 'foraging',
+    'bathroom': 'bathroom',
+}
+
+_references = {}
+_registry_lock = threading.Lock()
+
+def get_db_reference(dev_type, resource, live_type):
+    key = (dev_type, resource, live_type)
+    ref = _references.get(key)
+    if ref is None:
+        with _registry_lock:
+            ref = _references.get(key)
+            if ref is None:
+                app_name = f'{dev_type}_{resource}_{live_type}'
+                database_url = get_firebase_url(dev_type, RESOURCE_URL_NAMES[resource], live_type)
+                app = initialize_firebase_app(app_name, get_credentials(), database_url)
+                ref = db.reference('/', app= app)
+                _references[key] = ref
+    return ref
+
+# Eagerly create every app and reference (the old import time behaviour), e.g. to warm up a long running server
+def preload_references():
+    for dev_type in DEV_TYPES:
+        for resource in RESOURCE_URL_NAMES:
+            for live_type in LIVE_TYPES:
+                get_db_reference(dev_type, resource, live_type)
+
+# Keep the old module level names working, e.g. prod_water_db_live or prod_water_live
+def __getattr__(name):
+    parts = name.split('_')
+    if len(parts) in (3, 4) and parts[0] in DEV_TYPES and parts[1] in RESOURCE_URL_NAMES and parts[-1] in LIVE_TYPES:
+        if len(parts) == 4 and parts[2] == 'db':
+            return get_db_reference(parts[0], parts[1], parts[-1])
+        if len(parts) == 3:
+            get_db_reference(parts[0], parts[1], parts[-1])
+            return firebase_admin.get_app(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Descriptor for the Admin database attributes, resolves the reference on first access
+class _LazyReference:
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.resource, _, self.live_type = name.partition('_db_')
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        ref = get_db_reference(instance.dev_type, self.resource, self.live_type)
+        instance.__dict__[self.name] = ref
+        return ref
+
 #----------------------------------------------------------------------------------------------------------------------
-# Database References for all of the prod databases
-prod_water_db_live = db.reference('/', app= prod_water_live)
-prod_food_db_live = db.reference('/', app= prod_food_live)
-prod_forage_db_live = db.reference('/', app= prod_forage_live)
-prod_bathroom_db_live = db.reference('/', app= prod_bathroom_live)
+# Id field of each resource (same as the "tapnum" entries of RESOURCE_DB_MAP in dashboard_st), bathrooms use tapnum
+RESOURCE_ID_FIELDS = {
+    'water': 'tapnum',
+    'food': 'foodnum',
+    'forage': 'foragenum',
+    'bathroom': 'tapnum',
+}
+ID_FIELDS = tuple(dict.fromkeys(RESOURCE_ID_FIELDS.values()))
+
+# Per reference (snapshot the index was built from, index of id -> (child key, record), time it was last checked),
+# trusted for TAP_INDEX_TTL seconds and dropped whenever Admin writes to the reference
+_tap_indexes = weakref.WeakKeyDictionary()
+# Seconds getTap serves lookups from an index without checking the database, TAP_INDEX_TTL=0 checks on every lookup
+TAP_INDEX_TTL = float(os.getenv('TAP_INDEX_TTL', '60'))
+
+# Firebase orders keys that look like integers numerically, ahead of every other key
+def key_order(key):
+    key = str(key)
+    return (0, int(key), '') if key.isdigit() else (1, 0, key)
+
+# Firebase orders child values null, false, true, numbers, strings, then objects (children with the same value by key)
+def value_order(value):
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    return (4, json.dumps(value, sort_keys=True))
+
+# Result of a query as the database sent it, keyed by child key (or by index when it came back as an array)
+# The SDK's Query.get() re-sorts it into a bare list for array shaped data and loses the keys, so the REST body is
+# read directly. Queries without a REST client (fakes) already keep their keys
+def query_result(query):
+    client = getattr(query, '_client', None)
+    if not hasattr(client, 'body'):
+        return query.get()
+    return client.body('get', query._pathurl, params=query._querystr)
+
+# Value at a child path (e.g. 'address/city') of a record, None when it isn't there
+def child_value(record, path):
+    for part in path.split('/'):
+        record = record.get(part) if isinstance(record, dict) else None
+    return record
+
+# Iterate over (key, child) pairs of a database snapshot, firebase returns either a list or a dict
+def iter_children(data):
+    if isinstance(data, list):
+        return enumerate(data)
+    if isinstance(data, dict):
+        return iter(data.items())
+    return iter(())
+
 #----------------------------------------------------------------------------------------------------------------------
-# Database References for all of the beta databases
-beta_water_db_live = db.reference('/', app= beta_water_live)
-beta_food_db_live = db.reference('/', app= beta_food_live)
-beta_forage_db_live = db.reference('/', app= beta_forage_live)
-beta_bathroom_db_live = db.reference('/', app= beta_bathroom_live)
+# Identify a reference by its database URL and path, so every reference to the same node shares cache entries
+def reference_key(ref):
+    client = getattr(ref, '_client', None)
+    base_url = getattr(client, 'base_url', None)
+    return (base_url or id(client if client is not None else ref), ref.path)
+
+def _paths_overlap(path, other):
+    path = path.rstrip('/') + '/'
+    other = other.rstrip('/') + '/'
+    return path.startswith(other) or other.startswith(path)
+
+# LRU cache of database snapshots and their ETags, used by Admin.getDb once a long running app opts in with
+# snapshot_cache.configure() (or SNAPSHOT_CACHE_SIZE), scripts read straight from firebase. Within ttl seconds of the last check a cached snapshot is returned as is, after that it is revalidated with
+# get_if_changed so an unchanged database costs a conditional request instead of a full download.
+# Snapshots are shared between callers and must be treated as read only.
+class SnapshotCache:
+    def __init__(self, ttl=0.0, max_entries=0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {'hits': 0, 'not_modified': 0, 'downloads': 0, 'evictions': 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Change the ttl and/or size of the cache, max_entries=0 turns it off again
+    def configure(self, ttl=None, max_entries=None):
+        with self._lock:
+            if ttl is not None:
+                self.ttl = ttl
+            if max_entries is not None:
+                self.max_entries = max_entries
+                self._evict()
+        return self
+
+    def get(self, ref):
+        key = reference_key(ref)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if now - entry['checked'] < self.ttl:
+                    self.stats['hits'] += 1
+                    return entry['data']
+        if entry is not None:
+            changed, data, etag = ref.get_if_changed(entry['etag'])
+            if not changed:
+                with self._lock:
+                    self.stats['not_modified'] += 1
+                    entry['checked'] = now
+                return entry['data']
+        else:
+            data, etag = ref.get(etag=True)
+        with self._lock:
+            self.stats['downloads'] += 1
+        self.put(ref, data, etag, now)
+        return data
+
+    def put(self, ref, data, etag, checked=None):
+        key = reference_key(ref)
+        with self._lock:
+            self._entries[key] = {'data': data, 'etag': etag, 'checked': checked or time.monotonic()}
+            self._entries.move_to_end(key)
+            self._evict()
+
+    # Drop the least recently used snapshots over max_entries, called with the lock held
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    # Make the next get of ref revalidate its snapshot (a conditional request) even within ttl
+    def expire(self, ref):
+        with self._lock:
+            entry = self._entries.get(reference_key(ref))
+            if entry is not None:
+                entry['checked'] = float('-inf')
+
+    # Drop the snapshot of ref and of any parent or child node of it, or every snapshot when ref is None
+    def invalidate(self, ref=None):
+        with self._lock:
+            if ref is None:
+                self._entries.clear()
+                return
+            base, path = reference_key(ref)
+            for key in [key for key in self._entries if key[0] == base and _paths_overlap(key[1], path)]:
+                del self._entries[key]
+
+# Shared by every Admin and off unless SNAPSHOT_CACHE_SIZE (or configure) sets how many snapshots it keeps,
+# SNAPSHOT_CACHE_TTL=0 revalidates on every read
+snapshot_cache = SnapshotCache(ttl=float(os.getenv('SNAPSHOT_CACHE_TTL', '0')), max_entries=int(os.getenv('SNAPSHOT_CACHE_SIZE', '0')))
+
 #----------------------------------------------------------------------------------------------------------------------
-# Database References for all of the test databases
-test_water_db_live = db.reference('/', app= test_water_live)
-test_food_db_live = db.reference('/', app= test_food_live)
-test_forage_db_live = db.reference('/', app= test_forage_live)
-test_bathroom_db_live = db.reference('/', app= test_bathroom_live)
+# Bulk writes: records are coalesced into multi-path ref.update() payloads instead of one request per record.
+# Firebase rejects single writes over 16MB, the caps keep each payload far below that.
+BULK_MAX_BYTES = 1024 * 1024
+BULK_MAX_PATHS = 1000
+
+# Split a {path: value} dict into multi-path update payloads under the byte and path caps
+def chunk_updates(updates, max_bytes=BULK_MAX_BYTES, max_paths=BULK_MAX_PATHS):
+    chunk = {}
+    chunk_bytes = 0
+    for path, value in updates.items():
+        size = len(str(path)) + len(json.dumps(value, separators=(',', ':'), default=str))
+        if chunk and (chunk_bytes + size > max_bytes or len(chunk) >= max_paths):
+            yield chunk
+            chunk = {}
+            chunk_bytes = 0
+        chunk[str(path)] = value
+        chunk_bytes += size
+    if chunk:
+        yield chunk
+
 #----------------------------------------------------------------------------------------------------------------------
 
 class Admin:
+    # Environment whose databases are resolved lazily (prod, beta or test)
+    dev_type = None
+
+    water_db_live = _LazyReference()
+    food_db_live = _LazyReference()
+    forage_db_live = _LazyReference()
+    bathroom_db_live = _LazyReference()
+
     # Constructor that initializes the different databases for an Admin object
-    def __init__(self, water_db_live, food_db_live, forage_db_live, bathroom_db_live):
-        self.water_db_live = water_db_live
-        self.food_db_live = food_db_live
-        self.forage_db_live = forage_db_live
-        self.bathroom_db_live = bathroom_db_live
+    # References that are not passed in are created on first access from dev_type
+    def __init__(self, water_db_live=None, food_db_live=None, forage_db_live=None, bathroom_db_live=None):
+        refs = {
+            'water_db_live': water_db_live,
+            'food_db_live': food_db_live,
+            'forage_db_live': forage_db_live,
+            'bathroom_db_live': bathroom_db_live,
+        }
+        for name, ref in refs.items():
+            if ref is not None:
+                setattr(self, name, ref)
+
 
     # Method to convert json fields to strings specifically for the hours field
     def convert_json_fields(self, record):
@@ -100,14 +307,18 @@ class Admin:
                     pass
         return record
     
-    # Method to get data from a given database reference
-    def getDb(self, ref):
+    # Method to get data from a given database reference, served from the snapshot cache when it is enabled
+    # Pass cached=False to force a plain full download
+    def getDb(self, ref, cached=True):
+        if cached and snapshot_cache.max_entries > 0:
+            return snapshot_cache.get(ref)
         ref_db = ref.get()
         return ref_db
 
     # Method to set data in a given database reference
     def setDb(self, ref):
         ref_db = ref.set()
+        self.invalidateCache(ref)
         return ref_db
 
     # Method to get changed data from a given database reference and URL
@@ -134,43 +345,122 @@ class Admin:
         else:
             print("The databases are not the same")
 
+    # Method to write a {path: value} dict to a given database reference as chunked multi-path updates
+    # Returns one report per chunk with its size, timing and error (None when the chunk was written)
+    def bulkUpdate(self, ref, updates, max_bytes=BULK_MAX_BYTES, max_paths=BULK_MAX_PATHS):
+        reports = []
+        for i, chunk in enumerate(chunk_updates(updates, max_bytes, max_paths)):
+            start = time.perf_counter()
+            error = None
+            try:
+                ref.update(chunk)
+            except Exception as e:
+                error = str(e)
+            report = {
+                'chunk': i,
+                'paths': len(chunk),
+                'first_path': next(iter(chunk)),
+                'seconds': time.perf_counter() - start,
+                'error': error,
+            }
+            reports.append(report)
+            if error is None:
+                print(f"Chunk {i}: wrote {report['paths']} paths in {report['seconds']:.3f} secs")
+            else:
+                print(f"Chunk {i}: failed to write {report['paths']} paths starting at {report['first_path']}: {error}")
+        if reports:
+            self.invalidateCache(ref)
+        return reports
+
     # Method to update a given database reference with changed data from a URL, iterating through the data
-    def updateChangedDbIter(self, ref, url, iterate: str):
+    def updateChangedDbIter(self, ref, url, iterate: str, bulk=False):
         changed = self.getChangedData(ref, url)
         count = 0
+        updates = {}
         for dict in changed:
             if dict[iterate] == count:
-                ref.update({count: dict})
+                if bulk:
+                    updates[count] = dict
+                else:
+                    ref.update({count: dict})
+                    print(count + 1)
                 count += 1
-                print(count)
+        if bulk:
+            return self.bulkUpdate(ref, updates)
+        self.invalidateCache(ref)
 
     # Method to update a given database reference with changed data from a URL
-    def updateChangedDb(self, ref, url):
+    def updateChangedDb(self, ref, url, bulk=False):
         changed = self.getChangedData(ref, url)
         count = 0
+        updates = {}
         for dict in changed:
-            ref.update({count: dict})
+            if bulk:
+                updates[count] = dict
+            else:
+                ref.update({count: dict})
+                print(count + 1)
             count += 1
-            print(count)
+        if bulk:
+            return self.bulkUpdate(ref, updates)
+        self.invalidateCache(ref)
 
     # Method to update a given database reference with data from another reference, iterating through the data
-    def updateDbIter(self, ref, alt_ref, iterate: str):
+    def updateDbIter(self, ref, alt_ref, iterate: str, bulk=False):
         alt_ref_data = self.getDb(alt_ref)
         count = 0
+        updates = {}
         for dict in alt_ref_data:
             if dict[iterate] == count:
-                ref.update({count: dict})
+                if bulk:
+                    updates[count] = dict
+                else:
+                    ref.update({count: dict})
+                    print(count + 1)
                 count += 1
-                print(count)
+        if bulk:
+            return self.bulkUpdate(ref, updates)
+        self.invalidateCache(ref)
 
     # Method to delete a node from a given database reference
     def deleteNode(self, ref):
         for node in ref.get():
             ref.child(node).delete()
+        self.invalidateCache(ref)
 
     # Method to add data to a given database reference
     def addToDb(self, ref, data):
         ref.push(data)
+        self.invalidateCache(ref)
+
+    # Method to count the records under a given database reference with a shallow read (keys only, no payload)
+    def getShallowCount(self, ref):
+        keys = ref.get(shallow=True)
+        if isinstance(keys, list):
+            return sum(1 for key in keys if key is not None)
+        if isinstance(keys, dict):
+            return len(keys)
+        return 0
+
+    # Method to run an ordered firebase query on a given database reference, returns [(key, child), ...] in query order
+    # order_by is a child field, or None to order by key. Ordering by a child field needs an .indexOn rule for it
+    def queryChildren(self, ref, order_by=None, start_at=None, end_at=None, equal_to=None, limit=None):
+        query = ref.order_by_key() if order_by is None else ref.order_by_child(order_by)
+        if equal_to is not None:
+            query = query.equal_to(equal_to)
+        if start_at is not None:
+            query = query.start_at(start_at)
+        if end_at is not None:
+            query = query.end_at(end_at)
+        if limit is not None:
+            query = query.limit_to_first(limit)
+        children = [(str(key), child) for key, child in iter_children(query_result(query)) if child is not None]
+        # JSON objects carry no order, put the children back in the order firebase applied the query in
+        if order_by is None:
+            children.sort(key=lambda item: key_order(item[0]))
+        else:
+            children.sort(key=lambda item: (value_order(child_value(item[1], order_by)), key_order(item[0])))
+        return children
 
     # Method to count the number of entries in a given database reference
     def getCount(self, ref):
@@ -178,28 +468,61 @@ class Admin:
         for dict in self.getDb(ref):
             count += 1
         return count
-    # Method to get a specific tap from a given database reference based on their unique tapnum
-    def getTap(self, ref, tapnum):
-        taps = self.getDb(ref)
-        try:
-            for tap in taps:
-                try:
-                    if tap['tapnum'] == tapnum:
-                        return tap
-                except:
-                   pass
-                try:
-                    if tap['foodnum'] == tapnum:
-                        return tap
-                except:
-                    pass
-        except:
-            pass
+
+    # Method to build (or reuse) the id -> (child key, record) index of a given database reference
+    # Within TAP_INDEX_TTL of the last check the index is returned without touching the database, after that it is
+    # only rebuilt when getDb returns a new snapshot. revalidate=True checks the snapshot even within both TTLs,
+    # before writing through the index
+    def getIndex(self, ref, revalidate=False):
+        cached = _tap_indexes.get(ref)
+        if not revalidate and cached is not None and time.monotonic() - cached[2] < TAP_INDEX_TTL:
+            return cached[1]
+        if revalidate:
+            snapshot_cache.expire(ref)
+        data = self.getDb(ref)
+        if cached is not None and cached[0] is data:
+            index = cached[1]
+        else:
+            index = {}
+            for key, tap in iter_children(data):
+                if isinstance(tap, dict):
+                    for field in ID_FIELDS:
+                        if field in tap:
+                            index.setdefault(tap[field], (key, tap))
+        _tap_indexes[ref] = (data, index, time.monotonic())
+        return index
+
+    # Method to drop the cached index and snapshots of a given database reference after its data has been changed
+    def invalidateCache(self, ref):
+        _tap_indexes.pop(ref, None)
+        snapshot_cache.invalidate(ref)
+
+    # Method to get a specific tap from a given database reference based on their unique tapnum (or foodnum/foragenum)
+    # With fresh=True the indexed child is re-read from firebase, otherwise the indexed record is returned as is
+    # A tap that is missing from the index or has moved is read once from the child keyed by its tapnum (where
+    # updateTap writes it). An index entry that turned out stale drops the index, so the next lookup rebuilds it
+    def getTap(self, ref, tapnum, fresh=True):
+        entry = self.getIndex(ref).get(tapnum)
+        if entry is not None:
+            key, tap = entry
+            if not fresh:
+                return tap
+            tap = ref.child(str(key)).get()
+            if isinstance(tap, dict) and any(tap.get(field) == tapnum for field in ID_FIELDS):
+                return tap
+            _tap_indexes.pop(ref, None)
+            if str(key) == str(tapnum):
+                return None
+        tap = ref.child(str(tapnum)).get()
+        if isinstance(tap, dict) and any(tap.get(field) == tapnum for field in ID_FIELDS):
+            return tap
+        return None
 
     # Method to delete a specific tap from a given database reference based on their tapnum number
     def deleteTap(self, ref, tapnum):
         try:
             ref.child(str(tapnum)).delete()
+            self.invalidateCache(ref)
         except:
             print("No tap found")
             
@@ -207,31 +530,37 @@ class Admin:
     def updateTap(self, ref, tapnum, data):
         try:
             ref.child(str(int(tapnum))).update(data)
+            self.invalidateCache(ref)
         except:
             print(data)
             print("No tap found")
 
-        # Method to update a given database reference with data from another reference
-
-
-    def updateDb(self, ref, dict_list):
+    # Method to update a given database reference with a list of records keyed by their tapnum
+    # With bulk=True every field becomes its own "<tapnum>/<field>" path, so the multi-path update merges
+    # into existing taps exactly like updateTap does
+    def updateDb(self, ref, dict_list, bulk=False):
+        updates = {}
         for record in dict_list:
             tapnum = record.get('tapnum')
             if tapnum is not None:
                 record = self.convert_json_fields(record)
-                self.updateTap(ref, tapnum, record)
+                if bulk:
+                    for field, value in record.items():
+                        updates[f'{int(tapnum)}/{field}'] = value
+                else:
+                    self.updateTap(ref, tapnum, record)
+        if bulk:
+            return self.bulkUpdate(ref, updates)
+
 
 
 class prodAdmin(Admin):
-    def __init__(self):
-        super().__init__(prod_water_db_live, prod_food_db_live, prod_forage_db_live, prod_bathroom_db_live)
+    dev_type = 'prod'
 
 
 class betaAdmin(Admin):
-    def __init__(self):
-        super().__init__(beta_water_db_live, beta_food_db_live, beta_forage_db_live, beta_bathroom_db_live)
+    dev_type = 'beta'
 
 
 class testAdmin(Admin):
-    def __init__(self):
-        super().__init__(test_water_db_live, test_food_db_live, test_forage_db_live, test_bathroom_db_live)
+    dev_type = 'test'
@@ -4,12 +4,19 @@ import sys
 from dotenv import load_dotenv
 import json
 import os
-from admin_classes import prodAdmin as prod, betaAdmin as beta, testAdmin as test
+import base64
+import functools
+import threading
+import time
+from admin_classes import prodAdmin as prod, betaAdmin as beta, testAdmin as test, iter_children, key_order, value_order, snapshot_cache
 
 # sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 # from admin.admin_classes import prodAdmin as prod, betaAdmin as beta, testAdmin as test
 
 load_dotenv()
+# Keep the prod snapshots between requests, every read revalidates them with a conditional request unless
+# SNAPSHOT_CACHE_TTL allows them to be served as is for a while
+snapshot_cache.configure(ttl=float(os.getenv('SNAPSHOT_CACHE_TTL', '0')), max_entries=int(os.getenv('SNAPSHOT_CACHE_SIZE', '4')))
 # initialize the prod_admin class
 water_prod=prod().water_db_live
 food_prod=prod().food_db_live
@@ -34,6 +41,7 @@ def connectDB():
     return water_prod
 
 def time_it(func):
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
         import time
         start = time.perf_counter()
@@ -62,16 +70,214 @@ def main():
 
 
 
-# Initiating the count of taps in each database
-water_prod_count = prod().getCount(water_prod)
-food_prod_count = prod().getCount(food_prod)
-bathroom_prod_count = prod().getCount(bathroom_prod)
-forage_prod_count = prod().getCount(forage_prod)
+#-----> PAGINATED TAP LISTING <-----#
+# GET /taps[/<resource>]?limit=50&cursor=...&sort=zip_code&order=asc&fields=tapnum,address&access=Public&city__startswith=Phila
+# Filters are exact matches (field=value) or prefix matches (field__startswith=value) on the stored values.
+# Plain ascending listings are paged with firebase order_by_key/order_by_child + start_at + limit_to_first queries and
+# the first filter is pushed down as an equal_to/start_at+end_at query. Anything firebase can't answer (descending
+# order, fields without an .indexOn rule) is served from the cached snapshot instead.
+TAP_REFS = {
+    'water': water_prod,
+    'food': food_prod,
+    'bathroom': bathroom_prod,
+    'forage': forage_prod,
+}
+TAPS_DEFAULT_LIMIT = 50
+TAPS_MAX_LIMIT = 500
+TAPS_RESERVED_PARAMS = {'limit', 'cursor', 'sort', 'order', 'fields'}
+
+def encode_cursor(cursor):
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+
+# Query string values are strings, also try them as the bool/number they may be stored as
+def query_values(raw):
+    values = [raw]
+    if raw.lower() in ('true', 'false'):
+        values.append(raw.lower() == 'true')
+    else:
+        for convert in (int, float):
+            try:
+                values.append(convert(raw))
+                break
+            except ValueError:
+                pass
+    return values
+
+def matches_filter(record, field, op, raw):
+    value = record.get(field)
+    if op == 'startswith':
+        return isinstance(value, str) and value.startswith(raw)
+    return value is not None and any(value == v and type(value) == type(v) for v in query_values(raw))
+
+# Same ordering firebase uses: by value (null, false, true, numbers, strings, objects), then by key
+def item_position(key, record, sort):
+    value = record.get(sort) if sort else None
+    return (value_order(value), key_order(key))
+
+def parse_filters(args):
+    filters = []
+    for param, raw in args.items():
+        if param in TAPS_RESERVED_PARAMS:
+            continue
+        field, _, op = param.partition('__')
+        filters.append((field, op or 'eq', raw))
+    return filters
+
+# The limit + 1 children after cursor in (sort value, key) order, or every child when there are fewer
+# start_at only takes a value and is inclusive, so the child at the cursor (and any child before it with the same
+# sort value) comes back again. Those are dropped, and in a long run of equal values the query is widened until a
+# full page is left, so a page never re-reads the pages before its sort value
+def query_after(admin, ref, sort, cursor, limit, start_at=None, end_at=None):
+    if cursor:
+        start_at = cursor['v'] if sort else cursor['k']
+        last = item_position(cursor['k'], {sort: cursor['v']} if sort else {}, sort)
+    fetch = limit + 2 if cursor else limit + 1
+    while True:
+        items = admin.queryChildren(ref, order_by=sort, start_at=start_at, end_at=end_at, limit=fetch)
+        page = [item for item in items if item_position(item[0], item[1], sort) > last] if cursor else items
+        if len(page) > limit or len(items) < fetch:
+            return page
+        fetch = max(limit + 1 + len(items) - len(page), fetch * 2)
+
+def query_taps(ref, filters, sort, descending, cursor, limit):
+    admin = prod()
+    # Firebase can cut ascending pages itself, unless the cursor stopped on a child without the sort field
+    sliceable = not descending and not (cursor and sort and cursor.get('v') is None)
+    if not filters:
+        if not sliceable:
+            raise ValueError('query needs the full snapshot')
+        # Pure ascending page: let firebase do the ordering and the limit
+        return query_after(admin, ref, sort, cursor, limit), 'query'
+    field, op, raw = filters[0]
+    if op == 'startswith':
+        if sliceable and sort == field and len(filters) == 1:
+            # Sorted by the filtered field, the page is a slice of the prefix range
+            return query_after(admin, ref, sort, cursor, limit, start_at=raw, end_at=raw + '\uf8ff'), 'query'
+        return admin.queryChildren(ref, order_by=field, start_at=raw, end_at=raw + '\uf8ff'), 'query'
+    items = {}
+    for value in query_values(raw):
+        items.update(admin.queryChildren(ref, order_by=field, equal_to=value))
+    return list(items.items()), 'query'
+
+@dashboard.route('/taps')
+@dashboard.route('/taps/<resource>')
+@time_it
+def list_taps(resource='water'):
+    ref = TAP_REFS.get(resource)
+    if ref is None:
+        return jsonify({'error': f'Unknown resource {resource}'}), 404
+    try:
+        limit = min(max(int(request.args.get('limit', TAPS_DEFAULT_LIMIT)), 1), TAPS_MAX_LIMIT)
+        cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid limit or cursor'}), 400
+    sort = request.args.get('sort') or None
+    descending = request.args.get('order', 'asc') == 'desc'
+    fields = [f for f in request.args.get('fields', '').split(',') if f]
+    filters = parse_filters(request.args)
+
+    try:
+        items, source = query_taps(ref, filters, sort, descending, cursor, limit)
+    except Exception as e:
+        if not isinstance(e, ValueError):
+            print(f"Falling back to the cached snapshot for /taps/{resource}: {e}")
+        items = [(str(key), tap) for key, tap in iter_children(prod().getDb(ref)) if isinstance(tap, dict)]
+        source = 'snapshot'
+
+    items = [(key, tap) for key, tap in items if all(matches_filter(tap, *f) for f in filters)]
+    items.sort(key=lambda item: item_position(item[0], item[1], sort), reverse=descending)
+    if cursor:
+        last = item_position(cursor['k'], {sort: cursor.get('v')} if sort else {}, sort)
+        items = [item for item in items if (item_position(item[0], item[1], sort) < last if descending else item_position(item[0], item[1], sort) > last)]
+
+    page = items[:limit]
+    next_cursor = None
+    if len(items) > limit and page:
+        last_key, last_tap = page[-1]
+        next_cursor = encode_cursor({'k': last_key, 'v': last_tap.get(sort) if sort else None})
+
+    if fields:
+        page = [(key, {f: tap[f] for f in fields if f in tap}) for key, tap in page]
+    return jsonify({'items': [tap for _, tap in page], 'next_cursor': next_cursor, 'source': source})
+
+
+
+#-----> RESOURCE COUNTS <-----#
+# Counts come from shallow reads (keys only) and are kept in memory, a background thread refreshes them every
+# COUNTS_REFRESH_SECONDS so /chart-data never waits on firebase once the first refresh is done. The thread is
+# started by the first request that asks for a count, importing the module (tests, scripts) doesn't touch firebase.
+COUNTS_REFRESH_SECONDS = float(os.environ.get('COUNTS_REFRESH_SECONDS', 300))
+
+class ResourceCounts:
+    def __init__(self, refs, refresh_seconds):
+        self.refs = refs
+        self.refresh_seconds = refresh_seconds
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def refresh(self, key):
+        try:
+            count = prod().getShallowCount(self.refs[key])
+        except Exception as e:
+            print(f"Could not refresh the {key[0]} {key[1]} count: {e}")
+            return
+        with self._lock:
+            self._counts[key] = {'count': count, 'updated': time.time()}
+
+    def refresh_all(self):
+        for key in self.refs:
+            self.refresh(key)
+
+    def _run(self):
+        while True:
+            self.refresh_all()
+            time.sleep(self.refresh_seconds)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='resource-counts', daemon=True)
+                self._thread.start()
+
+    # Cached count and its age in seconds, a count that was never loaded is read right away
+    def get(self, env, resource):
+        self.start()
+        key = (env, resource)
+        if key not in self._counts:
+            self.refresh(key)
+        entry = self._counts.get(key)
+        if entry is None:
+            return 0, None
+        return entry['count'], time.time() - entry['updated']
+
+resource_counts = ResourceCounts({
+    ('prod', 'water'): water_prod, ('prod', 'food'): food_prod, ('prod', 'bathroom'): bathroom_prod, ('prod', 'forage'): forage_prod,
+    ('beta', 'water'): water_beta, ('beta', 'food'): food_beta, ('beta', 'bathroom'): bathroom_beta, ('beta', 'forage'): forage_beta,
+    ('test', 'water'): water_test, ('test', 'food'): food_test, ('test', 'bathroom'): bathroom_test, ('test', 'forage'): forage_test,
+}, COUNTS_REFRESH_SECONDS)
+
+# Every count with its age in seconds
+@dashboard.route('/counts')
+def counts():
+    result = {}
+    for env, resource in resource_counts.refs:
+        count, age = resource_counts.get(env, resource)
+        result.setdefault(env, {})[resource] = {'count': count, 'age_seconds': age}
+    return jsonify(result)
 
 # Create a route to send the formated chart data to the frontend
 @dashboard.route('/chart-data')
 def chart_data():
+    water_prod_count, water_age = resource_counts.get('prod', 'water')
+    food_prod_count, food_age = resource_counts.get('prod', 'food')
+    bathroom_prod_count, bathroom_age = resource_counts.get('prod', 'bathroom')
+    forage_prod_count, forage_age = resource_counts.get('prod', 'forage')
     data = {
+        'ages': [water_age, food_age, bathroom_age, forage_age],
         'labels': ['Water DB', 'Food DB', 'Bathroom DB', 'Forage DB'],
         'datasets': [
             {
@@ -123,7 +329,6 @@ def chart_data():
 @dashboard.route('/updatetap/<int:tapnum>', methods = ['GET', 'PUT'])
 def updatetap(tapnum):
     tp=[]
-    db=prod().getDb(water_prod) 
     if request.method == 'GET':
         try:
             tp = prod().getTap(water_prod, tapnum)
@@ -159,6 +364,8 @@ def updatetap(tapnum):
                     "zip_code": data.get("zip_code")
                 }
             })
+            prod().invalidateCache(water_prod)
+            resource_counts.refresh(('prod', 'water'))
             return f"Tap {tapnum} Updated Successfully"
         except:
             return f"Error updating tap {tapnum}"
@@ -166,7 +373,8 @@ def updatetap(tapnum):
 
 @dashboard.route('/deletetap/<int:tapnum>')
 def deletetap(tapnum):
-    prod.deleteTap(water_prod, str(tapnum))
+    prod().deleteTap(water_prod, str(tapnum))
+    resource_counts.refresh(('prod', 'water'))
     return redirect('/') 
 
 
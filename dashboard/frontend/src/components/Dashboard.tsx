@@ -6,22 +6,50 @@ import {TapFormProps} from "./TapForm";
 import TapForm from "./TapForm";
 import './Dashboard.css';
 
+// Only the columns shown in the table are requested, the full tap is fetched when editing
+const TAP_FIELDS = "tapnum,organization,address,city,phone,hours";
+
+interface TapPage {
+  items: Tap[];
+  next_cursor: string | null;
+}
+
 const Dashboard = () => {
   const [tapData, setTapData] = useState<Tap[]>([]); 
   const [editingTap, setEditingTap] = useState<Tap | null>(null);
+  const [pageSize, setPageSize] = useState(10);
+  // Cursor of every page visited so far, the last one is the current page (null is the first page)
+  const [cursors, setCursors] = useState<(string | null)[]>([null]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
 
   useEffect(() => {
+    const cursor = cursors[cursors.length - 1];
     axios
-      .get<{ [key: string]: Tap }>("http://127.0.0.1:5000/", {
+      .get<TapPage>("http://127.0.0.1:5000/taps", {
+        params: { limit: pageSize, fields: TAP_FIELDS, ...(cursor ? { cursor } : {}) },
         headers: {
           "Content-Type": "application/json",
         },
       })
       .then((response) => {
-        setTapData(Object.values(response.data));
-        // console.log(Object.values(response.data));
+        setTapData(response.data.items);
+        setNextCursor(response.data.next_cursor);
       });
-  }, []);
+  }, [cursors, pageSize]);
+
+  const serverPagination = {
+    pageIndex: cursors.length - 1,
+    pageSize,
+    canNextPage: nextCursor !== null,
+    canPreviousPage: cursors.length > 1,
+    nextPage: () => nextCursor && setCursors((prev) => [...prev, nextCursor]),
+    previousPage: () => setCursors((prev) => prev.slice(0, -1)),
+    firstPage: () => setCursors([null]),
+    setPageSize: (size: number) => {
+      setPageSize(size);
+      setCursors([null]);
+    },
+  };
   
 
   const handleFormSubmit = async (tap: Tap) => {
@@ -123,7 +151,7 @@ const Dashboard = () => {
   return (
     <div className="Dashboard">
       {editingTap && <TapForm onSubmit={handleFormSubmit} editingTap={editingTap} />}
-      <Table columns={columns} data={tapData} />
+      <Table columns={columns} data={tapData} serverPagination={serverPagination} />
     </div>
   );
 };
@@ -3,14 +3,27 @@ import { useTable, useSortBy, usePagination, useFilters} from "react-table";
 import TimeConfig  from "./TimeConfig";
 import Dropdown from "./Dropdown";
 
+// Paging state owned by the parent when rows are fetched one page at a time from the /taps endpoint
+export interface ServerPagination {
+  pageIndex: number;
+  pageSize: number;
+  canNextPage: boolean;
+  canPreviousPage: boolean;
+  nextPage: () => void;
+  previousPage: () => void;
+  firstPage: () => void;
+  setPageSize: (size: number) => void;
+}
+
 interface TableProps {
   columns: any[];
   data: any[];
+  serverPagination?: ServerPagination;
 }
 
 const { getHourOptions } = TimeConfig;
 
-const Table = ({ columns, data }: TableProps) => {
+const Table = ({ columns, data, serverPagination }: TableProps) => {
   const handleHourChange = useCallback((value: any) => {
     const { open, close } = JSON.parse(value);
     console.log(open, close);
@@ -53,7 +66,8 @@ const Table = ({ columns, data }: TableProps) => {
     [InputFilter]
   );
 
-  const [pageSize, setPageSize] = useState(10);
+  const [localPageSize, setLocalPageSize] = useState(10);
+  const pageSize = serverPagination ? serverPagination.pageSize : localPageSize;
 
   const {
     getTableProps,
@@ -68,13 +82,16 @@ const Table = ({ columns, data }: TableProps) => {
     canNextPage,
     canPreviousPage,
     pageOptions,
-    state: { pageIndex },
+    state: { pageIndex: localPageIndex },
   } = useTable(
     {
       columns,
       data,
       defaultColumn,
       filterTypes,
+      // With server pagination data already is a single page
+      manualPagination: !!serverPagination,
+      pageCount: serverPagination ? -1 : undefined,
       initialState: { pageIndex: 0, pageSize },
     },
     useFilters,
@@ -85,6 +102,26 @@ const Table = ({ columns, data }: TableProps) => {
 
   const pageSizeOptions = [10, 25, 50, 100];
 
+  const paging = serverPagination
+    ? {
+        pageIndex: serverPagination.pageIndex,
+        canNextPage: serverPagination.canNextPage,
+        canPreviousPage: serverPagination.canPreviousPage,
+        nextPage: serverPagination.nextPage,
+        previousPage: serverPagination.previousPage,
+        firstPage: serverPagination.firstPage,
+        setPageSize: serverPagination.setPageSize,
+      }
+    : {
+        pageIndex: localPageIndex,
+        canNextPage,
+        canPreviousPage,
+        nextPage,
+        previousPage,
+        firstPage: () => gotoPage(0),
+        setPageSize: setLocalPageSize,
+      };
+
   return (
     <>
     <pre>
@@ -138,28 +175,31 @@ const Table = ({ columns, data }: TableProps) => {
         </tbody>
       </table>
       <div className="pagination" id="pag-buttons">
-        <button onClick={() => gotoPage(0)} disabled={!canPreviousPage}>
+        <button onClick={() => paging.firstPage()} disabled={!paging.canPreviousPage}>
           {'<<'}
         </button>{' '}
-        <button onClick={() => previousPage()} disabled={!canPreviousPage}>
+        <button onClick={() => paging.previousPage()} disabled={!paging.canPreviousPage}>
           {'<'}
         </button>{' '}
-        <button onClick={() => nextPage()} disabled={!canNextPage}>
+        <button onClick={() => paging.nextPage()} disabled={!paging.canNextPage}>
           {'>'}
         </button>{' '}
-        <button onClick={() => gotoPage(pageCount - 1)} disabled={!canNextPage}>
-          {'>>'}
-        </button>{' '}
+        {/* The number of pages is unknown when paging with cursors, so there is no jump to the last page */}
+        {!serverPagination && (
+          <button onClick={() => gotoPage(pageCount - 1)} disabled={!canNextPage}>
+            {'>>'}
+          </button>
+        )}{' '}
         <span>
           Page{' '}
           <strong>
-            {pageIndex + 1} of {pageOptions.length}
+            {paging.pageIndex + 1}{serverPagination ? '' : ` of ${pageOptions.length}`}
           </strong>{' '}
         </span>
         <select
           value={pageSize}
           onChange={e => {
-            setPageSize(Number(e.target.value))
+            paging.setPageSize(Number(e.target.value))
           }}
         >
           {pageSizeOptions.map(pageSize => (
@@ -3,6 +3,7 @@ import os
 import yaml
 from yaml.loader import SafeLoader
 import json
+import numbers
 import pandas as pd
 import streamlit as st
 from dataclasses import dataclass
@@ -13,7 +14,7 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 # Add the project root directory to the Python path using insert() at position -1 
 sys.path.insert(-1, PROJECT_ROOT)
 
-from admin.admin_classes import prodAdmin, betaAdmin, testAdmin
+from admin.admin_classes import prodAdmin, betaAdmin, testAdmin, MirroredRef, STRUCTURED_FIELDS, hours_codec, structured_fields, iter_children, snapshot_cache
 
 # Define a mapping for resource to database and "tapnum" replacement
 RESOURCE_DB_MAP = {
@@ -30,55 +31,167 @@ PROD_ADMIN_MAP = {
     "test": testAdmin,
 }
 
-def parse_and_filter_dicts(dict_list, keys):
-    # Function to parse any stringified JSON objects and filter out unnecessary keys
-    parsed_filtered_dict_list = []
-    for record in dict_list:
-        # Convert strings to JSON objects
-        for key in record:
-            if isinstance(record[key], str):
-                try:
-                    record[key] = json.loads(record[key])
-                except json.JSONDecodeError:
-                    pass  # If decoding fails, leave the value as it is
-
-        # If 'hours' is an empty dict, 'nan', or NaN, remove it
-        if 'hours' in record and (
-            (isinstance(record['hours'], dict) and not record['hours']) or
-            (isinstance(record['hours'], str) and (not record['hours'] or record['hours'] == 'nan'))
-        ):
-            del record['hours']
-
-        # Filter out unnecessary keys
-        filtered_dict = {key: record[key] for key in keys if key in record}
-        parsed_filtered_dict_list.append(filtered_dict)
-
-    return parsed_filtered_dict_list
+# Set MIRROR_DATABASES=1 to read from in-memory mirrors kept current by realtime listeners
+# The mirrors are shared by every session and survive reruns
+MIRROR_DATABASES = os.environ.get('MIRROR_DATABASES') == '1'
+
+# Seconds a loaded table is shown without asking firebase, after that it is revalidated with its ETag
+TABLE_CACHE_TTL = float(os.environ.get('TABLE_CACHE_TTL', '0'))
+# The dashboard keeps the snapshots of the last few tables it showed, shared by every session and rerun
+snapshot_cache.configure(ttl=TABLE_CACHE_TTL, max_entries=int(os.environ.get('SNAPSHOT_CACHE_SIZE', '4')))
+
+@st.cache_resource
+def get_admin(prod_level):
+    return PROD_ADMIN_MAP[prod_level]()
+
+@st.cache_resource
+def get_mirror(prod_level, db_attribute):
+    admin_obj = get_admin(prod_level)
+    return MirroredRef(getattr(admin_obj, db_attribute)).start()
+
+# (prod level, resource, db type) -> (snapshot, df), shared by every session and rerun
+@st.cache_resource
+def get_table_cache():
+    return {}
+
+def load_table(cache, cache_key, admin_obj, ref, resource_obj):
+    """
+    DataFrame of a database, rebuilt only when Admin.getDb (through the snapshot cache) returns a new snapshot.
+
+    :param cache: dict - Loaded tables, from get_table_cache()
+    :param cache_key: tuple - (prod level, resource, db type)
+    :param admin_obj: Admin - Reads the database
+    :param ref: Reference - The database reference (or its mirror)
+    :param resource_obj: Resource - Builds the DataFrame
+    """
+    data = admin_obj.getDb(ref)
+    entry = cache.get(cache_key)
+    if entry is None or entry[0] is not data:
+        entry = cache[cache_key] = (data, resource_obj.create_dataframe(data))
+    return entry[1]
+
+# Ids come back from the data editor as numpy numbers, or as floats when the column has gaps
+def record_id(value):
+    if value is None or pd.isna(value):
+        return None
+    if isinstance(value, numbers.Number) and float(value).is_integer():
+        return int(value)
+    return value.item() if hasattr(value, 'item') else value
+
+# Fields the resource schema in misc_scripts declares as arrays or objects
+def load_json_fields(resource):
+    try:
+        with open(os.path.join(PROJECT_ROOT, 'misc_scripts', f'{resource}_schema.yaml')) as f:
+            return structured_fields(yaml.load(f, Loader=SafeLoader))
+    except FileNotFoundError:
+        return STRUCTURED_FIELDS
 
 
 @dataclass
 class Resource:
     allowed_keys: list
+    json_fields: tuple = STRUCTURED_FIELDS
 
     def create_dataframe(self, data_list):
         if data_list is None:
             return pd.DataFrame()  # return an empty DataFrame
 
-        records = []
-        for item in data_list:
-            if item is not None:
-                record = {key: item.get(key) for key in self.allowed_keys if key in item}
-
-                # Convert 'hours' value to string if it's a list of dictionaries
-                if 'hours' in record and isinstance(record['hours'], list):
-                    try:
-                        record['hours'] = json.dumps(record['hours'])
-                    except:
-                        pass  # If encoding fails, leave the value as it is
-
-                records.append(record)
-
-        return pd.DataFrame(records)
+        # Build the table column by column, keys no record has are left out
+        items = [item for _, item in iter_children(data_list) if isinstance(item, dict)]
+        columns = {}
+        for key in self.allowed_keys:
+            values = [item.get(key) for item in items]
+            if all(value is None for value in values):
+                continue
+            # Convert structured values (hours) to JSON strings the data editor can show
+            if key in self.json_fields:
+                values = [hours_codec.encode(value) for value in values]
+            columns[key] = values
+
+        return pd.DataFrame(columns)
+
+    # Turn a data editor cell back into a firebase value, None deletes the field
+    def editor_value(self, field, value):
+        if isinstance(value, (list, dict)):
+            return value or None
+        if value is None or pd.isna(value):
+            return None
+        if field in self.json_fields:
+            try:
+                value = hours_codec.decode(value)
+            except json.JSONDecodeError:
+                return value  # If decoding fails, leave the value as it is
+            # Empty or 'nan' hours delete the field
+            if value in ('', 'nan') or value == {}:
+                return None
+            return value
+        return value.item() if hasattr(value, 'item') else value
+
+    def build_updates(self, row_ids, editor_state, id_field, index, keys):
+        """
+        Build one multi-path update with only the rows and fields changed in a data editor.
+
+        Edited rows write "<key>/<field>" for each changed field, added rows write their whole record and deleted
+        rows write None. A row is identified by the id the rendered table held at its position (row_ids) and
+        located in the current database through index (Admin.getIndex), so records moved since the table was
+        loaded are still written to the right key. Rows whose record is gone are skipped, added rows with a new id
+        are written under their id unless that key already holds another record.
+
+        :param row_ids: list - id_field value of each row of the DataFrame shown in the data editor
+        :param editor_state: dict - st.session_state of the data editor (edited_rows, added_rows, deleted_rows)
+        :param id_field: str - tapnum, foodnum or foragenum
+        :param index: dict - Record id -> (firebase key, record), built from the current database
+        :param keys: set - Child keys (as strings) of the current database
+        :return: tuple - ({path: value} updates, [(reason, row)] rows skipped)
+        """
+        updates, skipped = {}, []
+
+        def row_key(position, row):
+            position = int(position)
+            value = row_ids[position] if position < len(row_ids) else None
+            if value is None:
+                skipped.append((f'Row {position} has no {id_field}', row))
+                return None
+            if value not in index:
+                skipped.append((f'{id_field} {value} is no longer in the database', row))
+                return None
+            return str(index[value][0])
+
+        deleted = {int(position) for position in editor_state.get('deleted_rows', [])}
+        for position in deleted:
+            key = row_key(position, {})
+            if key is not None:
+                updates[key] = None
+        for position, changes in editor_state.get('edited_rows', {}).items():
+            if int(position) in deleted:
+                continue
+            key = row_key(position, changes)
+            if key is None:
+                continue
+            for field, value in changes.items():
+                if field in self.allowed_keys:
+                    updates[f'{key}/{field}'] = self.editor_value(field, value)
+
+        for row in editor_state.get('added_rows', []):
+            record = {field: self.editor_value(field, value) for field, value in row.items() if field in self.allowed_keys}
+            record = {field: value for field, value in record.items() if value is not None}
+            value = record_id(record.get(id_field))
+            if value is None:
+                skipped.append((f'Added row has no {id_field}', row))
+                continue
+            if value in index:
+                key = str(index[value][0])
+            elif str(value) in keys:
+                skipped.append((f'Key {value} already holds another record', row))
+                continue
+            else:
+                key = str(value)
+            record[id_field] = value
+            # A whole record replaces any field paths under the same key, firebase rejects overlapping paths
+            for path in [path for path in updates if path.startswith(f'{key}/')]:
+                del updates[path]
+            updates[key] = record
+        return updates, skipped
 
 # Define allowed keys for each resource
 allowed_water_keys = [
@@ -99,9 +212,9 @@ allowed_forage_keys = [
     'postal_code', 'species', 'street_address', 'tree_id', 'updated_at']
 
 # Instantiate Resource objects
-water_resource = Resource(allowed_water_keys)
-food_resource = Resource(allowed_food_keys)
-forage_resource = Resource(allowed_forage_keys)  # Forage resource object
+water_resource = Resource(allowed_water_keys, load_json_fields('water'))
+food_resource = Resource(allowed_food_keys, load_json_fields('food'))
+forage_resource = Resource(allowed_forage_keys, load_json_fields('forage'))  # Forage resource object
 
 # Define a mapping for each resource to its object
 resource_map = {
@@ -133,12 +246,18 @@ db_type = ['live', 'verify']  # Add or remove resources as needed
 selected_db_type = st.sidebar.selectbox('Select a database type:', db_type)
 
 # Create an object based on the selected production level
-admin_obj = PROD_ADMIN_MAP.get(selected_prod_level, lambda: st.error('Invalid production level selected'))()
+if selected_prod_level in PROD_ADMIN_MAP:
+    admin_obj = get_admin(selected_prod_level)
+else:
+    st.error('Invalid production level selected')
 
 # Get the data based on the selected resource and database type
 db_attribute = RESOURCE_DB_MAP.get(selected_resource, {}).get(selected_db_type)
 if db_attribute is not None:
-    data = admin_obj.getDb(getattr(admin_obj, db_attribute))
+    if MIRROR_DATABASES:
+        db_ref = get_mirror(selected_prod_level, db_attribute)
+    else:
+        db_ref = getattr(admin_obj, db_attribute)
 else:
     st.error('Invalid resource or database type selected')
 
@@ -147,28 +266,45 @@ resource_obj = resource_map.get(selected_resource)
 if resource_obj is None:
     st.error('Invalid resource selected')
 
-df = resource_obj.create_dataframe(data)
+table_key = (selected_prod_level, selected_resource, selected_db_type)
+df = load_table(get_table_cache(), table_key, admin_obj, db_ref, resource_obj)
 
+# Handle the tapnum replacement dynamically
+tapnum_replacement = RESOURCE_DB_MAP.get(selected_resource, {}).get("tapnum", "tapnum")
+
+# The editor's row positions refer to the table rendered on the previous run, which may differ from df when
+# another session wrote in between, so the ids of the rendered rows are kept in the session
+rendered_rows = st.session_state.get("editor_rows")
 edited_df = st.data_editor(df, height=500, width=1000, key="data_editor")
+st.session_state["editor_rows"] = (table_key, [record_id(value) for value in df[tapnum_replacement]]
+                                   if tapnum_replacement in df.columns else [None] * len(df))
 st.write("Here's the session state:")
 st.write(st.session_state["data_editor"])
 
-# Handle the tapnum replacement dynamically
-tapnum_replacement = RESOURCE_DB_MAP.get(selected_resource, {}).get("tapnum", "tapnum")
-if tapnum_replacement in edited_df.columns:
-    edited_df = edited_df.dropna(subset=[tapnum_replacement])
-    edited_df[tapnum_replacement] = edited_df[tapnum_replacement].astype(int)
-
-# Add a button to send the data back to Firebase
+# Add a button to send the changed rows back to Firebase in one batched update
 if st.button('Update Firebase'):
-    # Replace NaN values in 'hours' with empty dictionary
-    edited_df['hours'] = edited_df['hours'].apply(lambda x: {} if pd.isna(x) else x)
-
-    # Convert the DataFrame back to a list of dictionaries
-    updated_data = edited_df.to_dict('records')
-    filtered_data = parse_and_filter_dicts(updated_data, resource_obj.allowed_keys)
-
-    admin_obj.updateDb(getattr(admin_obj, db_attribute), filtered_data)
+    if rendered_rows is None or rendered_rows[0] != table_key:
+        st.error('The table changed before the update, check your edits and press the button again')
+        st.stop()
+    # Locate the records in the current database, order.py or another client may have moved them
+    index = admin_obj.getIndex(db_ref, revalidate=True)
+    keys = {str(key) for key, child in iter_children(admin_obj.getDb(db_ref)) if child is not None}
+    updates, skipped = resource_obj.build_updates(rendered_rows[1], st.session_state["data_editor"],
+                                                  tapnum_replacement, index, keys)
+    for reason, row in skipped:
+        st.warning(f"Skipped: {reason}: {row}")
+
+    if not updates:
+        st.info('No changes to write')
+    else:
+        reports = admin_obj.bulkUpdate(db_ref, updates)
+        get_table_cache().pop(table_key, None)
+        failed = [report for report in reports if report['error'] is not None]
+        if failed:
+            for report in failed:
+                st.error(f"Failed to write {report['paths']} paths starting at {report['first_path']}: {report['error']}")
+        else:
+            st.success(f"Wrote {len(updates)} changed paths")
 
 
 #-----> ANALYTICS PORTION <-----#
@@ -1,27 +1,149 @@
-import firebase_admin
-from firebase_admin import credentials, db
+import argparse
+import os
+import sys
+from firebase_admin import credentials
 import requests
-import json
+from requests.adapters import HTTPAdapter
+import queue
+import threading
+import time
 from collections import defaultdict
 import logging
-# Set up logging
-logging.basicConfig(filename='app.log', level=logging.INFO, 
-                    format='%(asctime)s %(message)s', datefmt='%m/%d/%Y %I:%M:%S %p')
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(-1, project_root)
+from admin.admin_classes import RESOURCE_URL_NAMES, get_firebase_url
+from stream_supervisor import StreamSupervisor
 
 resource_counts = defaultdict(int)
 
 
 slack_webhook_url = 'slack_webhook_url'
 
+# Slack cuts messages off at 40000 characters, digests stay well below that
+DIGEST_MAX_CHARS = 30000
+
+# End of the queue, queued by SlackNotifier.stop
+_STOP = object()
+
+class SlackNotifier:
+    """
+    Sends Slack messages from a background thread so the firebase listener callbacks never wait on Slack.
+
+    notify() puts a message on a bounded queue and returns immediately, messages that arrive while the queue is
+    full are dropped and counted. The sender collects what arrives within digest_wait seconds (up to digest_size
+    messages) into one digest, posts it through a single pooled session and retries connection errors, 429s and
+    5xxs with exponential backoff (honoring Retry-After). A digest that still fails after max_retries is logged
+    and dropped.
+    """
+    def __init__(self, webhook_url, max_queue=1000, digest_size=20, digest_wait=2.0, max_retries=5, backoff=1.0,
+                 max_backoff=60.0, timeout=10.0):
+        self.webhook_url = webhook_url
+        self.digest_size = digest_size
+        self.digest_wait = digest_wait
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.stats = {'queued': 0, 'dropped': 0, 'sent': 0, 'digests': 0, 'retries': 0, 'failed': 0}
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._dropping = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='slack-notifier', daemon=True)
+        self._thread.start()
+        return self
+
+    # Send what is still queued, then stop the sender
+    def stop(self, timeout=None):
+        self._queue.put(_STOP)
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.session.close()
+
+    # Log once when the queue fills up and once when it has room again, not for every dropped message
+    def notify(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            if not self._dropping:
+                logging.warning('Slack queue is full, dropping messages')
+            self._dropping += 1
+            self.stats['dropped'] += 1
+            return
+        self.stats['queued'] += 1
+        if self._dropping:
+            logging.warning(f'Slack queue has room again, {self._dropping} messages were dropped')
+            self._dropping = 0
+
+    def _run(self):
+        carry = None
+        while True:
+            message = carry if carry is not None else self._queue.get()
+            carry = None
+            if message is _STOP:
+                return
+            batch, size = [message], len(message)
+            deadline = time.monotonic() + self.digest_wait
+            stopping = False
+            while len(batch) < self.digest_size:
+                try:
+                    message = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if message is _STOP:
+                    stopping = True
+                    break
+                if size + len(message) > DIGEST_MAX_CHARS:
+                    carry = message
+                    break
+                batch.append(message)
+                size += len(message)
+            self._send(batch)
+            if stopping:
+                carry = _STOP
+
+    def _send(self, batch):
+        text = batch[0] if len(batch) == 1 else f"*{len(batch)} new taps* :phlask-water:\n\n" + "\n\n".join(batch)
+        error = self._post(text)
+        if error is None:
+            self.stats['sent'] += len(batch)
+            self.stats['digests'] += 1
+        else:
+            self.stats['failed'] += len(batch)
+            logging.error(f'{error}, dropped a digest of {len(batch)} messages')
+
+    # Returns None once Slack accepted the message, the last error otherwise
+    def _post(self, text):
+        for attempt in range(self.max_retries + 1):
+            delay = 0.0
+            try:
+                response = self.session.post(self.webhook_url, json={'text': text}, timeout=self.timeout)
+                if response.status_code == 200:
+                    return None
+                error = f'Slack returned {response.status_code}: {response.text[:200]}'
+                retryable = response.status_code == 429 or response.status_code >= 500
+                try:
+                    delay = float(response.headers.get('Retry-After', 0))
+                except ValueError:
+                    pass
+            except requests.RequestException as e:
+                error, retryable = f'Request to Slack failed: {e}', True
+            if not retryable or attempt == self.max_retries:
+                return error
+            self.stats['retries'] += 1
+            time.sleep(max(delay, min(self.backoff * 2 ** attempt, self.max_backoff)))
+
+notifier = SlackNotifier(slack_webhook_url)
+
 def send_slack_message(message):
-    payload = {'text': message}
-    headers = {'content-type': 'application/json'}
-    response = requests.post(slack_webhook_url, data=json.dumps(payload), headers=headers)
-    if response.status_code != 200:
-        raise ValueError('Request to Slack returned an error %s, the response is:\n%s' % (response.status_code, response.text))
+    notifier.notify(message)
 
 def get_key(data):
-    print(data)
     if isinstance(data, list):
         # If data is a list, return the index of the first item
         return 0
@@ -61,37 +183,47 @@ def process_node(node, db_name):
     send_slack_message(message)
 
 
+# One stream per verify database, named as the Slack messages name them
 apps = [
     {
-        'name': 'water-verify',
-        'credentials': credentials.Certificate('phlask.json'),
-        'databaseURL': 'https://phlask-web-map-prod-water-verify.firebaseio.com/'
-    },
-    {
-        'name': 'food-verify',
-        'credentials': credentials.Certificate('phlask.json'),
-        'databaseURL': 'https://phlask-web-map-prod-food-verify.firebaseio.com/'
-    },
-    {
-        'name': 'forage-verify',
-        'credentials': credentials.Certificate('phlask.json'),
-        'databaseURL': 'https://phlask-web-map-prod-foraging-verify.firebaseio.com/'
-    },
-    {
-        'name': 'bathroom-verify',
-        'credentials': credentials.Certificate('phlask.json'),
-        'databaseURL': 'https://phlask-web-map-prod-bathroom-verify.firebaseio.com/'
-    },
+        'name': f'{resource}-verify',
+        'db_name': url_name,
+        'databaseURL': get_firebase_url('prod', url_name, 'verify')
+    }
+    for resource, url_name in RESOURCE_URL_NAMES.items()
 ]
 
-# Initialize the apps with unique names
-# Initialize the apps with unique names and start listening to updates
-for app_config in apps:
-    app = firebase_admin.initialize_app(app_config['credentials'], {
-        'databaseURL': app_config['databaseURL']
-    }, name=app_config['name'])
+def log_metrics(supervisor):
+    for name, stream in supervisor.metrics().items():
+        logging.info(f"{name}: {stream['state']}, {stream['events_per_sec']:.2f} events/sec, "
+                     f"lag {stream['lag_ms']:.1f}ms (max {stream['max_lag_ms']:.1f}ms), "
+                     f"{stream['reconnects']} reconnects, last error: {stream['last_error']}")
 
-    ref = db.reference('/', app=app)
-    db_name = app_config['databaseURL'].split('//')[-1].split('-')[4]
-    ref.listen(lambda event, db_name=db_name: handle_event(event, db_name))
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Post new taps in the verify databases to Slack.')
+    parser.add_argument('--state-file', default='listener_state.json',
+                        help='Where the stream positions are kept, so a restart does not announce every tap again')
+    parser.add_argument('--metrics-interval', type=float, default=300, help='Seconds between metrics log lines')
+    args = parser.parse_args()
 
+    # Set up logging
+    logging.basicConfig(filename='app.log', level=logging.INFO,
+                        format='%(asctime)s %(message)s', datefmt='%m/%d/%Y %I:%M:%S %p')
+    notifier.start()
+    cred = credentials.Certificate('phlask.json')
+
+    # Every verify database is streamed from the supervisor's single event loop
+    supervisor = StreamSupervisor(state_file=args.state_file)
+    for app_config in apps:
+        supervisor.add(app_config['name'], app_config['databaseURL'],
+                       lambda event, db_name=app_config['db_name']: handle_event(event, db_name), credential=cred)
+    supervisor.start()
+    try:
+        while True:
+            time.sleep(args.metrics_interval)
+            log_metrics(supervisor)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
+        notifier.stop()
@@ -1,6 +1,14 @@
+import argparse
+import os
+import sys
+
 import firebase_admin
 from firebase_admin import credentials, db
 
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(-1, project_root)
+from admin.admin_classes import iter_children, key_order, node_digest
+
 apps = [
     {
         'name': 'water-verify',
@@ -20,9 +28,36 @@ apps = [
     # },
 ]
 
-cred = credentials.Certificate('phlask.json')
+def compaction_updates(data, dedupe=False):
+    """
+    Multi-path update that renumbers the non-null children of data to 0..n-1, keeping their firebase order.
+    Children already at their new key are left out and keys past the end are deleted.
+
+    :param data: list or dict - The database snapshot
+    :param dedupe: bool - Also drop children identical to an earlier child
+    :return: tuple - ({path: value} update, number of children kept, number of duplicates dropped)
+    """
+    current = {str(key): child for key, child in iter_children(data) if child is not None}
+    children, seen = [], set()
+    for key in sorted(current, key=key_order):
+        if dedupe:
+            digest = node_digest(current[key])
+            if digest in seen:
+                continue
+            seen.add(digest)
+        children.append(current[key])
 
-def order_data(app_config):
+    updates = {}
+    for i, child in enumerate(children):
+        if current.get(str(i)) != child:
+            updates[str(i)] = child
+    kept = {str(i) for i in range(len(children))}
+    for key in current:
+        if key not in kept:
+            updates[key] = None
+    return updates, len(children), len(current) - len(children) if dedupe else 0
+
+def order_data(app_config, cred, dry_run=False, dedupe=False):
     app = firebase_admin.initialize_app(cred, {
         'databaseURL': app_config['databaseURL']
     }, name=app_config['name'])
@@ -31,12 +66,27 @@ def order_data(app_config):
     data = ref.get()
 
     if data:
-        data = [i for i in data if i]
-        ref.delete()
-        for i, item in enumerate(data):
-            ref.child(str(i)).set(item)
+        updates, count, duplicates = compaction_updates(data, dedupe)
+        moved = sum(1 for value in updates.values() if value is not None)
+        deleted = len(updates) - moved
+        # Deleting the root and setting every child back took one write per child plus the delete
+        avoided = count + 1 - (1 if updates else 0)
+        print(f"{app_config['name']}: {count} records, {moved} moved, {deleted} keys deleted, "
+              f"{duplicates} duplicates dropped, {count - moved} records left in place, {avoided} writes avoided")
+        if updates and not dry_run:
+            # One multi-path update is applied atomically, the database is never seen half compacted
+            ref.update(updates)
+        elif dry_run:
+            print(f"Dry run, {len(updates)} paths not written")
 
     firebase_admin.delete_app(app)
 
-for app_config in apps:
-    order_data(app_config)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Renumber the children of the verify databases to 0..n-1.')
+    parser.add_argument('--dry-run', action='store_true', help='Report the compaction without writing it')
+    parser.add_argument('--dedupe', action='store_true', help='Also drop records identical to an earlier record')
+    args = parser.parse_args()
+
+    cred = credentials.Certificate('phlask.json')
+    for app_config in apps:
+        order_data(app_config, cred, dry_run=args.dry_run, dedupe=args.dedupe)
@@ -0,0 +1,390 @@
+# Listener supervisor used by old_linode_script.py: the streaming REST API of several databases driven from one
+# asyncio loop on one thread, instead of an app, a listen() and a listener thread per database. Each stream
+# reconnects on its own with exponential backoff, and keeps a digest per child of what it has delivered (its resume
+# position, saved to state_file when one is given). After a reconnect or a restart the first put of the new
+# connection is compared with that position and the callback only gets puts for the children added, changed (data) or
+# removed (None) meanwhile.
+# Callbacks run on the supervisor thread, so they must hand slow work (Slack, writes) off instead of blocking it.
+import asyncio
+import codecs
+import datetime as dt
+import json
+import os
+import ssl
+import sys
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(-1, project_root)
+from admin.admin_classes import STREAM_CHUNK_SIZE, _mirror_child, _mirror_put, iter_children, key_order, node_digest
+
+# Firebase sends a keep-alive every 30 secs, a stream silent for longer than this is treated as dead
+STREAM_READ_TIMEOUT = 90
+# Seconds of events the events per second and lag metrics are computed over
+STREAM_RATE_WINDOW = 60
+# A token is fetched again when it expires within this many seconds
+STREAM_TOKEN_MARGIN = 300
+
+class StreamEvent:
+    # Same attributes as the firebase_admin.db.Event passed to listen() callbacks
+    # initial marks the put of the data at the path that opens every connection
+    def __init__(self, event_type, path, data, initial=False):
+        self.event_type = event_type
+        self.path = path
+        self.data = data
+        self.initial = initial
+
+class _Stream:
+    def __init__(self, name, url, callback, credential, path):
+        self.name = name
+        self.url = url
+        self.callback = callback
+        self.credential = credential
+        self.target = '/' + path.strip('/') + '.json'
+        self.data = None
+        # {child key: hex digest} of what the callback has seen, None until the first put was delivered
+        self.position = None
+        self.state = 'idle'
+        self.stats = {'events': 0, 'reconnects': 0, 'errors': 0, 'resumed': 0, 'skipped': 0}
+        self.last_error = None
+        self.last_event = None
+        self.started = None
+        # (time the callback finished, seconds since the event was read off the socket) within the rate window
+        self.recent = deque()
+        self.tasks = []
+
+    # The stream URL under the database URL, keeping its query (?ns= on the emulator)
+    def stream_url(self):
+        parts = urlsplit(self.url)
+        return parts._replace(path=parts.path.rstrip('/') + self.target).geturl()
+
+class StreamSupervisor:
+    """
+    Listens to several databases from one event loop.
+
+    add() registers a callback for the database at url (the databaseURL of an app, emulator URLs with ?ns= work),
+    start() runs the loop on a background thread and stop() closes every stream and saves the resume positions.
+    metrics() returns, per stream, its state, events per second and lag (from reading an event to the callback
+    returning) over the last rate_window seconds, reconnects and the last error.
+    """
+    def __init__(self, state_file=None, reconnect_delay=1.0, max_reconnect_delay=60.0,
+                 read_timeout=STREAM_READ_TIMEOUT, rate_window=STREAM_RATE_WINDOW, save_interval=5.0):
+        self.state_file = state_file
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.read_timeout = read_timeout
+        self.rate_window = rate_window
+        self.save_interval = save_interval
+        self._streams = {}
+        self._tokens = {}
+        self._ssl = None
+        self._dirty = False
+        self._loop = None
+        self._thread = None
+        self._saver = None
+        self._positions = self._load_positions()
+
+    def add(self, name, url, callback, credential=None, path='/'):
+        """
+        :param name: str - Name of the stream in the metrics and the state file
+        :param url: str - Database URL
+        :param callback: callable - Called with a StreamEvent for every put and patch
+        :param credential: firebase_admin.credentials.Base - Used for the access token, None for the emulator
+        :param path: str - Path to listen to
+        """
+        if name in self._streams:
+            raise ValueError(f'A stream named {name} was already added')
+        stream = _Stream(name, url, callback, credential, path)
+        stream.position = self._positions.get(name)
+        self._streams[name] = stream
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._open, stream)
+        return self
+
+    def start(self):
+        ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._ssl = ssl.create_default_context()
+            for stream in self._streams.values():
+                self._open(stream)
+            if self.state_file:
+                self._saver = self._loop.create_task(self._save_periodically())
+            self._loop.call_soon(ready.set)
+            self._loop.run_forever()
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name='stream-supervisor', daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self, timeout=10.0):
+        if self._loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+            self._loop = None
+
+    def metrics(self, timeout=5.0):
+        if self._loop is None:
+            return self._metrics()
+        return asyncio.run_coroutine_threadsafe(self._collect(), self._loop).result(timeout)
+
+    async def _collect(self):
+        return self._metrics()
+
+    def _metrics(self):
+        now = time.monotonic()
+        report = {}
+        for name, stream in self._streams.items():
+            while stream.recent and stream.recent[0][0] < now - self.rate_window:
+                stream.recent.popleft()
+            lags = [lag for _, lag in stream.recent]
+            window = min(self.rate_window, now - stream.started) if stream.started else self.rate_window
+            report[name] = {
+                'state': stream.state,
+                'events': stream.stats['events'],
+                'events_per_sec': len(lags) / window if window > 0 else 0.0,
+                'lag_ms': sum(lags) / len(lags) * 1000 if lags else 0.0,
+                'max_lag_ms': max(lags) * 1000 if lags else 0.0,
+                'reconnects': stream.stats['reconnects'],
+                'errors': stream.stats['errors'],
+                'resumed': stream.stats['resumed'],
+                'skipped': stream.stats['skipped'],
+                'last_event_secs_ago': now - stream.last_event if stream.last_event else None,
+                'last_error': stream.last_error,
+            }
+        return report
+
+    #------------------------------------------------------------------------------------------------------------------
+    # Everything below runs on the supervisor loop
+
+    def _open(self, stream):
+        stream.started = time.monotonic()
+        events = asyncio.Queue()
+        stream.tasks = [self._loop.create_task(self._listen(stream, events)),
+                        self._loop.create_task(self._dispatch(stream, events))]
+
+    async def _shutdown(self):
+        tasks = [task for stream in self._streams.values() for task in stream.tasks]
+        if self._saver is not None:
+            tasks.append(self._saver)
+        # wait_for can swallow a cancel that lands as the connection attempt finishes (before Python 3.12),
+        # so a task that is still running gets cancelled again
+        pending = set(tasks)
+        while pending:
+            for task in pending:
+                task.cancel()
+            _, pending = await asyncio.wait(pending, timeout=0.1)
+        for stream in self._streams.values():
+            stream.state = 'stopped'
+        self._save_positions()
+
+    # Keeps one stream connected, with a fresh connection (and token) after every failure
+    async def _listen(self, stream, events):
+        delay = self.reconnect_delay
+        while True:
+            healthy = False
+            try:
+                async for event in self._connect(stream):
+                    if not healthy:
+                        healthy = True
+                        delay = self.reconnect_delay
+                    events.put_nowait((time.monotonic(), event))
+                stream.last_error = 'Stream closed by the server'
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                stream.stats['errors'] += 1
+                stream.last_error = f'{type(e).__name__}: {e}'
+            stream.state = 'backoff'
+            stream.stats['reconnects'] += 1
+            print(f'Stream {stream.name} disconnected ({stream.last_error}), reconnecting in {delay:.1f} secs')
+            await asyncio.sleep(delay)
+            if not healthy:
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    # Yields the events of one connection, the first one is always the put of the data at the path (initial=True)
+    async def _connect(self, stream):
+        stream.state = 'connecting'
+        token = await self._token(stream.credential)
+        url = stream.stream_url()
+        for _ in range(5):
+            parts = urlsplit(url)
+            secure = parts.scheme == 'https'
+            host, port = parts.hostname, parts.port or (443 if secure else 80)
+            target = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, ssl=self._ssl if secure else None), self.read_timeout)
+            try:
+                default_port = 443 if secure else 80
+                headers = [f'GET {target} HTTP/1.1', f'Host: {host}' + ('' if port == default_port else f':{port}'),
+                           'Accept: text/event-stream', 'Cache-Control: no-cache', 'Connection: close']
+                if token:
+                    headers.append(f'Authorization: Bearer {token}')
+                writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('ascii'))
+                await writer.drain()
+                status, response_headers = await self._read_head(reader)
+                # Firebase may redirect the stream to the server that holds the database
+                if status in (301, 302, 307, 308) and 'location' in response_headers:
+                    url = response_headers['location']
+                    continue
+                if status != 200:
+                    body = await asyncio.wait_for(reader.read(1000), self.read_timeout)
+                    raise ConnectionError(f'{status} {body.decode("utf-8", "replace").strip()}')
+                stream.state = 'live'
+                initial = True
+                async for event_type, data in self._read_events(reader, response_headers):
+                    if event_type in ('put', 'patch'):
+                        payload = json.loads(data)
+                        yield StreamEvent(event_type, payload['path'], payload['data'], initial)
+                        initial = False
+                    elif event_type == 'cancel':
+                        raise PermissionError(f'Stream cancelled by the server: {data}')
+                    elif event_type == 'auth_revoked':
+                        self._tokens.pop(id(stream.credential), None)
+                        raise PermissionError('Access token expired or revoked')
+                return
+            finally:
+                writer.close()
+        raise ConnectionError(f'Too many redirects for {stream.url}')
+
+    async def _read_head(self, reader):
+        line = await asyncio.wait_for(reader.readline(), self.read_timeout)
+        if not line:
+            raise ConnectionError('Connection closed before a response')
+        status = int(line.split()[1])
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), self.read_timeout)
+            if line in (b'\r\n', b'\n', b''):
+                return status, headers
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+    # Yields (event, data) of the server-sent events in the body, chunked or read until the server closes it
+    async def _read_events(self, reader, headers):
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        chunked = 'chunked' in headers.get('transfer-encoding', '').lower()
+        buffer, event_type, data = '', None, []
+        while True:
+            if chunked:
+                size_line = await asyncio.wait_for(reader.readline(), self.read_timeout)
+                size = int(size_line.split(b';')[0].strip() or b'0', 16)
+                if size == 0:
+                    return
+                chunk = await asyncio.wait_for(reader.readexactly(size + 2), self.read_timeout)
+                chunk = chunk[:-2]
+            else:
+                chunk = await asyncio.wait_for(reader.read(STREAM_CHUNK_SIZE), self.read_timeout)
+                if not chunk:
+                    return
+            buffer += decoder.decode(chunk)
+            *lines, buffer = buffer.split('\n')
+            for line in lines:
+                line = line.rstrip('\r')
+                if not line:
+                    if event_type is not None:
+                        yield event_type, '\n'.join(data)
+                    event_type, data = None, []
+                elif line.startswith('event:'):
+                    event_type = line[6:].strip()
+                elif line.startswith('data:'):
+                    data.append(line[5:].lstrip())
+
+    async def _token(self, credential):
+        if credential is None:
+            return None
+        token, expiry = self._tokens.get(id(credential), (None, None))
+        # google-auth keeps expiries as naive UTC datetimes
+        now = dt.datetime.now(dt.timezone.utc).replace(tzinfo=None)
+        if token is None or (expiry is not None and expiry - now < dt.timedelta(seconds=STREAM_TOKEN_MARGIN)):
+            info = await self._loop.run_in_executor(None, credential.get_access_token)
+            token, expiry = info.access_token, info.expiry
+            self._tokens[id(credential)] = (token, expiry)
+        return token
+
+    # Applies events to the stream's data and position in order and hands them to the callback
+    async def _dispatch(self, stream, events):
+        while True:
+            received, event = await events.get()
+            try:
+                for delivered in self._resume(stream, event):
+                    stream.callback(delivered)
+            except Exception as e:
+                stream.stats['errors'] += 1
+                stream.last_error = f'Callback failed: {type(e).__name__}: {e}'
+                print(f'Stream {stream.name} callback failed on a {event.event_type} event: {e}')
+            now = time.monotonic()
+            stream.stats['events'] += 1
+            stream.last_event = now
+            stream.recent.append((now, now - received))
+
+    # Events the callback gets for event, a resumed first put becomes puts of the children that differ
+    def _resume(self, stream, event):
+        parts = [p for p in event.path.split('/') if p]
+        if event.event_type == 'put':
+            stream.data = _mirror_put(stream.data, parts, event.data)
+        else:
+            for path, value in event.data.items():
+                stream.data = _mirror_put(stream.data, parts + [p for p in path.split('/') if p], value)
+        previous = stream.position
+        if not parts and event.event_type == 'put':
+            stream.position = {str(key): node_digest(child).hex() for key, child in iter_children(stream.data)
+                               if child is not None}
+        else:
+            keys = {parts[0]} if parts else {path.strip('/').split('/')[0] for path in event.data}
+            stream.position = dict(stream.position or {})
+            for key in keys:
+                child = _mirror_child(stream.data, key)
+                if child is None:
+                    stream.position.pop(key, None)
+                else:
+                    stream.position[key] = node_digest(child).hex()
+        self._dirty = True
+        if not event.initial or previous is None:
+            return [event]
+        stream.stats['resumed'] += 1
+        changed = [key for key, digest in stream.position.items() if previous.get(key) != digest]
+        removed = [key for key in previous if key not in stream.position]
+        stream.stats['skipped'] += len(stream.position) - len(changed)
+        prefix = event.path.rstrip('/')
+        return ([StreamEvent('put', f'{prefix}/{key}', _mirror_child(stream.data, key))
+                 for key in sorted(changed, key=key_order)] +
+                [StreamEvent('put', f'{prefix}/{key}', None) for key in sorted(removed, key=key_order)])
+
+    async def _save_periodically(self):
+        while True:
+            await asyncio.sleep(self.save_interval)
+            if self._dirty:
+                self._save_positions()
+
+    def _load_positions(self):
+        if not self.state_file or not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f'Could not read the stream positions in {self.state_file}, starting over: {e}')
+            return {}
+
+    # Written to a temporary file first, so a crash never leaves a half written state file behind
+    def _save_positions(self):
+        if not self.state_file:
+            return
+        positions = {name: stream.position for name, stream in self._streams.items() if stream.position is not None}
+        temporary = f'{self.state_file}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(positions, f)
+        os.replace(temporary, self.state_file)
+        self._dirty = False
@@ -3,8 +3,13 @@ import os
 import datetime as dt
 import yaml
 import argparse
+import hashlib
+import json
 import logging
+import numbers
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
 from jsonschema import Draft202012Validator, ValidationError
@@ -13,22 +18,207 @@ from jsonschema import Draft202012Validator, ValidationError
 # Add the project root directory to the Python path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(-1, project_root)
-from admin.admin_classes import prodAdmin, betaAdmin, testAdmin
+from admin.admin_classes import prodAdmin, betaAdmin, testAdmin, iter_children
 
 # Import the schema from a YAML file in the same directory
 RESOURCE_SCHEMA = Path(__file__).resolve().parent / "water_schema.yaml"
 
+# Keywords CompiledSchema checks column by column, everything else in a property schema is left to jsonschema
+# format is only an annotation here, the validators are created without a format checker
+COMPILED_KEYWORDS = {'type', 'pattern', 'minLength', 'maxLength', 'minimum', 'maximum', 'format', 'title', 'description'}
+# Keywords that only apply to instances of one type, so cells of any other type can only fail the type check
+TYPE_KEYWORDS = {
+    'array': {'items', 'prefixItems', 'minItems', 'maxItems', 'uniqueItems', 'contains', 'minContains', 'maxContains'},
+    'object': {'properties', 'required', 'additionalProperties', 'patternProperties', 'minProperties', 'maxProperties',
+               'propertyNames', 'dependentRequired'},
+}
+# Distinct nested values whose errors ColumnCheck remembers
+NESTED_MEMO_SIZE = 10000
+# Top level keywords CompiledSchema understands, other schemas are validated row by row
+TOP_LEVEL_KEYWORDS = {'type', 'properties', 'required', 'additionalProperties', '$schema', 'title', 'description'}
+
+# Same rules as the Draft 2020-12 type checker, applied to the Python type of a cell
+def type_matches(kind, name):
+    if name == 'string':
+        return issubclass(kind, str)
+    if name == 'boolean':
+        return issubclass(kind, bool)
+    if name == 'null':
+        return kind is type(None)
+    if name == 'array':
+        return issubclass(kind, list)
+    if name == 'object':
+        return issubclass(kind, dict)
+    if name == 'number':
+        return issubclass(kind, numbers.Number) and not issubclass(kind, bool)
+    if name == 'integer':
+        return issubclass(kind, int) and not issubclass(kind, bool)
+    return False
+
+def kind_mask(kinds, match):
+    mask = np.zeros(len(kinds), dtype=bool)
+    for kind in set(kinds):
+        if match(kind):
+            mask |= kinds == kind
+    return mask
+
+
+class ColumnCheck:
+    """
+    Validates every cell of a DataFrame column against one property schema. type, pattern, length and min/max rules
+    are evaluated on the whole column at once, other keywords (nested arrays like hours) run through jsonschema on
+    the cells they can apply to. Errors come back with the same messages jsonschema would give.
+    """
+    def __init__(self, schema):
+        self.schema = schema
+        types = schema.get('type')
+        self.types = [types] if isinstance(types, str) else types
+        remaining = set(schema) - COMPILED_KEYWORDS
+        self.validator = Draft202012Validator(schema) if remaining else None
+        self.memo = {}
+        # With a single type and only keywords of that type left, jsonschema only has to see cells of that type
+        self.validate_all = bool(remaining) and not (
+            self.types and len(self.types) == 1 and remaining <= TYPE_KEYWORDS.get(self.types[0], set()))
+
+    # jsonschema errors of one cell, memoized on the repr of the value since most hours arrays are repeated
+    def nested_errors(self, value):
+        key = repr(value)
+        messages = self.memo.get(key)
+        if messages is None:
+            if len(self.memo) >= NESTED_MEMO_SIZE:
+                self.memo.clear()
+            messages = self.memo[key] = [error.message for error in self.validator.iter_errors(value)]
+        return messages
+
+    def cells(self, series):
+        if pd.api.types.is_bool_dtype(series.dtype):
+            kind = bool
+        elif pd.api.types.is_integer_dtype(series.dtype):
+            kind = int
+        elif pd.api.types.is_float_dtype(series.dtype):
+            kind = float
+        else:
+            kind = None
+        values = series.to_numpy(dtype=object)
+        if kind is not None:
+            return values, np.full(len(values), kind, dtype=object)
+        return values, np.array([type(value) for value in values], dtype=object)
+
+    # Yields (row position, message) for every error in the column
+    def __call__(self, series):
+        values, kinds = self.cells(series)
+        if self.validate_all:
+            for position, value in enumerate(values):
+                for message in self.nested_errors(value):
+                    yield position, message
+            return
+
+        schema = self.schema
+        if self.types:
+            matches = np.zeros(len(values), dtype=bool)
+            for name in self.types:
+                matches |= kind_mask(kinds, lambda kind: type_matches(kind, name))
+                if name == 'integer':
+                    # Floats with an integral value count as integers in Draft 2020-12
+                    floats = kind_mask(kinds, lambda kind: issubclass(kind, float))
+                    if floats.any():
+                        numbers_ = values[floats].astype(float)
+                        matches[floats] |= np.isfinite(numbers_) & (numbers_ == np.floor(numbers_))
+            reprs = ', '.join(repr(name) for name in self.types)
+            for position in np.flatnonzero(~matches):
+                yield position, f"{values[position]!r} is not of type {reprs}"
+            if self.validator is not None:
+                for position in np.flatnonzero(matches):
+                    for message in self.nested_errors(values[position]):
+                        yield position, message
+
+        if 'pattern' in schema or 'minLength' in schema or 'maxLength' in schema:
+            strings = np.flatnonzero(kind_mask(kinds, lambda kind: issubclass(kind, str)))
+            text = pd.Series(values[strings], dtype=object)
+            if 'pattern' in schema:
+                failed = ~text.str.contains(schema['pattern'], regex=True).to_numpy(dtype=bool)
+                for position in strings[failed]:
+                    yield position, f"{values[position]!r} does not match {schema['pattern']!r}"
+            lengths = text.str.len().to_numpy()
+            if 'minLength' in schema:
+                message = "should be non-empty" if schema['minLength'] == 1 else "is too short"
+                for position in strings[lengths < schema['minLength']]:
+                    yield position, f"{values[position]!r} {message}"
+            if 'maxLength' in schema:
+                message = "is expected to be empty" if schema['maxLength'] == 0 else "is too long"
+                for position in strings[lengths > schema['maxLength']]:
+                    yield position, f"{values[position]!r} {message}"
+
+        if 'minimum' in schema or 'maximum' in schema:
+            numeric = np.flatnonzero(kind_mask(kinds, lambda kind: type_matches(kind, 'number')))
+            numbers_ = values[numeric]
+            if 'minimum' in schema:
+                for position in numeric[np.asarray(numbers_ < schema['minimum'], dtype=bool)]:
+                    yield position, f"{values[position]!r} is less than the minimum of {schema['minimum']!r}"
+            if 'maximum' in schema:
+                for position in numeric[np.asarray(numbers_ > schema['maximum'], dtype=bool)]:
+                    yield position, f"{values[position]!r} is greater than the maximum of {schema['maximum']!r}"
+
+
+class CompiledSchema:
+    """
+    Column-wise version of a flat object schema (type object, properties, required, additionalProperties).
+    Every row of a DataFrame has every column, so required and additionalProperties errors are the same for all
+    rows and only the property checks have to look at the cells.
+    """
+    def __init__(self, schema):
+        self.properties = schema.get('properties', {})
+        self.required = schema.get('required', [])
+        self.additional_properties = schema.get('additionalProperties', True)
+        self.checks = {name: ColumnCheck(subschema) for name, subschema in self.properties.items()}
+
+    @classmethod
+    def compile(cls, schema):
+        if (not isinstance(schema, dict) or set(schema) - TOP_LEVEL_KEYWORDS or schema.get('type', 'object') != 'object'
+                or not isinstance(schema.get('additionalProperties', True), bool)
+                or not all(isinstance(subschema, dict) for subschema in schema.get('properties', {}).values())):
+            return None
+        return cls(schema)
+
+    # One list of error messages per row of df, in row order
+    def row_errors(self, df):
+        errors = [[] for _ in range(len(df))]
+        columns = df.columns.tolist()
+        for position, name in enumerate(columns):
+            check = self.checks.get(name)
+            if check is not None:
+                for row, message in check(df.iloc[:, position]):
+                    errors[row].append(message)
+
+        shared = [f"{name!r} is a required property" for name in self.required if name not in set(columns)]
+        extras = [name for name in columns if name not in self.properties]
+        if extras and self.additional_properties is False:
+            extras = sorted(extras, key=str)
+            verb = "was" if len(extras) == 1 else "were"
+            shared.append(f"Additional properties are not allowed ({', '.join(repr(extra) for extra in extras)} {verb} unexpected)")
+        if shared:
+            for row in errors:
+                row.extend(shared)
+        return errors
+
+
 class DataValidator:
-    def __init__(self, schema_path, log_path):
+    def __init__(self, schema_path, log_path, vectorized=True):
         # Load the schema and configure the logger
         with open(schema_path, 'r') as file:
             self.schema = yaml.safe_load(file)
         Draft202012Validator.check_schema(self.schema)
+        # Column-wise engine, None when the schema needs the row by row jsonschema path
+        self.compiled = CompiledSchema.compile(self.schema) if vectorized else None
         self.configure_logger(log_path)
 
     def configure_logger(self, log_path):
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.INFO)
+
+        # Validators of several resources can share one log file (--all), add its handler only once
+        if any(getattr(h, 'baseFilename', None) == os.path.abspath(log_path) for h in self.logger.handlers):
+            return
         
         # Create a file handler
         handler = logging.FileHandler(log_path)
@@ -41,57 +231,101 @@ class DataValidator:
         # Add the handlers to the logger
         self.logger.addHandler(handler)
 
-    def get_invalid_data(self, df, validator, resource):
+    def get_invalid_data(self, df, validator, resource, state=None):
         self.logger.info(f"Validating data in dataframe for resource: {resource}...")
 
         df_cols = df.columns.tolist()
         error_dict = {}
-        for i, row in df.iterrows():
-            invalid_data = row.to_dict()
+        rows = self.iter_invalid_rows(df, validator) if state is None else self.iter_changed_rows(df, validator, state)
+        for i, invalid_data, messages in rows:
             total_errors = 0
-            try:
-                validator.validate(invalid_data)
-            except ValidationError:
-                for error in sorted(validator.iter_errors(invalid_data), key=str):
-                    self.logger.info(f"Error in row {i}: {error.message}")
-                    total_errors += 1
-                if resource == "water":
-                    if "tapnum" not in df_cols:
-                        self.logger.warning("No tapnum column in dataframe. Skipping row...")
-                        continue
-                    error_dict[i] = {"tapnum": invalid_data["tapnum"], "address": invalid_data["address"], "total_errors": total_errors}
-                elif resource == "food":
-                    if "foodnum" not in df_cols:
-                        self.logger.warning("No foodnum column in dataframe. Skipping row...")
-                        continue
-                    error_dict[i] = {"foodnum": invalid_data["foodnum"], "address": invalid_data["address"], "total_errors": total_errors}
-                elif resource == "forage":
-                    if "Planting Site Id" not in df_cols:
-                        self.logger.warning("No foragenum column in dataframe. Skipping row...")
-                        continue
-                    error_dict[i] = {"Planting_Site_Id": invalid_data["Planting Site Id"], "Street_Address": invalid_data["Street Address"], "total_errors": total_errors}
-                else:
-                    self.logger.warning(f"Unknown resource: {resource}. Skipping row {i}...")
+            for message in messages:
+                self.logger.info(f"Error in row {i}: {message}")
+                total_errors += 1
+            if resource == "water":
+                if "tapnum" not in df_cols:
+                    self.logger.warning("No tapnum column in dataframe. Skipping row...")
+                    continue
+                error_dict[i] = {"tapnum": invalid_data["tapnum"], "address": invalid_data["address"], "total_errors": total_errors}
+            elif resource == "food":
+                if "foodnum" not in df_cols:
+                    self.logger.warning("No foodnum column in dataframe. Skipping row...")
+                    continue
+                error_dict[i] = {"foodnum": invalid_data["foodnum"], "address": invalid_data["address"], "total_errors": total_errors}
+            elif resource == "forage":
+                if "Planting Site Id" not in df_cols:
+                    self.logger.warning("No foragenum column in dataframe. Skipping row...")
+                    continue
+                error_dict[i] = {"Planting_Site_Id": invalid_data["Planting Site Id"], "Street_Address": invalid_data["Street Address"], "total_errors": total_errors}
+            else:
+                self.logger.warning(f"Unknown resource: {resource}. Skipping row {i}...")
 
         return error_dict
 
-    def validate_and_log(self, df, admin_class_name, resource, db_env):
+    # Yields (row index, row dict, sorted error messages) for every row that fails the schema
+    def iter_invalid_rows(self, df, validator):
+        if self.compiled is None:
+            for i, row in df.iterrows():
+                invalid_data = row.to_dict()
+                try:
+                    validator.validate(invalid_data)
+                except ValidationError:
+                    yield i, invalid_data, [error.message for error in sorted(validator.iter_errors(invalid_data), key=str)]
+            return
+        row_errors = self.compiled.row_errors(df)
+        invalid = [position for position, messages in enumerate(row_errors) if messages]
+        rows = df.iloc[invalid].to_dict('records')
+        for position, invalid_data in zip(invalid, rows):
+            yield df.index[position], invalid_data, sorted(row_errors[position])
+
+    def iter_changed_rows(self, df, validator, state):
+        """
+        Incremental version of iter_invalid_rows: only rows whose content hash changed since the run that left state
+        behind are validated, the others get their recorded errors back. Everything is validated again when the
+        schema or the set of columns changed, since both change the errors of every row. state is updated in place
+        with the hashes and errors of this run.
+        """
+        hashes = row_hashes(df)
+        fingerprint = hashlib.sha1(json.dumps([self.schema, sorted(map(str, df.columns))], sort_keys=True,
+                                              default=str).encode('utf-8')).hexdigest()
+        previous = state.get('rows', {}) if state.get('fingerprint') == fingerprint else {}
+        keys = [str(i) for i in df.index]
+        changed = [position for position, (key, row_hash) in enumerate(zip(keys, hashes))
+                   if previous.get(key, [None])[0] != row_hash]
+        fresh = {i: messages for i, _, messages in self.iter_invalid_rows(df.iloc[changed], validator)}
+        changed = set(changed)
+
+        rows = {}
+        for position, (i, key, row_hash) in enumerate(zip(df.index, keys, hashes)):
+            messages = fresh.get(i, []) if position in changed else previous[key][1]
+            rows[key] = [row_hash, messages]
+        state.update(fingerprint=fingerprint, rows=rows)
+        self.logger.info(f"Validated {len(changed)} new or changed rows, reused the results of {len(df) - len(changed)} rows")
+
+        invalid = [position for position, key in enumerate(keys) if rows[key][1]]
+        for position, invalid_data in zip(invalid, df.iloc[invalid].to_dict('records')):
+            yield df.index[position], invalid_data, rows[keys[position]][1]
+
+    def validate_and_log(self, df, admin_class_name, resource, db_env, state=None):
         self.logger.info("\n\n" + "="*60)
         self.logger.info(f"STARTING VALIDATION: {admin_class_name.upper()} DATABASE")
         self.logger.info("="*60 + "\n")
 
         validator = Draft202012Validator(self.schema)
-        error_dict = self.get_invalid_data(df, validator, resource)
+        error_dict = self.get_invalid_data(df, validator, resource, state)
 
+        summary = {'resource': resource, 'environment': db_env, 'rows': len(df), 'invalid_rows': len(error_dict),
+                   'errors': sum(value['total_errors'] for value in error_dict.values()), 'csv': ''}
         if len(error_dict) == 0:
             self.logger.info("\t\tData is valid.")
         else:
             self.logger.info("\t\tData is invalid.")
             # Log the schema errors to a file
             csv_name = f"{resource}_{admin_class_name.lower()}_{db_env}_schema_errors_{dt.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            csv_fp = validation_results_dir / csv_name
+            csv_fp = results_dir(resource) / csv_name
             error_df = pd.DataFrame.from_dict(error_dict, orient='index')
             error_df.to_csv(csv_fp, index=False)
+            summary['csv'] = str(csv_fp)
             self.logger.info(f"\n\nSchema errors logged to {csv_fp}")
 
             for key, value in error_dict.items():
@@ -102,6 +336,25 @@ class DataValidator:
         self.logger.info("\n" + "="*60)
         self.logger.info(f"FINISHED VALIDATION: {admin_class_name.upper()} DATABASE")
         self.logger.info("="*60 + "\n\n")
+        return summary
+
+# Content hash of every row, as the row would be validated
+def row_hashes(df):
+    return [hashlib.sha1(json.dumps(record, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+            for record in df.to_dict('records')]
+
+def load_state(state_fp):
+    try:
+        with open(state_fp) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(state, state_fp):
+    tmp_fp = Path(f"{state_fp}.tmp")
+    with open(tmp_fp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_fp, state_fp)
 
 def eda_water_resource(df):
     # exploratory data analysis
@@ -140,7 +393,9 @@ def eda_water_resource(df):
     logging.info(f"Number of rows with hours too long: {count_hours_too_long}")
 
     # analyze hours contents
-    analyze_business_hours(df, 'hours')
+    business_hours = analyze_business_hours(df, 'hours')
+    logging.info(f"Number of taps open now: {business_hours.open_now().sum()}")
+    logging.info(f"Hours a day with at least one open tap, by zip code:\n{business_hours.coverage(df['zip_code'])}")
 
     # duplicate addresses?
     duplicate_addresses = df[df.duplicated(subset=['address'], keep=False)]
@@ -154,6 +409,137 @@ def eda_water_resource(df):
             logging.info(f"{row['address']}")
 
 
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+PERIODS = ['Morning', 'Evening', 'Night']
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+# {'day': 1, 'time': '0930'} -> (1, 570), None when the day or time is missing or unreadable
+def parse_hours_point(point):
+    if not isinstance(point, dict) or 'day' not in point or 'time' not in point:
+        return None
+    try:
+        day, time = int(point['day']), int(point['time'])
+    except (TypeError, ValueError):
+        return None
+    hour, minute = divmod(time, 100)
+    if not 0 <= hour < 24 or minute >= 60:
+        return None
+    return day % 7, hour * 60 + minute
+
+
+class BusinessHours:
+    """
+    The hours column of a DataFrame normalized once into NumPy arrays.
+
+    hours[tap, day, slot] is an (open, close) pair in minutes after midnight of that day. close runs past 1440 for
+    periods that end on a later day, a close without an open is kept on its own day and -1 marks a missing end or
+    an unused slot. Taps with Google's encoding of open 24 hours (an open on day 0 at 0000 and no close) are
+    flagged in always_open. Day 0 is Monday, as in analyze_business_hours.
+    """
+    def __init__(self, hours_col):
+        self.count = len(hours_col)
+        self.always_open = np.zeros(self.count, dtype=bool)
+        taps, days, opens, closes = [], [], [], []
+        for tap, hours in enumerate(hours_col):
+            if not isinstance(hours, list):
+                continue
+            for hour in hours:
+                if not isinstance(hour, dict):
+                    continue
+                opened, closed = parse_hours_point(hour.get('open')), parse_hours_point(hour.get('close'))
+                if opened is None:
+                    if closed is not None:
+                        taps.append(tap), days.append(closed[0]), opens.append(-1), closes.append(closed[1])
+                    continue
+                if closed is None:
+                    self.always_open[tap] |= opened == (0, 0) and 'close' not in hour
+                    close = -1
+                else:
+                    close = (closed[0] - opened[0]) % 7 * MINUTES_PER_DAY + closed[1]
+                    if close <= opened[1]:
+                        close += MINUTES_PER_WEEK
+                taps.append(tap), days.append(opened[0]), opens.append(opened[1]), closes.append(close)
+
+        taps, days = np.array(taps, dtype=np.int64), np.array(days, dtype=np.int64)
+        # Periods of the same tap and day go to consecutive slots
+        keys = taps * 7 + days
+        order = np.argsort(keys, kind='stable')
+        slots = np.empty(len(keys), dtype=np.int64)
+        slots[order] = np.arange(len(keys)) - np.searchsorted(keys[order], keys[order])
+        self.hours = np.full((self.count, 7, int(slots.max(initial=0)) + 1, 2), -1, dtype=np.int32)
+        self.hours[taps, days, slots, 0] = opens
+        self.hours[taps, days, slots, 1] = closes
+
+        # Periods with both ends as [start, end) minutes of the week, end can run into the next week
+        complete = (self.hours[..., 0] >= 0) & (self.hours[..., 1] >= 0)
+        self.period_taps, period_days, _ = np.nonzero(complete)
+        self.period_starts = period_days * MINUTES_PER_DAY + self.hours[..., 0][complete]
+        self.period_ends = period_days * MINUTES_PER_DAY + self.hours[..., 1][complete]
+
+    def period_counts(self):
+        """
+        Number of taps with an open or close in the morning, evening and night of each day, counted the way
+        analyze_business_hours always has: opens from 0600 are morning, from 1200 evening and from 1800 (or before
+        0600) night, closes before 0600 are morning, before 1200 evening and from 1200 night.
+        """
+        flags = np.zeros((self.count, 7, len(PERIODS)), dtype=bool)
+        tap, day, slot = np.nonzero(self.hours[..., 0] >= 0)
+        minute = self.hours[tap, day, slot, 0]
+        flags[tap, day, np.select([(360 <= minute) & (minute < 720), (720 <= minute) & (minute < 1080)], [0, 1], 2)] = True
+        tap, day, slot = np.nonzero(self.hours[..., 1] >= 0)
+        close = self.hours[tap, day, slot, 1]
+        day, minute = (day + close // MINUTES_PER_DAY) % 7, close % MINUTES_PER_DAY
+        flags[tap, day, np.select([minute < 360, minute < 720], [0, 1], 2)] = True
+        return pd.DataFrame(flags.sum(axis=0), index=DAYS, columns=PERIODS)
+
+    def open_at(self, day, minute):
+        """
+        Boolean array of the taps open on day (0 is Monday) at minute after midnight.
+        """
+        t = day % 7 * MINUTES_PER_DAY + minute
+        starts, ends = self.period_starts, self.period_ends
+        # A period that started late last week is still open early this week
+        now_open = ((starts <= t) & (t < ends)) | ((starts <= t + MINUTES_PER_WEEK) & (t + MINUTES_PER_WEEK < ends))
+        mask = self.always_open.copy()
+        mask[self.period_taps[now_open]] = True
+        return mask
+
+    def open_now(self, now=None):
+        now = now or dt.datetime.now()
+        return self.open_at(now.weekday(), now.hour * 60 + now.minute)
+
+    def coverage(self, groups, step=60):
+        """
+        Hours of each day in which at least one tap of a group is open, one row per group (zip code for example).
+        The week is sampled every step minutes, taps whose group is missing are left out.
+
+        :param groups: array-like - Group of every tap, in the same order as the hours column
+        :param step: int - Minutes between samples, a divisor of 1440
+        """
+        codes, names = pd.factorize(pd.Series(groups).reset_index(drop=True), sort=True)
+        samples = MINUTES_PER_WEEK // step
+        period_codes = codes[self.period_taps]
+        keep = period_codes >= 0
+        # First and one past the last sample inside every period, a period past the end of the week wraps around
+        first = -(-self.period_starts[keep] // step)
+        last = -(-self.period_ends[keep] // step)
+        period_codes = period_codes[keep]
+        wrapped = last > samples
+        starts = np.concatenate([first, np.zeros(wrapped.sum(), dtype=first.dtype)])
+        stops = np.concatenate([np.minimum(last, samples), last[wrapped] - samples])
+        owners = np.concatenate([period_codes, period_codes[wrapped]])
+
+        # Count the open periods of every group at every sample with a running sum over +1/-1 steps
+        width = samples + 1
+        steps = (np.bincount(owners * width + starts, minlength=len(names) * width)
+                 - np.bincount(owners * width + stops, minlength=len(names) * width))
+        covered = np.cumsum(steps.reshape(len(names), width), axis=1)[:, :samples] > 0
+        covered[codes[self.always_open & (codes >= 0)]] = True
+        hours = covered.reshape(len(names), 7, samples // 7).sum(axis=2) * step / 60
+        return pd.DataFrame(hours, index=names, columns=DAYS)
+
+
 def analyze_business_hours(df, col):
     """
     This function analyzes a DataFrame column containing business hours, given as a list of dictionaries,
@@ -161,49 +547,17 @@ def analyze_business_hours(df, col):
 
     :param df: DataFrame - DataFrame containing business hours data
     :param col: str - Name of the column in the DataFrame containing business hours data
+    :return: BusinessHours - The normalized hours, for further queries
     """
-    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    periods = ['Morning', 'Evening', 'Night']
-    
-    business_hours = {day: {period: 0 for period in periods} for day in days}
-    
-    for hours in df[col]:
-        if isinstance(hours, list):
-            daily_hours = {day: {period: False for period in periods} for day in days}
-            for hour in hours:
-                if 'open' in hour and 'time' in hour['open'] and 'day' in hour['open']:
-                    opening_time = int(hour['open']['time'])
-                    opening_day = int(hour['open']['day'])
-                    
-                    if 600 <= opening_time < 1200:
-                        daily_hours[days[opening_day % 7]]['Morning'] = True
-                    elif 1200 <= opening_time < 1800:
-                        daily_hours[days[opening_day % 7]]['Evening'] = True
-                    else:
-                        daily_hours[days[opening_day % 7]]['Night'] = True
-
-                if 'close' in hour and 'time' in hour['close'] and 'day' in hour['close']:
-                    closing_time = int(hour['close']['time'])
-                    closing_day = int(hour['close']['day'])
-
-                    if closing_time < 600:
-                        daily_hours[days[closing_day % 7]]['Morning'] = True
-                    elif closing_time < 1200:
-                        daily_hours[days[closing_day % 7]]['Evening'] = True
-                    else:
-                        daily_hours[days[closing_day % 7]]['Night'] = True
-            
-            # If the business is open during a particular period on a particular day, increment the count
-            for day in days:
-                for period in periods:
-                    if daily_hours[day][period]:
-                        business_hours[day][period] += 1
-    
+    business_hours = BusinessHours(df[col])
+    counts = business_hours.period_counts()
+
     logging.info('Business hours breakdown:')
-    for day in days:
+    for day in DAYS:
         logging.info(f'{day}:')
-        for period in periods:
-            logging.info(f'  {period}: {business_hours[day][period]}')
+        for period in PERIODS:
+            logging.info(f'  {period}: {counts.at[day, period]}')
+    return business_hours
 
 
 
@@ -233,33 +587,167 @@ def analyze_business_hours(df, col):
 #     logging.info(f"FINISHED VALIDATION: {admin_class_name.upper()} DATABASE")
 #     logging.info("="*60 + "\n\n")
 
+VALIDATION_RESULTS = Path(__file__).resolve().parent / "validation_results"
+
+ENVIRONMENTS = [
+    ('prodAdmin', 'prod', prodAdmin),
+    ('betaAdmin', 'beta', betaAdmin),
+    ('testAdmin', 'test', testAdmin),
+]
+
+# Resources validated by --all, the ones without a <resource>_schema.yaml next to this script are skipped
+ALL_RESOURCES = ['water', 'food', 'forage', 'bathroom']
+
+def schema_path(resource):
+    return Path(__file__).resolve().parent / f"{resource}_schema.yaml"
+
+def results_dir(resource):
+    directory = VALIDATION_RESULTS / resource
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+def fetch_data(admin, resource, db_env, args):
+    """
+    Get the records of one environment's database (or its local snapshot). Runs on the fetch pool, so instead of
+    logging it returns the messages for the caller to log in order.
+
+    :return: tuple - (records, list of log messages)
+    """
+    notes = []
+    # The reference is only resolved when firebase is contacted, --offline runs need no credentials
+    if args.snapshot_dir:
+        snapshot_name = f"{db_env}_{resource}_live"
+        if not args.offline:
+            snapshot_fp = admin.dumpSnapshot(getattr(admin, f"{resource}_db_live"), args.snapshot_dir, snapshot_name)
+            notes.append(f"Using snapshot {snapshot_fp}")
+        data = admin.loadSnapshot(args.snapshot_dir, snapshot_name)
+    elif args.page_size:
+        data = {key: record for key, record in admin.iter_children(getattr(admin, f"{resource}_db_live"), args.page_size,
+                                                                   prefetch=True)}
+    else:
+        data = admin.getDb(getattr(admin, f"{resource}_db_live"))
+    return data, notes
+
+def records_frame(data):
+    """
+    One row per record, indexed by its firebase key, whether the database came back as a list or a dict. The keys
+    are what iter_changed_rows stores the rows of a run under, so they must not shift when records come and go.
+    Fields that are explicitly null hold None, absent fields NaN.
+    """
+    children = [(str(key), record) for key, record in iter_children(data) if record is not None]
+    df = pd.DataFrame([record for _, record in children], index=[key for key, _ in children])
+
+    # pandas stores an explicit null as NaN in numeric and string columns, where it reads as an absent field (and NaN
+    # passes as a number). Put those cells back as None, so both validators see null the way jsonschema sees the record
+    nulls = {}
+    for position, (_, record) in enumerate(children):
+        for name, value in (record.items() if isinstance(record, dict) else ()):
+            if value is None:
+                nulls.setdefault(name, []).append(position)
+    for name, positions in nulls.items():
+        column = df[name].astype(object)
+        column.iloc[positions] = None
+        df[name] = column
+    return df
+
+def validate_environment(validator, data, admin_class_name, resource, db_env, state=None):
+    df = records_frame(data)
+
+    # print dataframe column names
+    logging.info(f"\n\n{admin_class_name.upper()} database column names:\n{df.columns}")
+
+    # exploratory data analysis - Water only
+    if resource.lower() == 'water':
+        logging.info(f"\n\nExploratory Data Analysis for {admin_class_name.upper()} database:")
+        eda_water_resource(df)
+
+    # JSON Schema Validation
+    summary = validator.validate_and_log(df, admin_class_name, resource, db_env, state)
+    logging.info(f"\n\nFinished Script: {dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    return summary
+
+def prefetch(pool, tasks, ahead):
+    """
+    Run fetch_data for every (admin, resource, db_env, args) task on the pool, keeping at most ahead fetches
+    in flight, and yield the results in task order.
+    """
+    pending = []
+    tasks = iter(tasks)
+    for task in tasks:
+        pending.append(pool.submit(fetch_data, *task))
+        if len(pending) >= ahead:
+            break
+    while pending:
+        result = pending.pop(0).result()
+        for task in tasks:
+            pending.append(pool.submit(fetch_data, *task))
+            break
+        yield result
+
+def log_summary(summaries, summary_fp):
+    """
+    Log one line per validated database and write the same table to summary_fp.
+    """
+    summary_df = pd.DataFrame(summaries, columns=['resource', 'environment', 'rows', 'invalid_rows', 'errors', 'csv'])
+    summary_df.to_csv(summary_fp, index=False)
+    logging.info("\n\n" + "="*60)
+    logging.info("VALIDATION SUMMARY")
+    logging.info("="*60)
+    for summary in summaries:
+        logging.info(f"{summary['resource']:10s} {summary['environment']:6s} {summary['rows']:8d} rows "
+                     f"{summary['invalid_rows']:8d} invalid {summary['errors']:8d} errors")
+    logging.info(f"Summary written to {summary_fp}")
+
+# argparse type for counts that must be at least 1
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
 def main():
     """ validate_db.py
     Entry point for the script. This function initializes the schema validator with a specified schema and
     log file path. It then loops over a list of databases in production, beta, and testing environments. For each database,
     it pulls data, converts it into a DataFrame, conducts data analysis, and validates the data against the 
     specified JSON schema. Validation results and logs are written to a specified log file, and if any schema 
-    validation errors are found, they are written to a separate CSV file.
+    validation errors are found, they are written to a separate CSV file. With --all every resource is validated in
+    the same run, logging to one file and finishing with a summary of every database.
     
     :return: None
     """
     parser = argparse.ArgumentParser(description='Validate a specific resource database.')
-    parser.add_argument('resource', type=str, help='The type of resource to validate')
+    parser.add_argument('resource', type=str, nargs='?', help='The type of resource to validate')
+    parser.add_argument('--all', action='store_true',
+                        help='Validate every resource in every environment in this run, with one log and a summary report')
+    parser.add_argument('--snapshot-dir', type=str, default=None,
+                        help='Validate local snapshot files in this directory, refreshing them only when the database changed')
+    parser.add_argument('--offline', action='store_true',
+                        help='With --snapshot-dir, use the newest existing snapshots without contacting firebase')
+    parser.add_argument('--page-size', type=int, default=None,
+                        help='Read each database in key order, this many records per request, instead of in one download')
+    parser.add_argument('--full', action='store_true',
+                        help='Validate every record, instead of only the records that changed since the last run')
+    parser.add_argument('--state-file', type=str, default=str(VALIDATION_RESULTS / "validation_state.json"),
+                        help='Where the per-record hashes and errors of the last run are kept')
+    parser.add_argument('--workers', type=positive_int, default=len(ENVIRONMENTS),
+                        help='Number of databases fetched in parallel while earlier ones are validated (1 fetches one at a time)')
     args = parser.parse_args()
+    if args.all == bool(args.resource):
+        parser.error('give either a resource or --all')
 
-    # get the resource name from the command line arguments
-    resource = args.resource
-    RESOURCE_SCHEMA = Path(__file__).resolve().parent / f"{resource}_schema.yaml"
+    # get the resource names from the command line arguments
+    resources = ALL_RESOURCES if args.all else [args.resource]
+    run_name = 'all' if args.all else args.resource
 
-    # set up logging based on the resource name
-    global validation_results_dir
+    # set up logging based on the resource name, --all logs every resource to one file in validation_results
+    log_dir = VALIDATION_RESULTS if args.all else results_dir(args.resource)
+    log_dir.mkdir(parents=True, exist_ok=True)
 
-    validation_results_dir = Path(__file__).resolve().parent / "validation_results" / resource 
-    validation_results_dir.mkdir(parents=True, exist_ok=True)
-    
     # Configure logging and log file
-    log_name = f"{resource}_validation_{dt.datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-    log_fp = validation_results_dir / log_name
+    timestamp = dt.datetime.now().strftime('%Y%m%d_%H%M%S')
+    log_name = f"{run_name}_validation_{timestamp}.log"
+    log_fp = log_dir / log_name
 
     logging.basicConfig(level=logging.INFO, 
                         format='%(asctime)s %(levelname)-8s %(message)s',
@@ -276,43 +764,38 @@ def main():
     logging.info(f"Starting Script: {dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     logging.info(f"Using python interpreter: {sys.executable}")
 
-    # Initialize custom validator with schema and log file path
-    validator = DataValidator(
-    schema_path=RESOURCE_SCHEMA,
-    log_path= str(log_fp) )
-    
-    # Initialize the prod, beta, and test environment database references.
-    databases = [
-        (getattr(prodAdmin(), f"{resource}_db_live"), prodAdmin),
-        (getattr(betaAdmin(), f"{resource}_db_live"), betaAdmin),
-        (getattr(testAdmin(), f"{resource}_db_live"), testAdmin)
-    ]
-    for i, (db, admin_class) in enumerate(databases):
-        if i == 0:
-            admin_class_name = 'prodAdmin'
-            db_env = "prod"
-        elif i == 1:
-            admin_class_name = 'betaAdmin'
-            db_env = "beta"
-        else:
-            admin_class_name = 'testAdmin'
-            db_env = "test"
-
-        # Get the data from the database and convert to a dataframe)
-        data = admin_class().getDb(db)
-        df = pd.DataFrame(data)
-
-        # print dataframe column names
-        logging.info(f"\n\n{admin_class_name.upper()} database column names:\n{df.columns}")
-
-        # exploratory data analysis - Water only
-        if resource.lower() == 'water':
-            logging.info(f"\n\nExploratory Data Analysis for {admin_class_name.upper()} database:")
-            eda_water_resource(df)
-
-        # JSON Schema Validation
-        validator.validate_and_log(df, admin_class_name, resource, db_env)
-        logging.info(f"\n\nFinished Script: {dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    # Initialize custom validator with schema and log file path, one per resource
+    validators = {}
+    for resource in resources:
+        if not schema_path(resource).exists():
+            logging.warning(f"No schema found for {resource} ({schema_path(resource).name}), skipping it")
+            continue
+        validators[resource] = DataValidator(
+        schema_path=schema_path(resource),
+        log_path= str(log_fp) )
+
+    # One Admin object per environment, shared by every resource
+    admins = {db_env: admin_class() for _, db_env, admin_class in ENVIRONMENTS}
+    jobs = [(resource, admin_class_name, db_env) for resource in validators for admin_class_name, db_env, _ in ENVIRONMENTS]
+
+    # Every database is fetched once on a thread pool, so the next ones download while the current one is
+    # validated. Validation and logging happen here in resource and environment order, one database at a time
+    # Results of the last run, only records that changed since are validated unless --full is given
+    state = load_state(args.state_file)
+    summaries = []
+    with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix='fetch') as pool:
+        tasks = [(admins[db_env], resource, db_env, args) for resource, _, db_env in jobs]
+        for (resource, admin_class_name, db_env), (data, notes) in zip(jobs, prefetch(pool, tasks, args.workers)):
+            for note in notes:
+                logging.info(note)
+            entry = {} if args.full else state.get(f"{resource}/{db_env}", {})
+            summaries.append(validate_environment(validators[resource], data, admin_class_name, resource, db_env, entry))
+            state[f"{resource}/{db_env}"] = entry
+    Path(args.state_file).parent.mkdir(parents=True, exist_ok=True)
+    save_state(state, args.state_file)
+
+    if args.all:
+        log_summary(summaries, VALIDATION_RESULTS / f"validation_summary_{timestamp}.csv")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,125 @@
+# Tests for admin/admin_classes.py against the FakeServer/FakeDatabase stand-ins in admin/fake_rtdb.py
+#
+# Run from the project root:
+#   python -m pytest tests
+import os
+import sys
+import uuid
+
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+import firebase_admin
+from firebase_admin import _utils, credentials, db
+
+from admin.admin_classes import Admin, MirroredRef, SnapshotCache, reference_key, snapshot_cache, stream_children
+from admin.fake_rtdb import FakeDatabase, FakeServer
+
+
+class EmulatorCredential(credentials.Base):
+    def get_credential(self):
+        return _utils.EmulatorAdminCredentials()
+
+
+def make_taps(count):
+    return [{'tapnum': i, 'name': f'Tap {i}', 'access': 'Public'} for i in range(count)]
+
+
+@pytest.fixture
+def served_ref():
+    fake = FakeDatabase(make_taps(5))
+    server = FakeServer({'taps': fake}, keep_alive=0.5).start()
+    app = firebase_admin.initialize_app(EmulatorCredential(), {'databaseURL': server.url('taps')},
+                                        name=f'test-{uuid.uuid4().hex}')
+    try:
+        yield fake, db.reference('/', app=app)
+    finally:
+        firebase_admin.delete_app(app)
+        server.stop()
+
+
+# The SDK's listener thread raises when its stream is closed under it, which is how MirroredRef.stop ends it
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')
+def test_stream_children_reads_a_mirror_from_memory(served_ref):
+    fake, ref = served_ref
+    mirror = MirroredRef(ref, check_interval=60).start()
+    try:
+        assert mirror.wait_until_ready(5)
+        fake.reset_counts()
+        children = list(stream_children(mirror))
+        record = dict(Admin().streamDb(mirror.child('1')))
+    finally:
+        mirror.stop()
+    assert children == list(enumerate(make_taps(5)))
+    assert record == make_taps(5)[1]
+    assert fake.requests['get'] == 0
+
+
+def test_getTap_serves_lookups_from_the_index_within_its_ttl():
+    fake = FakeDatabase(make_taps(5))
+    ref = fake.reference()
+    admin = Admin()
+    assert admin.getTap(ref, 1, fresh=False) == make_taps(5)[1]
+    fake.reset_counts()
+    assert [admin.getTap(ref, tapnum, fresh=False)['tapnum'] for tapnum in range(5)] == list(range(5))
+    assert admin.getTap(ref, 2) == make_taps(5)[2]
+    assert fake.requests == {'get': 1}
+
+
+def test_getTap_reads_a_missing_tap_once_by_its_key():
+    fake = FakeDatabase(make_taps(5))
+    ref = fake.reference()
+    admin = Admin()
+    admin.getIndex(ref)
+    # Written by another client, the cached index doesn't know about it yet
+    fake.reference('5').set({'tapnum': 5, 'name': 'Tap 5'})
+    fake.reset_counts()
+    assert admin.getTap(ref, 5) == {'tapnum': 5, 'name': 'Tap 5'}
+    assert admin.getTap(ref, 6) is None
+    assert fake.requests == {'get': 2}
+
+
+def test_admin_writes_drop_the_index():
+    fake = FakeDatabase(make_taps(5))
+    ref = fake.reference()
+    admin = Admin()
+    admin.getIndex(ref)
+    admin.updateTap(ref, 5, {'tapnum': 5, 'name': 'Tap 5'})
+    assert admin.getTap(ref, 5, fresh=False) == {'tapnum': 5, 'name': 'Tap 5'}
+
+
+def test_snapshot_cache_is_off_until_configured():
+    fake = FakeDatabase(make_taps(5))
+    ref = fake.reference()
+    assert snapshot_cache.max_entries == 0
+    Admin().getDb(ref)
+    Admin().getDb(ref)
+    assert fake.requests == {'get': 2}
+
+
+def test_snapshot_cache_revalidates_and_counts_under_configure():
+    fake = FakeDatabase(make_taps(5))
+    ref = fake.reference()
+    cache = SnapshotCache().configure(ttl=60, max_entries=1)
+    assert cache.get(ref) is cache.get(ref)
+    cache.configure(ttl=0)
+    assert cache.get(ref) == make_taps(5)
+    cache.put(fake.reference('0'), {}, 'etag')
+    assert fake.requests == {'get': 1, 'get_if_changed': 1}
+    assert cache.stats == {'hits': 1, 'not_modified': 1, 'downloads': 1, 'evictions': 1}
+
+
+def test_a_mirror_does_not_share_the_cache_key_of_its_reference(served_ref):
+    _, ref = served_ref
+    mirror = MirroredRef(ref)
+    assert reference_key(mirror) != reference_key(ref)
+    assert reference_key(mirror.child('1')) != reference_key(ref.child('1'))
+
+
+def test_queryChildren_keeps_keys_and_query_order(served_ref):
+    fake, ref = served_ref
+    ref.child('1/name').set('Z')
+    assert [key for key, _ in Admin().queryChildren(ref, order_by='name', start_at='Tap 2')] == ['2', '3', '4', '1']
+    assert Admin().queryChildren(ref, start_at='3') == [('3', make_taps(5)[3]), ('4', make_taps(5)[4])]
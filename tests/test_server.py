@@ -0,0 +1,94 @@
+# Tests for the dashboard backend (dashboard/backend/server.py), its prod databases served by a FakeServer
+import base64
+import importlib
+import json
+import os
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BACKEND = os.path.join(PROJECT_ROOT, 'dashboard', 'backend')
+sys.path.insert(0, PROJECT_ROOT)
+
+from firebase_admin import _utils, credentials
+
+from admin.fake_rtdb import FakeDatabase, FakeServer
+
+ACCESS = ['Public', 'Private', 'Public', 'Restricted', 'Public', 'Public', 'Private', 'Public', 'Public', 'Public']
+
+
+class EmulatorCredential(credentials.Base):
+    def get_credential(self):
+        return _utils.EmulatorAdminCredentials()
+
+
+def make_taps():
+    return [{'tapnum': i, 'access': access, 'address': f'{100 - i} Walnut St'} for i, access in enumerate(ACCESS)]
+
+
+# The backend imports its own copy of admin_classes, it is loaded under that name only while server.py imports it
+@pytest.fixture(scope='module')
+def backend():
+    fake = FakeDatabase(make_taps())
+    server = FakeServer({'phlask-web-map-prod-water-live': fake}).start()
+    os.environ['FIREBASE_DATABASE_EMULATOR_HOST'] = server.address
+    saved = sys.modules.pop('admin_classes', None)
+    sys.path.insert(0, BACKEND)
+    try:
+        importlib.import_module('admin_classes')._cred = EmulatorCredential()
+        yield fake, importlib.import_module('server')
+    finally:
+        sys.path.remove(BACKEND)
+        sys.modules.pop('admin_classes', None)
+        if saved is not None:
+            sys.modules['admin_classes'] = saved
+        del os.environ['FIREBASE_DATABASE_EMULATOR_HOST']
+        server.stop()
+
+
+def list_all(backend, query):
+    fake, server = backend
+    client = server.dashboard.test_client()
+    taps, queries, cursor = [], [], None
+    while True:
+        fake.reset_counts()
+        response = client.get(f'/taps/water?{query}' + (f'&cursor={cursor}' if cursor else '')).get_json()
+        assert response['source'] == 'query'
+        taps += response['items']
+        queries.append(fake.requests['query'])
+        cursor = response['next_cursor']
+        if cursor is None:
+            return taps, queries
+
+
+def test_pages_in_key_order_one_query_per_page(backend):
+    taps, queries = list_all(backend, 'limit=3')
+    assert taps == make_taps()
+    assert queries == [1, 1, 1, 1]
+
+
+def test_pages_through_ties_without_repeating_or_skipping(backend):
+    taps, queries = list_all(backend, 'limit=2&sort=access')
+    order = sorted(make_taps(), key=lambda tap: (tap['access'], tap['tapnum']))
+    assert [tap['tapnum'] for tap in taps] == [tap['tapnum'] for tap in order]
+    # Inside the run of 'Public' taps the query starts at 'Public' again and widens (doubling) past the ties
+    assert queries == [1, 2, 2, 2, 3]
+
+
+def test_prefix_filter_sorted_by_its_field_is_paged_by_firebase(backend):
+    taps, _ = list_all(backend, 'limit=2&sort=address&address__startswith=9')
+    assert [tap['address'] for tap in taps] == [f'{n} Walnut St' for n in range(91, 100)]
+
+
+def test_query_children_keeps_the_keys_of_array_shaped_results(backend):
+    _, server = backend
+    children = server.prod().queryChildren(server.water_prod, order_by='access', equal_to='Private')
+    assert children == [('1', make_taps()[1]), ('6', make_taps()[6])]
+
+
+def test_resource_counts_refresher_starts_with_the_first_count(backend):
+    _, server = backend
+    assert server.resource_counts._thread is None
+    server.resource_counts.get('prod', 'water')
+    assert server.resource_counts._thread.is_alive()
@@ -0,0 +1,146 @@
+# Tests for misc_scripts/stream_supervisor.py against FakeServer streams
+import asyncio
+import os
+import queue
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'misc_scripts'))
+
+import stream_supervisor
+from admin.fake_rtdb import FakeDatabase, FakeServer
+from stream_supervisor import StreamSupervisor
+
+
+def make_taps(count):
+    return [{'tapnum': i, 'name': f'Tap {i}'} for i in range(count)]
+
+
+@pytest.fixture
+def server():
+    server = FakeServer({'water': FakeDatabase(make_taps(3))}).start()
+    try:
+        yield server
+    finally:
+        server.stop()
+
+
+@pytest.fixture
+def supervisor():
+    supervisors = []
+
+    def make(**kwargs):
+        supervisors.append(StreamSupervisor(**kwargs))
+        return supervisors[-1]
+
+    yield make
+    for supervisor in supervisors:
+        supervisor.stop()
+
+
+def next_event(events):
+    event = events.get(timeout=5)
+    return event.event_type, event.path, event.data
+
+
+def test_streams_the_initial_put_then_changes(server, supervisor):
+    events = queue.Queue()
+    supervisor().add('water', server.url('water'), events.put).start()
+    assert next_event(events) == ('put', '/', make_taps(3))
+    server.database('water').reference('1/name').set('Renamed')
+    assert next_event(events) == ('put', '/1/name', 'Renamed')
+
+
+def test_reconnects_and_only_delivers_what_changed_meanwhile(server, supervisor):
+    events = queue.Queue()
+    sup = supervisor(reconnect_delay=0.2).add('water', server.url('water'), events.put).start()
+    next_event(events)
+    # The child changes while the stream waits to reconnect
+    assert server.drop_streams() == 1
+    server.database('water').reference('2').set({'tapnum': 2, 'name': 'Moved'})
+    assert next_event(events) == ('put', '/2', {'tapnum': 2, 'name': 'Moved'})
+    metrics = sup.metrics()['water']
+    assert metrics['reconnects'] == 1
+    assert metrics['resumed'] == 1
+    assert metrics['skipped'] == 2
+    assert metrics['state'] == 'live'
+
+
+def test_backs_off_exponentially_while_the_database_is_unreachable(supervisor, monkeypatch):
+    delays = []
+    sleep = asyncio.sleep
+
+    async def record(delay):
+        delays.append(delay)
+        await sleep(0.001)
+
+    monkeypatch.setattr(stream_supervisor.asyncio, 'sleep', record)
+    # Nothing listens on a port that was bound and released again
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        url = f'http://127.0.0.1:{sock.getsockname()[1]}/?ns=water'
+    sup = supervisor(reconnect_delay=0.5, max_reconnect_delay=4.0).add('water', url, lambda event: None).start()
+    for _ in range(500):
+        if len(delays) >= 5:
+            break
+        threading.Event().wait(0.01)
+    assert delays[:5] == [0.5, 1.0, 2.0, 4.0, 4.0]
+    metrics = sup.metrics()['water']
+    assert metrics['errors'] >= 5
+    assert 'ConnectionRefusedError' in metrics['last_error']
+
+
+def test_follows_redirects_to_the_database_server(server, supervisor):
+    class Redirect(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            self.send_response(307)
+            self.send_header('Location', f'http://{server.address}{self.path}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+    redirector = ThreadingHTTPServer(('127.0.0.1', 0), Redirect)
+    threading.Thread(target=redirector.serve_forever, daemon=True).start()
+    try:
+        events = queue.Queue()
+        host, port = redirector.server_address[:2]
+        supervisor().add('water', f'http://{host}:{port}/?ns=water', events.put).start()
+        assert next_event(events) == ('put', '/', make_taps(3))
+    finally:
+        redirector.shutdown()
+        redirector.server_close()
+
+
+def read_events(body, headers):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(body)
+        reader.feed_eof()
+        return [event async for event in StreamSupervisor()._read_events(reader, headers)]
+    return asyncio.run(run())
+
+
+def chunked(*chunks):
+    return b''.join(f'{len(chunk):x}\r\n'.encode() + chunk + b'\r\n' for chunk in chunks) + b'0\r\n\r\n'
+
+
+def test_reads_events_split_across_chunks():
+    message = 'event: put\ndata: {"path": "/", "data": "Café"}\n\nevent: keep-alive\ndata: null\n\n'.encode('utf-8')
+    # Cut inside the event, inside a line and inside the two bytes of the e acute
+    cut = message.index(b'\xc3') + 1
+    body = chunked(message[:10], message[10:cut], message[cut:])
+    assert read_events(body, {'transfer-encoding': 'chunked'}) == [
+        ('put', '{"path": "/", "data": "Café"}'), ('keep-alive', 'null')]
+
+
+def test_reads_events_until_the_server_closes_an_unchunked_body():
+    body = b'event: patch\r\ndata: {"path": "/1",\r\ndata: "data": {}}\r\n\r\nevent: put\r\n'
+    assert read_events(body, {}) == [('patch', '{"path": "/1",\n"data": {}}')]
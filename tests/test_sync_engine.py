@@ -0,0 +1,44 @@
+# Tests for the prod -> beta/test sync in aws_lambda/sync_engine.py, against FakeDatabase references
+#
+# The Lambda modules import boto3 (always there on Lambda), the tests are skipped where it isn't installed
+import os
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'aws_lambda'))
+
+pytest.importorskip('boto3')
+
+from admin.fake_rtdb import FakeDatabase
+from sync_engine import sync_reference
+
+
+def make_taps(count):
+    return [{'tapnum': i, 'name': f'Tap {i}'} for i in range(count)]
+
+
+def test_sync_applies_a_small_deletion():
+    source, target = FakeDatabase(make_taps(9)), FakeDatabase(make_taps(10))
+    summary = sync_reference(source.reference(), target.reference(), 'beta_water_live', {})
+    assert summary['deleted'] == 1
+    assert target.reference().get() == source.reference().get()
+
+
+@pytest.mark.parametrize('source_data', [None, [], make_taps(4)])
+def test_sync_refuses_to_empty_or_gut_the_target(source_data):
+    source, target = FakeDatabase(source_data), FakeDatabase(make_taps(10))
+    state = {}
+    with pytest.raises(RuntimeError, match='refusing to delete'):
+        sync_reference(source.reference(), target.reference(), 'beta_water_live', state)
+    assert target.reference().get() == make_taps(10)
+    assert state == {}
+
+
+def test_sync_deletes_everything_when_allowed():
+    source, target = FakeDatabase(None), FakeDatabase(make_taps(10))
+    summary = sync_reference(source.reference(), target.reference(), 'beta_water_live', {}, allow_mass_delete=True)
+    assert summary['deleted'] == 10
+    assert target.reference().get() is None